@@ -0,0 +1,287 @@
+# Accounting Book benchmarks - times the hot paths on seeded synthetic ledgers, no streamlit needed:
+#   python accounting_bench.py --sizes 1000 100000 -o bench.json
+#   python accounting_bench.py --sizes 1000 100000 --compare bench.json
+# the same seed always generates the same ledger, and results are written as JSON,
+# so two runs (e.g. before and after a commit) can be compared with --compare
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+from accounting_core import (
+    BUDGET_PERIODS, DEFAULT_CATEGORY_KEYWORDS, SYDNEY_TZ, BudgetRule, ColumnarLedger, Ledger,
+    Transaction, analyze_spending, check_budget, description_mask, filter_by_date_range,
+    flush_writes, get_budget_rules, guess_categories, guess_category, load_data, save_data,
+    search_terms, search_transactions, set_budget_rules,
+)
+
+BENCH_SIZES = (1000, 10000, 100000)
+BENCH_FORMATS = ('json', 'ledger')
+BENCH_SEED = 2024
+BENCH_END = datetime(2025, 6, 30)  # last day of every generated ledger, fixed so runs compare
+RECORDS_PER_DAY = 8
+LATENCY_SAMPLES = 2000  # single calls timed for the per-call benchmarks
+FILTER_DAYS = 30
+PAGE_SIZE = 50  # rows on one View Records page
+
+# synthetic ledgers: descriptions are guess_category keywords plus a suburb, amounts are
+# log-normal around a typical spend per category, times are spread evenly over the period
+# and written as Sydney wall time (DST included)
+CATEGORY_WEIGHTS = {
+    'Food&Drinks': 40, 'Transportation': 20, 'Shopping': 15, 'Entertainment': 8,
+    'Medical': 3, 'Education': 4, 'Life Expense': 6, 'Other': 4,
+}
+CATEGORY_SPEND = {
+    'Food&Drinks': 18, 'Transportation': 12, 'Shopping': 55, 'Entertainment': 35,
+    'Medical': 60, 'Education': 120, 'Life Expense': 150, 'Other': 25,
+}
+SUBURBS = ('Sydney', 'CBD', 'Broadway', 'Central', 'Chatswood', 'Bondi', 'Parramatta', 'online', '')
+
+def iter_transactions(n, seed=BENCH_SEED, days=None):
+    # oldest first; ids keep the app's format (UTC, see IdGenerator) and are unique for up to 10M records
+    rng = random.Random(seed)
+    days = days or max(1, -(-n // RECORDS_PER_DAY))
+    categories = list(CATEGORY_WEIGHTS)
+    weights = [CATEGORY_WEIGHTS[cat] for cat in categories]
+    words = {cat: DEFAULT_CATEGORY_KEYWORDS.get(cat) or ['transfer', 'fee', 'misc'] for cat in categories}
+    start = SYDNEY_TZ.localize(BENCH_END - timedelta(days=days - 1)).timestamp()
+    step = days * 86400 / n
+    for i in range(n):
+        cat = rng.choices(categories, weights)[0]
+        moment = start + (i + rng.random()) * step
+        local = datetime.fromtimestamp(moment, SYDNEY_TZ)
+        stamp = local.strftime("%Y-%m-%d %H:%M:%S")
+        yield Transaction.from_dict({
+            'id': f"T{datetime.fromtimestamp(moment, timezone.utc).strftime('%Y%m%d%H%M%S')}"
+                  f"{i % 1000:03d}{i // 1000 % 10000:04d}000000be",
+            'amount': round(rng.lognormvariate(math.log(CATEGORY_SPEND[cat]), 0.6), 2),
+            'description': f"{rng.choice(words[cat])} {rng.choice(SUBURBS)}".strip(),
+            'category': cat,
+            'date': stamp[:10],
+            'timestamp': stamp,
+        })
+
+def generate_ledger(n, seed=BENCH_SEED, days=None):
+    return list(iter_transactions(n, seed, days))
+
+# measuring
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+def timed_calls(fn, args):
+    # one sample per call, for the operations the app runs once per click or keystroke
+    samples = []
+    for arg in args:
+        started = time.perf_counter()
+        fn(arg)
+        samples.append(time.perf_counter() - started)
+    return samples
+
+def peak_memory(fn):
+    # separate run: tracemalloc slows everything down, so it never overlaps a timed one
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, round(q / 100 * (len(ordered) - 1)))]
+
+def bench_result(name, variant, size, samples, items, unit, peak):
+    # items: records or calls handled by one sample
+    return {
+        'benchmark': name,
+        'variant': variant,
+        'size': size,
+        'runs': len(samples),
+        'p50_ms': round(percentile(samples, 50) * 1000, 4),
+        'p99_ms': round(percentile(samples, 99) * 1000, 4),
+        'mean_ms': round(sum(samples) / len(samples) * 1000, 4),
+        'throughput': round(items * len(samples) / sum(samples)) if sum(samples) else None,
+        'unit': unit,
+        'peak_memory_kb': round(peak / 1024),
+    }
+
+def run_size(n, seed=BENCH_SEED, repeat=5, formats=BENCH_FORMATS, workdir=None, report=None):
+    # every benchmark for one ledger size, report(result) is called as each one finishes
+    results = []
+
+    def measure(name, variant, fn, args=None):
+        # bulk: fn() handles all n records, timed `repeat` times. per call: fn(arg) for each
+        # of args. the memory run goes first and doubles as the warm-up (lazy imports, caches)
+        if args is None:
+            peak = peak_memory(fn)
+            result = bench_result(name, variant, n, timed(fn, repeat), n, 'records/s', peak)
+        else:
+            peak = peak_memory(lambda: fn(args[0]))
+            result = bench_result(name, variant, n, timed_calls(fn, args), 1, 'calls/s', peak)
+        results.append(result)
+        if report:
+            report(result)
+
+    records = generate_ledger(n, seed)
+    dicts = [trans.to_dict() for trans in records]
+    measure('Transaction.from_dict', 'bulk', lambda: [Transaction.from_dict(data) for data in dicts])
+    dicts = None  # the lambda above holds the name, drop the copies without deleting it
+
+    ledger = None
+    for fmt in formats:
+        filename = os.path.join(workdir, f"bench_{n}.{fmt}")
+
+        def save():
+            save_data(records, filename)
+            errors = flush_writes(timeout=3600)
+            if errors:
+                raise RuntimeError("; ".join(errors))
+
+        measure('save_data', fmt, save)
+        measure('load_data', fmt, lambda: load_data(filename))
+        if ledger is None:
+            ledger = load_data(filename)
+    if ledger is None:
+        ledger = Ledger(records)
+
+    rng = random.Random(seed + 1)
+    first = datetime.strptime(records[0].date, "%Y-%m-%d").date()
+    span = max(0, (datetime.strptime(records[-1].date, "%Y-%m-%d").date() - first).days - FILTER_DAYS)
+    windows = [first + timedelta(days=rng.randint(0, span)) for _ in range(LATENCY_SAMPLES)]
+    measure('filter_by_date_range', f'{FILTER_DAYS} days',
+            lambda start: filter_by_date_range(ledger, start, start + timedelta(days=FILTER_DAYS - 1)), windows)
+
+    descriptions = [trans.description for trans in records]
+    # numbered, so no call is answered from an earlier one
+    sample = [rng.choice(descriptions) + f" {i}" for i in range(LATENCY_SAMPLES)]
+    measure('guess_category', 'single', guess_category, sample)
+    measure('guess_category', 'batch', lambda: guess_categories(descriptions))
+    # naive bayes learned from the ledger, the keywords as its prior
+    measure('guess_category', 'nb', lambda description: guess_category(description, ledger), sample)
+    measure('guess_category', 'nb batch', lambda: guess_categories(descriptions, ledger))
+
+    # the Ledger answers from its running totals, a plain list is summed
+    measure('analyze_spending', 'ledger', analyze_spending, [ledger] * LATENCY_SAMPLES)
+    measure('analyze_spending', 'list', lambda: analyze_spending(records))
+    
+    # budget rules after an insert: a monthly limit per category, all spending per day, week
+    # and month, and one on single records, each read from the rollups
+    rules = [BudgetRule(CATEGORY_SPEND[cat] * 30, cat, 'month') for cat in CATEGORY_WEIGHTS]
+    rules += [BudgetRule(500, None, period) for period in BUDGET_PERIODS] + [BudgetRule(200)]
+    saved_rules = get_budget_rules()
+    set_budget_rules(rules, filename=None)
+    try:
+        measure('check_budget', f'{len(rules)} rules', lambda trans: check_budget(ledger, trans),
+                rng.sample(records, min(LATENCY_SAMPLES, len(records))))
+    finally:
+        set_budget_rules(saved_rules, filename=None)
+
+    # description search: a word prefix, or two words, as typed into the search box
+    words = sorted({word for description in set(descriptions) for word in search_terms(description)})
+    queries = [rng.choice(words)[:rng.randint(2, 5)] if i % 2 else f"{rng.choice(words)} {rng.choice(words)[:3]}"
+               for i in range(LATENCY_SAMPLES)]
+    measure('description_mask', 'ledger', lambda query: description_mask(ledger, query), queries)
+    measure('search_transactions', 'ledger', lambda query: search_transactions(ledger, query), queries)
+    measure('search_transactions', 'list', lambda: search_transactions(records, queries[0]))
+
+    # the View Records page on a cache miss: columns, sort order, then the first page
+    def records_table():
+        columns = ColumnarLedger.from_transactions(ledger)
+        return columns.to_frame(index=columns.sorted_index()[:PAGE_SIZE])
+
+    measure('view_records_table', 'first page', records_table)
+    return results
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def bench_meta(sizes, seed, repeat):
+    import numpy
+    import pandas
+    return {
+        'commit': git_commit(),
+        'started': datetime.now(SYDNEY_TZ).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'numpy': numpy.__version__,
+        'pandas': pandas.__version__,
+        'sizes': list(sizes),
+        'seed': seed,
+        'repeat': repeat,
+    }
+
+def result_key(result):
+    return result['benchmark'], result['variant'], result['size']
+
+def compare_rows(results, baseline):
+    # new p50 against the baseline run's, < 1.0 means faster
+    old = {result_key(result): result for result in baseline}
+    for result in results:
+        before = old.get(result_key(result))
+        if before and before['p50_ms']:
+            yield result, before, result['p50_ms'] / before['p50_ms']
+
+def format_result(result):
+    throughput = result['throughput']
+    return (f"{result['benchmark']:<22} {result['variant']:<10} {result['size']:>9}  "
+            f"p50 {result['p50_ms']:>10.3f} ms  p99 {result['p99_ms']:>10.3f} ms  "
+            f"{throughput if throughput is not None else '-':>11} {result['unit']:<9}  "
+            f"peak {result['peak_memory_kb']:>8} KB")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Accounting Book benchmarks on synthetic ledgers")
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(BENCH_SIZES),
+                        help="ledger sizes to run (1k to 10M records)")
+    parser.add_argument('--formats', default=','.join(BENCH_FORMATS), help="comma separated: json, ledger")
+    parser.add_argument('--seed', type=int, default=BENCH_SEED)
+    parser.add_argument('--repeat', type=int, default=5, help="timed runs of each bulk benchmark")
+    parser.add_argument('-o', '--output', help="write the results here as JSON")
+    parser.add_argument('--compare', help="results file of an earlier run to compare against")
+    args = parser.parse_args(argv)
+    formats = tuple(fmt.strip() for fmt in args.formats.split(',') if fmt.strip())
+
+    # imports pandas and numpy up front, so their import never lands in a memory peak
+    meta = bench_meta(args.sizes, args.seed, args.repeat)
+    results = []
+    workdir = tempfile.mkdtemp(prefix="accounting-bench-")
+    try:
+        for n in args.sizes:
+            results += run_size(n, args.seed, args.repeat, formats, workdir,
+                                report=lambda result: print(format_result(result), flush=True))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as out:
+            json.dump({'meta': meta, 'results': results}, out, indent=2)
+            out.write('\n')
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        print(f"\ncompared with {args.compare} (commit {baseline['meta'].get('commit')}), new p50 / old p50:")
+        for result, before, ratio in compare_rows(results, baseline['results']):
+            print(f"{result['benchmark']:<22} {result['variant']:<10} {result['size']:>9}  "
+                  f"{before['p50_ms']:>10.3f} -> {result['p50_ms']:>10.3f} ms  x{ratio:.2f}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,137 @@
+# Accounting Book command line tools, no streamlit needed:
+#   python accounting_cli.py report budget_data.json uts_budget_data_sydney.json --format csv -o report.csv
+#   python accounting_cli.py import-csv statement.csv
+#   python accounting_cli.py convert budget_data.json budget_data.ledger
+import argparse
+import csv
+import itertools
+import json
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from accounting_core import (
+    DATA_FILE, DUPLICATE_MODES, IMPORT_CHUNK_SIZE, JOURNAL_COMPACT_EVERY, SPENDING_SIGNS, ColumnarLedger,
+    SqliteStore, compact_journal, convert_ledger, import_statement, journal_size, ledger_report, read_columns,
+)
+
+REPORT_PERIODS = ('month', 'week')
+CSV_FIELDS = ('file', 'section', 'key', 'value', 'count', 'percentage')
+
+def report_columns(path):
+    if path.endswith('.db'):
+        store = SqliteStore(path)
+        try:
+            return ColumnarLedger.from_transactions(list(store))
+        finally:
+            store.close()
+    return read_columns(path)
+
+def report_file(path, periods=REPORT_PERIODS):
+    # one pool task; a file that cannot be read gets an error entry instead of stopping the run
+    started = time.perf_counter()
+    if not os.path.exists(path):
+        return {'file': path, 'error': "file not found"}
+    try:
+        report = ledger_report(report_columns(path), periods)
+    except (OSError, ValueError, KeyError, TypeError, sqlite3.Error) as e:
+        return {'file': path, 'error': f"{type(e).__name__}: {e}"}
+    return {'file': path, **report, 'seconds': round(time.perf_counter() - started, 3)}
+
+def run_reports(paths, periods=REPORT_PERIODS, workers=None):
+    # files are independent, so they spread over a process pool; results keep the input order
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(paths) <= 1:
+        return [report_file(path, periods) for path in paths]
+    with ProcessPoolExecutor(max_workers=min(workers, len(paths))) as pool:
+        chunksize = max(1, len(paths) // (workers * 4))
+        return list(pool.map(report_file, paths, itertools.repeat(periods), chunksize=chunksize))
+
+def report_rows(reports):
+    # one CSV row per figure: summary values, categories, period totals and advice lines
+    for report in reports:
+        path = report['file']
+        if 'error' in report:
+            yield {'file': path, 'section': 'error', 'value': report['error']}
+            continue
+        for key, value in report['summary'].items():
+            yield {'file': path, 'section': 'summary', 'key': key, 'value': value}
+        for category, data in report['analysis'].get('category_breakdown', {}).items():
+            yield {'file': path, 'section': 'category', 'key': category, 'value': round(data['amount'], 2),
+                   'percentage': data['percentage']}
+        for period, totals in report['periods'].items():
+            for label, data in totals.items():
+                yield {'file': path, 'section': period, 'key': label, 'value': round(data['total'], 2),
+                       'count': data['count']}
+        for i, line in enumerate(report['advice'], 1):
+            yield {'file': path, 'section': 'advice', 'key': i, 'value': line}
+
+def write_reports(reports, out, fmt='json'):
+    if fmt == 'csv':
+        writer = csv.DictWriter(out, fieldnames=CSV_FIELDS)
+        writer.writeheader()
+        writer.writerows(report_rows(reports))
+    else:
+        json.dump(reports, out, ensure_ascii=False, indent=2)
+        out.write('\n')
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Accounting Book command line tools")
+    commands = parser.add_subparsers(dest='command', required=True)
+    report_cmd = commands.add_parser('report', help="category breakdown, period totals and advice for ledger files")
+    report_cmd.add_argument('files', nargs='+', help="ledger files (.json, .ledger or .db)")
+    report_cmd.add_argument('--format', choices=('json', 'csv'), default='json')
+    report_cmd.add_argument('-o', '--output', help="write here instead of stdout")
+    report_cmd.add_argument('--periods', default=','.join(REPORT_PERIODS), help="comma separated: day, week, month")
+    report_cmd.add_argument('--workers', type=int, help="processes to use (default: one per CPU)")
+    import_cmd = commands.add_parser('import-csv', help="import bank statement CSV files")
+    import_cmd.add_argument('files', nargs='+')
+    import_cmd.add_argument('--ledger', default=DATA_FILE, help="ledger (.json or .ledger) to append to")
+    import_cmd.add_argument('--sqlite', help="import into this SQLite database instead")
+    import_cmd.add_argument('--chunk-size', type=int, default=IMPORT_CHUNK_SIZE)
+    import_cmd.add_argument('--duplicates', choices=DUPLICATE_MODES, default='skip',
+                            help="rows already in the ledger (same amount, description and date): "
+                                 "skip them, import and list them (flag), or import them (keep)")
+    import_cmd.add_argument('--spending', choices=SPENDING_SIGNS, default='auto',
+                            help="sign of money spent in the file: -12.30 (negative) or 12.30 (positive); "
+                                 "rows with the other sign are rejected. auto goes with the sign most rows have")
+    convert_cmd = commands.add_parser('convert', help="convert a ledger between JSON and the binary .ledger format")
+    convert_cmd.add_argument('source')
+    convert_cmd.add_argument('target')
+    args = parser.parse_args(argv)
+    
+    if args.command == 'report':
+        periods = tuple(p.strip() for p in args.periods.split(',') if p.strip())
+        reports = run_reports(args.files, periods, args.workers)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8', newline='') as out:
+                write_reports(reports, out, args.format)
+        else:
+            write_reports(reports, sys.stdout, args.format)
+        return 1 if any('error' in report for report in reports) else 0
+    
+    if args.command == 'convert':
+        started = time.perf_counter()
+        count = convert_ledger(args.source, args.target)
+        print(json.dumps({'source': args.source, 'target': args.target, 'records': count,
+                          'seconds': round(time.perf_counter() - started, 3)}))
+    
+    if args.command == 'import-csv':
+        store = SqliteStore(args.sqlite) if args.sqlite else None
+        try:
+            for path in args.files:
+                report = import_statement(path, store, args.ledger, args.chunk_size, duplicates=args.duplicates,
+                                          spending=args.spending)
+                print(json.dumps(report.to_dict(), ensure_ascii=False))
+        finally:
+            if store is not None:
+                store.close()
+        # no background thread here, the process is about to exit
+        if store is None and journal_size(args.ledger) >= JOURNAL_COMPACT_EVERY:
+            compact_journal(args.ledger)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
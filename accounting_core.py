@@ -0,0 +1,3685 @@
+# Accounting Book engine - ledger, storage, imports and analysis, no streamlit needed.
+# the app (accountingbook2(1).py) and the command line (accounting_cli.py) both build on it
+from array import array
+from datetime import datetime, timedelta
+import contextlib
+import csv
+import importlib
+import itertools
+import json
+import logging
+import math
+import os
+import queue
+import sys
+import time
+from collections import Counter, defaultdict, deque, OrderedDict
+import re
+import bisect
+import functools
+import sqlite3
+import struct
+import threading
+import pytz
+try:
+    import fcntl
+except ImportError:  # windows: writers are only serialized within one process
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# startup timing - step -> (seconds, modules loaded), the first measurement of a step wins
+# because later streamlit reruns find everything imported already
+startup_timings = OrderedDict()
+
+def record_startup(step, seconds, modules=0):
+    if step not in startup_timings:
+        startup_timings[step] = (seconds, modules)
+        logger.info("startup: %s took %.0f ms", step, seconds * 1000)
+
+class LazyModule:
+    # stands in for a heavy module until an attribute is first used, so adding an
+    # expense or running a report never pays for pandas (~0.5s) or plotly it doesn't touch
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        module = self._module
+        if module is None:
+            cold = self._name not in sys.modules
+            loaded = len(sys.modules)
+            started = time.perf_counter()
+            module = self._module = importlib.import_module(self._name)
+            if cold:
+                record_startup(f"import {self._name}", time.perf_counter() - started,
+                               len(sys.modules) - loaded)
+        return getattr(module, attr)
+
+pd = LazyModule('pandas')
+np = LazyModule('numpy')
+
+# performance metrics - timings and counters around the hot paths, collected per streamlit
+# rerun (or per background write). off unless ACCOUNTING_METRICS=1 or the app's Performance
+# panel turns them on, and while off a timed call costs one dict lookup.
+# ACCOUNTING_METRICS_LOG=<file> appends every finished collection as a JSON line
+_metrics = {
+    'enabled': os.environ.get("ACCOUNTING_METRICS", "0") not in ("", "0"),
+    'log': os.environ.get("ACCOUNTING_METRICS_LOG"),
+}
+_metrics_local = threading.local()
+_metrics_log_lock = threading.Lock()
+METRICS_HISTORY = 50  # background write collections kept for the app's panel
+
+class Metrics:
+    def __init__(self, kind, name=None):
+        self.kind = kind  # 'rerun', 'write' or 'background'
+        self.name = name
+        self.started = time.perf_counter()
+        self.timings = {}   # label -> [calls, seconds]
+        self.counters = {}  # label -> total
+        self.lock = threading.Lock()  # the background collection is shared between threads
+    
+    def add_time(self, label, seconds):
+        with self.lock:
+            cell = self.timings.get(label)
+            if cell is None:
+                self.timings[label] = [1, seconds]
+            else:
+                cell[0] += 1
+                cell[1] += seconds
+    
+    def count(self, label, n=1):
+        with self.lock:
+            self.counters[label] = self.counters.get(label, 0) + n
+    
+    def to_dict(self):
+        with self.lock:
+            return {
+                'kind': self.kind,
+                'name': self.name,
+                'ms': round((time.perf_counter() - self.started) * 1000, 3),
+                'timings': {label: {'calls': calls, 'ms': round(seconds * 1000, 3)}
+                            for label, (calls, seconds) in self.timings.items()},
+                'counters': dict(self.counters),
+            }
+
+# anything timed on a thread with no collection of its own
+_background_metrics = Metrics('background')
+_write_metrics = deque(maxlen=METRICS_HISTORY)
+
+def metrics_enabled():
+    return _metrics['enabled']
+
+def enable_metrics(enabled=True, log=None):
+    _metrics['enabled'] = enabled
+    if log is not None:
+        _metrics['log'] = log or None
+
+def current_metrics():
+    return getattr(_metrics_local, 'metrics', None) or _background_metrics
+
+def begin_metrics(kind, name=None):
+    # starts this thread's collection, everything timed on the thread goes into it
+    metrics = _metrics_local.metrics = Metrics(kind, name)
+    return metrics
+
+def end_metrics(metrics, **fields):
+    # closes the collection: returns it as a dict and appends it to the metrics log
+    if getattr(_metrics_local, 'metrics', None) is metrics:
+        _metrics_local.metrics = None
+    record = {'time': get_time().isoformat(), **metrics.to_dict(), **fields}
+    if metrics.kind == 'write':
+        _write_metrics.append(record)
+    log = _metrics['log']
+    if log:
+        try:
+            with _metrics_log_lock, open(log, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False, default=str) + '\n')
+        except OSError:
+            logger.exception("could not write metrics to %s", log)
+    return record
+
+def recent_write_metrics():
+    return list(_write_metrics)
+
+def perf_count(label, n=1):
+    if _metrics['enabled']:
+        current_metrics().count(label, n)
+
+class PerfTimer:
+    # with PerfTimer("label"): ...  or  timer = PerfTimer("label").start() ... timer.stop()
+    __slots__ = ('label', 'started')
+    
+    def __init__(self, label):
+        self.label = label
+        self.started = None
+    
+    def start(self):
+        self.started = time.perf_counter() if _metrics['enabled'] else None
+        return self
+    
+    def stop(self):
+        if self.started is not None:
+            current_metrics().add_time(self.label, time.perf_counter() - self.started)
+            self.started = None
+    
+    def __enter__(self):
+        return self.start()
+    
+    def __exit__(self, *exc):
+        self.stop()
+
+def perf_timed(label=None):
+    def decorate(fn):
+        name = label or fn.__name__
+        
+        @functools.wraps(fn)
+        def timed(*args, **kwargs):
+            if not _metrics['enabled']:
+                return fn(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                current_metrics().add_time(name, time.perf_counter() - started)
+        return timed
+    return decorate
+
+# timezone setup - Sydney
+SYDNEY_TZ = pytz.timezone('Australia/Sydney')
+
+# data files
+# optional storage backends: ACCOUNTING_BACKEND=sqlite keeps the ledger in budget_data.db,
+# ACCOUNTING_BACKEND=binary uses a memory-mapped budget_data.ledger snapshot instead of JSON
+STORAGE_BACKEND = os.environ.get("ACCOUNTING_BACKEND", "json")
+JSON_FILE = "budget_data.json"
+LEDGER_FILE = "budget_data.ledger"
+SQLITE_FILE = "budget_data.db"
+DATA_FILE = LEDGER_FILE if STORAGE_BACKEND == "binary" else JSON_FILE
+# journal mode: new records are appended to a small log instead of rewriting the whole file
+JOURNAL_MODE = True
+JOURNAL_COMPACT_EVERY = 500  # fold the log into the snapshot after this many entries
+
+def get_time():
+    return datetime.now(SYDNEY_TZ)
+
+def fix_datetime(dt_string=None):
+    if dt_string:
+        return _sydney_display(dt_string)
+    # the page header asks on every rerun, the text only changes once a second
+    return _sydney_now_display(int(time.time()))
+
+@functools.lru_cache(maxsize=4096)
+def _sydney_display(dt_string):
+    try:
+        dt = datetime.fromisoformat(dt_string.replace('Z', '+00:00'))
+        if dt.tzinfo is None:
+            dt = pytz.UTC.localize(dt)
+        sydney_time = dt.astimezone(SYDNEY_TZ)
+        return sydney_time.strftime("%Y-%m-%d %H:%M:%S %Z")
+    except (TypeError, ValueError):
+        return dt_string
+
+@functools.lru_cache(maxsize=1)
+def _sydney_now_display(second):
+    return datetime.fromtimestamp(second, SYDNEY_TZ).strftime("%Y-%m-%d %H:%M:%S %Z")
+
+# transaction ids: T + UTC time to the millisecond + a 4 digit counter + an 8 hex digit process
+# tag, e.g. T202403150330051230000a1b2c3d4. they sort by creation time and two processes writing
+# the same ledger never clash. ids written in Sydney time before this (T%Y%m%d%H%M%S, or that
+# with a millisecond, counter and 2 hex digit tag) are converted to this layout on load
+ID_COUNTER_DIGITS = 4
+ID_COUNTER_LIMIT = 10 ** ID_COUNTER_DIGITS
+ID_TAG_BYTES = 4  # random per process, two processes issuing the same tick still differ
+ID_LENGTH = 1 + 14 + 3 + ID_COUNTER_DIGITS + 2 * ID_TAG_BYTES
+LEGACY_ID_PATTERN = re.compile(r"T(\d{14})(\d{7}[0-9a-f]{2})?((?:-\d{3})*)")
+
+class IdGenerator:
+    # a logical clock in units of 1/ID_COUNTER_LIMIT ms: it follows the wall clock but never
+    # goes backwards, so a burst of more than ID_COUNTER_LIMIT ids in one millisecond
+    # borrows from the next one instead of repeating. the time part is UTC, local time
+    # repeats an hour when daylight saving ends and the ids would sort out of order
+    def __init__(self, tag=None):
+        self.tag = tag or os.urandom(ID_TAG_BYTES).hex()
+        self.lock = threading.Lock()
+        self.last = 0
+        self.prefix_second = None
+        self.prefix = None
+    
+    def _reserve(self, n):
+        with self.lock:
+            start = max(self.last + 1, time.time_ns() // 1000000 * ID_COUNTER_LIMIT)
+            self.last = start + n - 1
+        return start
+    
+    def _second_prefix(self, second):
+        # the strftime part only changes once a second
+        if second != self.prefix_second:
+            self.prefix = "T" + datetime.fromtimestamp(second, pytz.utc).strftime('%Y%m%d%H%M%S')
+            self.prefix_second = second
+        return self.prefix
+    
+    def new_id(self):
+        return self.new_ids(1)[0]
+    
+    def new_ids(self, n):
+        # one lock round trip for the whole batch
+        if n <= 0:
+            return []
+        start = self._reserve(n)
+        tag = self.tag
+        ids = []
+        for tick in range(start, start + n):
+            ms, counter = divmod(tick, ID_COUNTER_LIMIT)
+            second, ms = divmod(ms, 1000)
+            ids.append(f"{self._second_prefix(second)}{ms:03d}{counter:04d}{tag}")
+        return ids
+
+_ids = IdGenerator()
+if hasattr(os, 'register_at_fork'):
+    # a forked child would carry on the parent's tag and clock, give it a tag of its own
+    os.register_at_fork(after_in_child=lambda: setattr(_ids, 'tag', os.urandom(ID_TAG_BYTES).hex()))
+
+def new_transaction_ids(n):
+    return _ids.new_ids(n)
+
+@functools.lru_cache(maxsize=65536)
+def _utc_hour(local_hour):
+    # Sydney %Y%m%d%H -> UTC %Y%m%d%H, None if it is no date. the offset is whole hours and
+    # daylight saving starts and ends on the hour, so minutes and seconds carry over as they are
+    try:
+        local = datetime.strptime(local_hour, '%Y%m%d%H')
+    except ValueError:
+        return None
+    return SYDNEY_TZ.localize(local, is_dst=True).astimezone(pytz.utc).strftime('%Y%m%d%H')
+
+def utc_id(record_id):
+    # the current form of a Sydney time id, None for any other id. no millisecond and counter
+    # become zeros and the tag is padded to full width, so the result never matches the old
+    # layouts again and sorts just before the new ids of the same second. the hour that
+    # repeats when daylight saving ends is always read as the first one
+    match = LEGACY_ID_PATTERN.fullmatch(record_id)
+    if match is None:
+        return None
+    digits = match[1]
+    hour = _utc_hour(digits[:10])
+    if hour is None:
+        return None
+    tail = match[2] or '0' * (3 + ID_COUNTER_DIGITS)
+    tick, tag = tail[:3 + ID_COUNTER_DIGITS], tail[3 + ID_COUNTER_DIGITS:]
+    return f"T{hour}{digits[10:]}{tick}{tag.rjust(2 * ID_TAG_BYTES, '0')}{match[3]}"
+
+def rekey_legacy_ids(transactions):
+    # Sydney time ids to UTC, the same way on every load until a save writes them out converted.
+    # ids of the current layout are never shorter, so they skip the pattern
+    converted = 0
+    for trans in transactions:
+        if len(trans.id) < ID_LENGTH:
+            record_id = utc_id(trans.id)
+            if record_id is not None:
+                trans.id = record_id
+                converted += 1
+    return converted
+
+def rekey_duplicate_ids(transactions):
+    # ledgers written before the generator above used one id per second, so bulk inserts
+    # share ids. the first record keeps it and later ones become <id>-001, <id>-002, ...
+    # in ledger order, so every load of the same file hands out the same ids
+    seen = set()
+    duplicates = []
+    for trans in transactions:
+        if trans.id in seen:
+            duplicates.append(trans)
+        else:
+            seen.add(trans.id)
+    for trans in duplicates:
+        n = 1
+        while f"{trans.id}-{n:03d}" in seen:
+            n += 1
+        trans.id = f"{trans.id}-{n:03d}"
+        seen.add(trans.id)
+    return len(duplicates)
+
+# create transaction function
+class Transaction:
+    # slots keep a loaded ledger small, category and date strings are interned
+    # because the same few values repeat on every record
+    __slots__ = ('id', 'amount', 'description', 'category', 'date', 'timestamp')
+    
+    def __init__(self, amount, description, category=None, date=None):
+        sydney_now = get_time()
+        
+        self.id = self.make_id()
+        self.amount = float(amount)
+        self.description = description
+        self.category = sys.intern(category or "Other")
+        
+        if date:
+            self.date = sys.intern(date)
+        else:
+            self.date = sys.intern(sydney_now.strftime("%Y-%m-%d"))
+        
+        self.timestamp = sydney_now.strftime("%Y-%m-%d %H:%M:%S")
+    
+    def make_id(self):
+        return _ids.new_id()
+    
+    @property
+    def timezone_display(self):
+        # AEST or AEDT, whichever applied when the record was made
+        try:
+            recorded = datetime.strptime(self.timestamp, "%Y-%m-%d %H:%M:%S")
+            return SYDNEY_TZ.localize(recorded).tzname()
+        except (TypeError, ValueError):
+            return get_time().tzname()
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'amount': self.amount,
+            'description': self.description,
+            'category': self.category,
+            'date': self.date,
+            'timestamp': self.timestamp
+        }
+    
+    @classmethod
+    def from_dict(cls, data):
+        # loading path: fill the slots straight from the stored fields,
+        # no clock calls and no throwaway id
+        trans = cls.__new__(cls)
+        trans.id = data['id']
+        trans.amount = float(data['amount'])
+        trans.description = data['description']
+        trans.category = sys.intern(data['category'] or "Other")
+        date = data.get('date')
+        trans.date = sys.intern(date) if date else sys.intern(get_time().strftime("%Y-%m-%d"))
+        trans.timestamp = data['timestamp']
+        return trans
+
+# date parsing - one grammar for the form, the date filter and statement imports, compiled once.
+# relative phrases resolve against today's Sydney date, which is cached until the next Sydney
+# midnight (localized, so a DST change moves it too); results are memoized per calendar day
+WEEKDAYS = ('monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday')
+RELATIVE_DAYS = {'today': 0, 'yesterday': -1, 'tomorrow': 1}
+DATE_GRAMMAR = r"""
+    (?P<word>today|yesterday|tomorrow)
+  | (?P<count>\d+|an?)\s*(?P<unit>days?|weeks?)\s*ago
+  | last\s+(?P<weekday>{weekdays})
+  | (?P<year>\d{{4}})-(?P<month>\d{{1,2}})-(?P<day>\d{{1,2}})
+  | (?P<dmy_day>\d{{1,2}})/(?P<dmy_month>\d{{1,2}})/(?P<dmy_year>\d{{4}})
+""".format(weekdays='|'.join(sorted(WEEKDAYS + tuple(day[:3] for day in WEEKDAYS), key=len, reverse=True)))
+
+class DateParser:
+    # today, yesterday, tomorrow, "3 days ago", "2 weeks ago", "last friday",
+    # 2024-07-14, 2024-7-14 and 14/07/2024
+    def __init__(self):
+        self.search_pattern = re.compile(r"\b(?:" + DATE_GRAMMAR + r")\b", re.IGNORECASE | re.VERBOSE)
+        self.full_pattern = re.compile(r"\s*(?:" + DATE_GRAMMAR + r")\s*", re.IGNORECASE | re.VERBOSE)
+        self._day = None
+        self._day_starts = self._day_ends = 0.0  # epoch seconds the cached day is valid for
+    
+    def today(self):
+        now = time.time()
+        if not self._day_starts <= now < self._day_ends:
+            current = get_time()
+            midnight = SYDNEY_TZ.localize(datetime(current.year, current.month, current.day))
+            tomorrow = SYDNEY_TZ.localize(datetime(current.year, current.month, current.day) + timedelta(days=1))
+            self._day = current.date()
+            self._day_starts, self._day_ends = midnight.timestamp(), tomorrow.timestamp()
+        return self._day
+    
+    def parse(self, text):
+        # the whole text is one date, returns a date or None
+        if not text:
+            return None
+        return self._parse(text, self.today().toordinal(), False)
+    
+    def find(self, text):
+        # first date mentioned anywhere in free text, e.g. "coffee yesterday"
+        if not text:
+            return None
+        return self._parse(text, self.today().toordinal(), True)
+    
+    def parse_many(self, values):
+        # batch version for imports: each distinct value is parsed once
+        today = self.today().toordinal()
+        parsed = {value: self._parse(value, today, False) if value else None for value in set(values)}
+        return [parsed[value] for value in values]
+    
+    @functools.lru_cache(maxsize=16384)
+    def _parse(self, text, today, search):
+        # today is part of the key, so relative phrases never outlive their day
+        if search:
+            matches = self.search_pattern.finditer(text)
+        else:
+            match = self.full_pattern.fullmatch(text)
+            matches = [match] if match else []
+        for match in matches:
+            ordinal = self._resolve(match, today)
+            if ordinal is not None:
+                return datetime.fromordinal(ordinal).date()
+        return None
+    
+    @staticmethod
+    def _resolve(match, today):
+        if match['word']:
+            return today + RELATIVE_DAYS[match['word'].lower()]
+        if match['count']:
+            count = 1 if match['count'].lower() in ('a', 'an') else int(match['count'])
+            return today - count * (7 if match['unit'].lower().startswith('week') else 1)
+        if match['weekday']:
+            weekday = [day[:3] for day in WEEKDAYS].index(match['weekday'][:3].lower())
+            # the one before today, a week back if today is that day
+            return today - ((datetime.fromordinal(today).weekday() - weekday) % 7 or 7)
+        if match['year']:
+            year, month, day = match['year'], match['month'], match['day']
+        else:
+            year, month, day = match['dmy_year'], match['dmy_month'], match['dmy_day']
+        try:
+            return datetime(int(year), int(month), int(day)).toordinal()
+        except ValueError:
+            return None
+
+date_parser = DateParser()
+
+def parse_date_from_text(description):
+    found = date_parser.find(description)
+    return found.strftime("%Y-%m-%d") if found else None
+
+# detect text imput like yesterday/tmr, anything else is today
+def parse_date_input(date_input):
+    parsed = date_parser.parse(date_input) or date_parser.today()
+    return parsed.strftime("%Y-%m-%d")
+
+def get_date_examples():
+    return ["today", "yesterday", "3 days ago", "2 weeks ago", "last friday", "2024-01-15", "15/01/2024"]
+
+def parse_filter_date(date_string):
+    return date_parser.parse(date_string)
+
+# date index - dates are parsed once into ordinals and kept sorted,
+# so a range query is two binary searches plus a slice
+@functools.lru_cache(maxsize=65536)
+def date_ordinal(date_string):
+    try:
+        return datetime.strptime(date_string, "%Y-%m-%d").toordinal()
+    except (TypeError, ValueError):
+        return None
+
+class DateIndex:
+    def __init__(self, transactions=()):
+        pairs = []
+        for trans in transactions:
+            ordinal = date_ordinal(trans.date)
+            if ordinal is not None:
+                pairs.append((ordinal, trans))
+        # stable sort, records on the same day stay in ledger order
+        pairs.sort(key=lambda pair: pair[0])
+        self.keys = [pair[0] for pair in pairs]
+        self.items = [pair[1] for pair in pairs]
+    
+    @classmethod
+    def from_columns(cls, transactions, columns):
+        # same index from a ColumnarLedger of the same rows, one stable argsort instead of a parse per row
+        index = cls()
+        order = np.argsort(columns.days, kind='stable')
+        order = order[columns.days[order] != 0]
+        index.keys = columns.days[order].tolist()
+        index.items = [transactions[i] for i in order.tolist()]
+        return index
+    
+    def add(self, trans):
+        ordinal = date_ordinal(trans.date)
+        if ordinal is None:
+            return
+        # new records are usually the latest date, so this is close to a plain append
+        i = bisect.bisect_right(self.keys, ordinal)
+        self.keys.insert(i, ordinal)
+        self.items.insert(i, trans)
+    
+    def remove(self, trans):
+        ordinal = date_ordinal(trans.date)
+        if ordinal is None:
+            return
+        lo = bisect.bisect_left(self.keys, ordinal)
+        hi = bisect.bisect_right(self.keys, ordinal)
+        for i in range(lo, hi):
+            if self.items[i] is trans:
+                del self.keys[i]
+                del self.items[i]
+                return
+    
+    def range(self, start_date, end_date):
+        lo = bisect.bisect_left(self.keys, start_date.toordinal())
+        hi = bisect.bisect_right(self.keys, end_date.toordinal())
+        return self.items[lo:hi]
+
+class LedgerAggregates:
+    # running totals kept next to the ledger, O(1) per added or removed record,
+    # so the page metrics never rescan the list
+    def __init__(self, transactions=()):
+        self.total = 0.0
+        self.count = 0
+        self.category_sums = {}    # category -> amount, first-seen order
+        self.category_counts = {}
+        self.date_counts = {}      # date -> records, to find the new min/max after a removal
+        self.earliest = None
+        self.latest = None
+        for trans in transactions:
+            self.add(trans)
+    
+    @classmethod
+    def from_columns(cls, columns):
+        # bulk version for a ColumnarLedger whose dates are all plain YYYY-MM-DD
+        aggregates = cls()
+        if not len(columns):
+            return aggregates
+        sums = np.bincount(columns.category_codes, weights=columns.amounts, minlength=len(columns.categories))
+        counts = np.bincount(columns.category_codes, minlength=len(columns.categories))
+        for cat, total, count in zip(columns.categories, sums.tolist(), counts.tolist()):
+            if count:
+                aggregates.category_sums[sys.intern(cat)] = total
+                aggregates.category_counts[sys.intern(cat)] = count
+        days, day_counts = np.unique(columns.days, return_counts=True)
+        names = (days.astype(np.int64) - ORDINAL_EPOCH).astype('datetime64[D]').astype(str).tolist()
+        aggregates.date_counts = {sys.intern(name): count for name, count in zip(names, day_counts.tolist())}
+        aggregates.earliest = names[0]
+        aggregates.latest = names[-1]
+        aggregates.total = float(columns.amounts.sum())
+        aggregates.count = len(columns)
+        return aggregates
+    
+    def add(self, trans):
+        self.total += trans.amount
+        self.count += 1
+        cat = trans.category
+        self.category_sums[cat] = self.category_sums.get(cat, 0.0) + trans.amount
+        self.category_counts[cat] = self.category_counts.get(cat, 0) + 1
+        date = trans.date
+        self.date_counts[date] = self.date_counts.get(date, 0) + 1
+        if self.earliest is None or date < self.earliest:
+            self.earliest = date
+        if self.latest is None or date > self.latest:
+            self.latest = date
+    
+    def remove(self, trans):
+        self.count -= 1
+        self.total = self.total - trans.amount if self.count else 0.0
+        cat = trans.category
+        self.category_counts[cat] -= 1
+        if self.category_counts[cat]:
+            self.category_sums[cat] -= trans.amount
+        else:
+            del self.category_counts[cat]
+            del self.category_sums[cat]
+        date = trans.date
+        self.date_counts[date] -= 1
+        if not self.date_counts[date]:
+            del self.date_counts[date]
+            # only the distinct dates are scanned, and only when an end of the range disappears
+            if date == self.earliest:
+                self.earliest = min(self.date_counts, default=None)
+            if date == self.latest:
+                self.latest = max(self.date_counts, default=None)
+    
+    def summary(self):
+        return {
+            'total': self.total,
+            'count': self.count,
+            'average': self.total / self.count if self.count > 0 else 0,
+            'categories': len(self.category_sums),
+            'earliest': self.earliest,
+            'latest': self.latest,
+        }
+    
+    def analyze(self):
+        if not self.count:
+            return {"error": "no data"}
+        return _build_analysis(self.category_sums, self.total, self.count)
+
+# period rollups - totals per day, ISO week and month, broken down by category, updated on
+# every insert and removal and saved with the snapshot. a period query or a trend view reads
+# one bucket per period instead of every record in it
+ROLLUP_PERIODS = ('day', 'week', 'month')
+
+@functools.lru_cache(maxsize=65536)
+def period_labels(ordinal):
+    # (day, week, month) labels of a date ordinal, a week is labelled by its Monday
+    # like ColumnarLedger.period_totals; ISO strings sort in date order
+    day = datetime.fromordinal(ordinal)
+    monday = datetime.fromordinal(ordinal - day.weekday())
+    return day.strftime("%Y-%m-%d"), monday.strftime("%Y-%m-%d"), day.strftime("%Y-%m")
+
+class PeriodRollups:
+    def __init__(self, transactions=()):
+        self.buckets = {period: {} for period in ROLLUP_PERIODS}  # period -> label -> {category: [total, count]}
+        self.labels = {period: [] for period in ROLLUP_PERIODS}   # sorted labels, for range queries
+        self.records = 0  # records added, the snapshot prefix a saved copy covers
+        self.add_many(transactions)
+    
+    @classmethod
+    def from_dict(cls, data):
+        rollups = cls()
+        rollups.records = data['records']
+        for period in ROLLUP_PERIODS:
+            rollups.buckets[period] = data[period]
+            rollups.labels[period] = sorted(data[period])
+        return rollups
+    
+    def to_dict(self):
+        data = {'records': self.records}
+        for period in ROLLUP_PERIODS:
+            buckets = self.buckets[period]
+            data[period] = {label: buckets[label] for label in self.labels[period]}
+        return data
+    
+    def add_many(self, transactions):
+        # grouped by (date, category) first, so each bucket is touched once per group
+        groups = {}
+        n = 0
+        for trans in transactions:
+            n += 1
+            key = (trans.date, trans.category)
+            cell = groups.get(key)
+            if cell is None:
+                groups[key] = [trans.amount, 1]
+            else:
+                cell[0] += trans.amount
+                cell[1] += 1
+        self.records += n
+        for (date, category), (amount, count) in groups.items():
+            self._apply(date, category, amount, count)
+    
+    def add(self, trans):
+        self.records += 1
+        self._apply(trans.date, trans.category, trans.amount, 1)
+    
+    def remove(self, trans):
+        self.records -= 1
+        self._apply(trans.date, trans.category, -trans.amount, -1)
+    
+    def _apply(self, date, category, amount, count):
+        ordinal = date_ordinal(date)
+        if ordinal is None:
+            return
+        for period, label in zip(ROLLUP_PERIODS, period_labels(ordinal)):
+            buckets = self.buckets[period]
+            bucket = buckets.get(label)
+            if bucket is None:
+                bucket = buckets[label] = {}
+                bisect.insort(self.labels[period], label)
+            cell = bucket.get(category)
+            if cell is None:
+                cell = bucket[category] = [0.0, 0]
+            cell[0] += amount
+            cell[1] += count
+            if not cell[1]:
+                del bucket[category]
+                if not bucket:
+                    del buckets[label]
+                    labels = self.labels[period]
+                    del labels[bisect.bisect_left(labels, label)]
+    
+    def range_totals(self, start_date, end_date):
+        # category -> {'total', 'count'} over the days from start_date to end_date
+        labels = self.labels['day']
+        lo = bisect.bisect_left(labels, start_date.strftime("%Y-%m-%d"))
+        hi = bisect.bisect_right(labels, end_date.strftime("%Y-%m-%d"))
+        days = self.buckets['day']
+        totals = {}
+        for label in labels[lo:hi]:
+            for category, (amount, count) in days[label].items():
+                cell = totals.get(category)
+                if cell is None:
+                    totals[category] = {'total': amount, 'count': count}
+                else:
+                    cell['total'] += amount
+                    cell['count'] += count
+        return totals
+    
+    def period_totals(self, period='month'):
+        # label -> {'total', 'count'}, oldest first, same shape as ColumnarLedger.period_totals
+        buckets = self.buckets[period]
+        return {label: {'total': sum(cell[0] for cell in buckets[label].values()),
+                        'count': sum(cell[1] for cell in buckets[label].values())}
+                for label in self.labels[period]}
+    
+    def period_breakdown(self, period='month'):
+        # label -> {category: total}, oldest first
+        buckets = self.buckets[period]
+        return {label: {category: cell[0] for category, cell in buckets[label].items()}
+                for label in self.labels[period]}
+    
+    def period_spent(self, period, date, category=None):
+        # total of the day, week or month holding date, one category or all of them
+        ordinal = date_ordinal(date)
+        if ordinal is None:
+            return 0.0
+        bucket = self.buckets[period].get(period_labels(ordinal)[ROLLUP_PERIODS.index(period)], {})
+        if category is None:
+            return sum((cell[0] for cell in bucket.values()), 0.0)
+        cell = bucket.get(category)
+        return cell[0] if cell is not None else 0.0
+
+# description search - every word of the query must start a word of the description,
+# so "uber ea" finds "Uber Eats dinner" and "wool" finds "woolworths metro"
+SEARCH_WORD_PATTERN = re.compile(r"\w+")
+
+def search_terms(query):
+    return SEARCH_WORD_PATTERN.findall(str(query or '').lower())
+
+def matches_terms(description, terms):
+    words = search_terms(description)
+    return all(any(word.startswith(term) for word in words) for term in terms)
+
+class DescriptionIndex:
+    # inverted index: word -> codes of the distinct descriptions holding it. descriptions repeat
+    # a lot, so a query is answered on them first and then mapped to records with one array
+    # lookup over the description code of every record (kept in ledger order)
+    def __init__(self, transactions=()):
+        self.codes = {}     # description -> code
+        self.postings = {}  # word -> set of description codes
+        self.words = []     # sorted, a prefix is a bisect range
+        self.rows = []      # description code per record
+        self._array = None  # numpy copy of rows, caught up on the next query
+        codes, rows = self.codes, self.rows
+        for trans in transactions:
+            code = codes.get(trans.description)
+            if code is None:
+                code = self._new_description(trans.description, bulk=True)
+            rows.append(code)
+        self.words.sort()
+    
+    def _new_description(self, description, bulk=False):
+        code = len(self.codes)
+        for word in set(search_terms(description)):
+            posting = self.postings.get(word)
+            if posting is None:
+                posting = self.postings[word] = set()
+                if bulk:
+                    self.words.append(word)
+                else:
+                    bisect.insort(self.words, word)
+            posting.add(code)
+        self.codes[description] = code
+        return code
+    
+    def add(self, trans):
+        code = self.codes.get(trans.description)
+        if code is None:
+            code = self._new_description(trans.description)
+        self.rows.append(code)
+    
+    def remove(self, position):
+        # the description keeps its code, no record points at it any more
+        del self.rows[position]
+        self._array = None
+    
+    def replace(self, position, trans):
+        code = self.codes.get(trans.description)
+        if code is None:
+            code = self._new_description(trans.description)
+        self.rows[position] = code
+        array = self._array
+        if array is not None and position < len(array):
+            # copied, a query may be holding the old one
+            array = array.copy()
+            array[position] = code
+            self._array = array
+    
+    def matching_codes(self, terms):
+        found = []
+        for term in set(terms):
+            lo = bisect.bisect_left(self.words, term)
+            hi = bisect.bisect_left(self.words, term + '\U0010ffff')
+            found.append(set().union(*(self.postings[word] for word in self.words[lo:hi])))
+        # smallest set first, the intersection never grows
+        found.sort(key=len)
+        return functools.reduce(set.intersection, found) if found else set()
+    
+    def row_codes(self):
+        # records are appended far more often than searched, so only the new tail is converted
+        n = len(self.rows)
+        array = self._array
+        if array is None or len(array) > n:
+            array = np.array(self.rows[:n], dtype=np.int32)
+        elif len(array) < n:
+            array = np.concatenate((array, np.array(self.rows[len(array):n], dtype=np.int32)))
+        self._array = array
+        return array
+    
+    def mask(self, query):
+        # boolean mask over the records, everything when the query has no words
+        terms = search_terms(query)
+        rows = self.row_codes()
+        if not terms:
+            return np.ones(len(rows), dtype=bool)
+        # sized after rows, so every code in rows fits
+        hit = np.zeros(len(self.codes), dtype=bool)
+        hit[list(self.matching_codes(terms))] = True
+        return hit[rows]
+
+# duplicates - same amount, description (case and spacing aside) and date. double submits of
+# the add form are seconds apart, so the form also checks the timestamps against a window
+DUPLICATE_WINDOW = 10 * 60  # seconds
+DUPLICATE_MODES = ('skip', 'flag', 'keep')  # what an import does with rows already in the ledger
+
+@functools.lru_cache(maxsize=65536)
+def _normal_description(description):
+    return " ".join(str(description).lower().split())
+
+def duplicate_key(trans):
+    # cents, so float noise never splits a key
+    return round(trans.amount * 100), _normal_description(trans.description), trans.date
+
+@functools.lru_cache(maxsize=65536)
+def _entered_at(timestamp):
+    try:
+        return datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S")
+    except (TypeError, ValueError):
+        return None
+
+def entered_within(a, b, window):
+    # timestamps of two records at most window seconds apart, None means any time
+    if window is None:
+        return True
+    first, second = _entered_at(a.timestamp), _entered_at(b.timestamp)
+    return first is not None and second is not None and abs((first - second).total_seconds()) <= window
+
+class DuplicateIndex:
+    # hash index on duplicate_key. almost every key has one record, so the first record of a
+    # key is stored directly and only the later ones go into a side table
+    def __init__(self, transactions=()):
+        self.first = {}  # key -> record
+        self.more = {}   # key -> later records, ledger order
+        for trans in transactions:
+            self.add(trans)
+    
+    def add(self, trans):
+        key = duplicate_key(trans)
+        if self.first.setdefault(key, trans) is not trans:
+            self.more.setdefault(key, []).append(trans)
+    
+    def remove(self, trans):
+        key = duplicate_key(trans)
+        rest = self.more.get(key)
+        if self.first.get(key) is trans:
+            if rest:
+                self.first[key] = rest.pop(0)
+            else:
+                del self.first[key]
+        elif rest:
+            for i, other in enumerate(rest):
+                if other is trans:
+                    del rest[i]
+                    break
+        if rest is not None and not rest:
+            del self.more[key]
+    
+    def count(self, key):
+        return (key in self.first) + len(self.more.get(key, ()))
+    
+    def frozen_count(self):
+        # count as of now, records added or removed later don't change it. copies the key
+        # table (not the records), a C level dict copy
+        first = dict(self.first)
+        more = {key: len(rest) for key, rest in self.more.items()}
+        return lambda key: (key in first) + more.get(key, 0)
+    
+    def matches(self, trans, window=None):
+        # other records with the key of trans, entered within window seconds of it
+        key = duplicate_key(trans)
+        first = self.first.get(key)
+        if first is None:
+            return []
+        return [other for other in [first] + self.more.get(key, [])
+                if other is not trans and entered_within(other, trans, window)]
+
+def _within(trans, category=None, start_date=None, end_date=None):
+    if category is not None and trans.category != category:
+        return False
+    if start_date is None and end_date is None:
+        return True
+    ordinal = date_ordinal(trans.date)
+    if ordinal is None:
+        return False
+    return ((start_date is None or ordinal >= start_date.toordinal())
+            and (end_date is None or ordinal <= end_date.toordinal()))
+
+# every change to any ledger gets a new version number, the render cache keys on it
+_ledger_versions = itertools.count(1)
+
+class Ledger(list):
+    # list of Transactions that keeps its indexes and running totals in step with appends and removals
+    def __init__(self, transactions=(), columns=None, rollups=None, category_model=None):
+        super().__init__(transactions)
+        self._rebuild(columns, rollups, category_model)
+    
+    def _rebuild(self, columns=None, rollups=None, category_model=None):
+        # columns: a ColumnarLedger of the first len(columns) records (a binary snapshot),
+        # indexed in bulk; records after them (the journal) are added one by one.
+        # rollups, category_model: the PeriodRollups and CategoryModel saved with the snapshot, same idea
+        if columns is not None:
+            self.date_index = DateIndex.from_columns(self, columns)
+            self.aggregates = LedgerAggregates.from_columns(columns)
+            for trans in self[len(columns):]:
+                self.date_index.add(trans)
+                self.aggregates.add(trans)
+        else:
+            self.date_index = DateIndex(self)
+            self.aggregates = LedgerAggregates(self)
+        if rollups is not None:
+            rollups.add_many(self[rollups.records:])
+            self.rollups = rollups
+        else:
+            self.rollups = PeriodRollups(self)
+        if category_model is not None:
+            category_model.add_many(self[category_model.records:])
+            self.category_model = category_model
+        else:
+            self.category_model = CategoryModel(self)
+        self.description_index = DescriptionIndex(self)
+        self._duplicate_index = None  # built on first use, most sessions never look for duplicates
+        # id -> sequence number, built on the first lookup by id. records are numbered in ledger
+        # order and appends take the next number; _sequences holds the numbers of the records
+        # still there by position (sorted, so a bisect turns a number into a position) and
+        # stays None until the first removal, while number and position are the same
+        self._ids = None
+        self._sequences = None
+        self._next_sequence = 0
+        self.version = next(_ledger_versions)
+    
+    @property
+    def duplicate_index(self):
+        if self._duplicate_index is None:
+            self._duplicate_index = DuplicateIndex(self)
+        return self._duplicate_index
+    
+    def _id_map(self):
+        if self._ids is None:
+            self._ids = {trans.id: i for i, trans in enumerate(self)}
+            self._sequences = None
+            self._next_sequence = len(self)
+        return self._ids
+    
+    def _sequence_at(self, position):
+        return position if self._sequences is None else self._sequences[position]
+    
+    def _position(self, record_id):
+        sequence = self._id_map().get(record_id)
+        if sequence is None or self._sequences is None:
+            return sequence
+        return bisect.bisect_left(self._sequences, sequence)
+    
+    def _on_add(self, trans):
+        self.date_index.add(trans)
+        self.aggregates.add(trans)
+        self.rollups.add(trans)
+        self.category_model.add(trans)
+        self.description_index.add(trans)
+        if self._duplicate_index is not None:
+            self._duplicate_index.add(trans)
+        if self._ids is not None:
+            self._ids[trans.id] = self._next_sequence
+            if self._sequences is not None:
+                self._sequences.append(self._next_sequence)
+            self._next_sequence += 1
+        self.version = next(_ledger_versions)
+    
+    def _on_remove(self, trans, position):
+        self.date_index.remove(trans)
+        self.aggregates.remove(trans)
+        self.rollups.remove(trans)
+        self.category_model.remove(trans)
+        self.description_index.remove(position)
+        if self._duplicate_index is not None:
+            self._duplicate_index.remove(trans)
+        if self._ids is not None:
+            if self._sequences is None:
+                self._sequences = array('q', range(len(self) + 1))
+            sequence = self._sequences.pop(position)
+            if self._ids.get(trans.id) == sequence:
+                del self._ids[trans.id]
+        self.version = next(_ledger_versions)
+    
+    def _on_replace(self, old, new, position):
+        # an edit: out of every index under the old values, back in under the new ones
+        for index in (self.date_index, self.aggregates, self.rollups, self.category_model, self._duplicate_index):
+            if index is not None:
+                index.remove(old)
+                index.add(new)
+        self.description_index.replace(position, new)
+        if self._ids is not None:
+            sequence = self._sequence_at(position)
+            if self._ids.get(old.id) == sequence:
+                del self._ids[old.id]
+            self._ids[new.id] = sequence
+        self.version = next(_ledger_versions)
+    
+    def append(self, trans):
+        super().append(trans)
+        self._on_add(trans)
+    
+    def extend(self, transactions):
+        transactions = list(transactions)
+        super().extend(transactions)
+        for trans in transactions:
+            self._on_add(trans)
+    
+    def __iadd__(self, transactions):
+        self.extend(transactions)
+        return self
+    
+    def remove(self, trans):
+        # the description index is positional, so find the record first: through the id map,
+        # a scan only for a record that shares its id with another
+        i = self._position(trans.id)
+        if i is None or self[i] is not trans:
+            i = self.index(trans)
+        super().__delitem__(i)
+        self._on_remove(trans, i)
+    
+    def pop(self, i=-1):
+        if i < 0:
+            i += len(self)
+        trans = super().pop(i)
+        self._on_remove(trans, i)
+        return trans
+    
+    # anything else that changes membership just rebuilds
+    def insert(self, i, trans):
+        super().insert(i, trans)
+        self._rebuild()
+    
+    def __setitem__(self, i, value):
+        super().__setitem__(i, value)
+        self._rebuild()
+    
+    def __delitem__(self, i):
+        super().__delitem__(i)
+        self._rebuild()
+    
+    def clear(self):
+        super().clear()
+        self._rebuild()
+    
+    def filter_days(self, start_date, end_date):
+        return self.date_index.range(start_date, end_date)
+    
+    def summary(self):
+        return self.aggregates.summary()
+    
+    def analyze(self):
+        return self.aggregates.analyze()
+    
+    def category_names(self):
+        return sorted(self.aggregates.category_sums)
+    
+    def category_summary(self, category):
+        count = self.aggregates.category_counts.get(category, 0)
+        total = self.aggregates.category_sums.get(category, 0.0)
+        return {'count': count, 'total': total, 'average': total / count if count else 0}
+    
+    def range_totals(self, start_date, end_date):
+        return self.rollups.range_totals(start_date, end_date)
+    
+    def period_totals(self, period='month'):
+        return self.rollups.period_totals(period)
+    
+    def period_breakdown(self, period='month'):
+        return self.rollups.period_breakdown(period)
+    
+    def period_spent(self, period, date, category=None):
+        return self.rollups.period_spent(period, date, category)
+    
+    def get_record(self, record_id):
+        i = self._position(record_id)
+        return None if i is None else self[i]
+    
+    # by id: a dict lookup and a bisect to find the record, the list and the description
+    # index still shift the records after a deleted one down (a memmove, no per-record work)
+    def update_record(self, record_id, new):
+        # new takes the place of the record with that id, returns the old one (None if there is none)
+        i = self._position(record_id)
+        if i is None:
+            return None
+        old = self[i]
+        super().__setitem__(i, new)
+        self._on_replace(old, new, i)
+        return old
+    
+    def delete_record(self, record_id):
+        i = self._position(record_id)
+        if i is None:
+            return None
+        old = super().pop(i)
+        self._on_remove(old, i)
+        return old
+    
+    def search_mask(self, query):
+        return self.description_index.mask(query)
+    
+    def search(self, query, category=None, start_date=None, end_date=None):
+        hits = np.flatnonzero(self.search_mask(query)).tolist()
+        perf_count('rows scanned', len(hits))
+        return [trans for trans in map(self.__getitem__, hits) if _within(trans, category, start_date, end_date)]
+    
+    def duplicates_of(self, trans, window=None):
+        return self.duplicate_index.matches(trans, window)
+
+# range filter: to choose data range
+@perf_timed()
+def filter_by_date_range(transactions, start_date, end_date):
+    if hasattr(transactions, 'filter_days'):
+        filtered = transactions.filter_days(start_date, end_date)
+        perf_count('rows scanned', len(filtered))
+        return filtered
+    perf_count('rows scanned', len(transactions))
+    filtered = []
+    for trans in transactions:
+        try:
+            trans_date = datetime.strptime(trans.date, "%Y-%m-%d").date()
+            if start_date <= trans_date <= end_date:
+                filtered.append(trans)
+        except:
+            continue
+    return filtered
+
+# period totals for any kind of ledger: a Ledger or SqliteStore answers from its rollups,
+# a plain list is rolled up on the spot
+def range_totals(transactions, start_date, end_date):
+    if hasattr(transactions, 'range_totals'):
+        return transactions.range_totals(start_date, end_date)
+    return PeriodRollups(filter_by_date_range(transactions, start_date, end_date)).range_totals(start_date, end_date)
+
+@perf_timed()
+def range_summary(transactions, start_date, end_date):
+    totals = range_totals(transactions, start_date, end_date)
+    total = sum(cell['total'] for cell in totals.values())
+    count = sum(cell['count'] for cell in totals.values())
+    return {
+        'total': total,
+        'count': count,
+        'average': total / count if count > 0 else 0,
+        'category_totals': {category: cell['total'] for category, cell in totals.items()},
+    }
+
+@perf_timed()
+def analyze_range(transactions, start_date, end_date):
+    summary = range_summary(transactions, start_date, end_date)
+    if not summary['count']:
+        return {"error": "no data"}
+    return _build_analysis(summary['category_totals'], summary['total'], summary['count'])
+
+def period_totals(transactions, period='month'):
+    if hasattr(transactions, 'period_totals'):
+        return transactions.period_totals(period)
+    return PeriodRollups(transactions).period_totals(period)
+
+@perf_timed()
+def period_breakdown(transactions, period='month'):
+    if hasattr(transactions, 'period_breakdown'):
+        return transactions.period_breakdown(period)
+    return PeriodRollups(transactions).period_breakdown(period)
+
+def period_range(period, ordinal):
+    # first and last day of the day, week (from Monday) or month holding a date ordinal
+    day = datetime.fromordinal(ordinal).date()
+    if period == 'day':
+        return day, day
+    if period == 'week':
+        start = day - timedelta(days=day.weekday())
+        return start, start + timedelta(days=6)
+    start = day.replace(day=1)
+    following = (start + timedelta(days=31)).replace(day=1)
+    return start, following - timedelta(days=1)
+
+# spent in the period holding date (a date string), one category or all: a Ledger reads one
+# rollup bucket, a SqliteStore or a list totals the period's days
+@perf_timed()
+def period_spent(transactions, period, date, category=None):
+    if hasattr(transactions, 'period_spent'):
+        return transactions.period_spent(period, date, category)
+    ordinal = date_ordinal(date)
+    if ordinal is None:
+        return 0.0
+    totals = range_totals(transactions, *period_range(period, ordinal))
+    if category is None:
+        return sum((cell['total'] for cell in totals.values()), 0.0)
+    return totals.get(category, {}).get('total', 0.0)
+
+# description search for any kind of ledger: a Ledger answers from its word index and a
+# SqliteStore from its fts5 table, a plain list is scanned. hits stay in ledger order
+@perf_timed()
+def search_transactions(transactions, query, category=None, start_date=None, end_date=None):
+    if hasattr(transactions, 'search'):
+        return transactions.search(query, category, start_date, end_date)
+    terms = search_terms(query)
+    perf_count('rows scanned', len(transactions))
+    return [t for t in transactions
+            if _within(t, category, start_date, end_date) and matches_terms(t.description, terms)]
+
+@perf_timed()
+def description_mask(transactions, query):
+    # numpy bool per record, ledger order
+    if hasattr(transactions, 'search_mask'):
+        return transactions.search_mask(query)
+    terms = search_terms(query)
+    perf_count('rows scanned', len(transactions))
+    return np.fromiter((matches_terms(t.description, terms) for t in transactions), dtype=bool,
+                       count=len(transactions))
+
+# category guessing - basic keyword matching
+CATEGORY_KEYWORDS_FILE = "category_keywords.json"
+DEFAULT_CATEGORY_KEYWORDS = {
+    'Food&Drinks': ['coffee', 'milk tea', 'breakfast', 'lunch', 'dinner', 'canteen', 'mcdonalds', 'starbucks', 'uber eats', 'deliveroo', 'food', 'restaurant', 'cafe', 'drink'],
+    'Transportation': ['subway', 'bus', 'taxi', 'gas cost', 'parking', 'train ticket', 'air ticket', 'transport', 'opal', 'metro', 'uber', 'fuel'],
+    'Shopping': ['supermarket', 'shoes', 'clothing', 'skin care products', 'electronic products', 'amazon', 'woolworths', 'coles', 'target', 'kmart', 'shop'],
+    'Entertainment': ['movies', 'games', 'ktv', 'travel', 'gym', 'bookstore', 'concert', 'cinema', 'netflix', 'spotify', 'gaming'],
+    'Medical': ['hospital', 'pharmacy', 'physical examination', 'dentist', 'medicine', 'doctor', 'clinic', 'health'],
+    'Education': ['tuition', 'tutoring', 'exam fees', 'textbooks', 'uts', 'university', 'course', 'book', 'study'],
+    'Life Expense': ['rent', 'utilities', 'internet', 'furniture', 'electricity', 'water', 'gas', 'phone', 'home'],
+    'Other': []
+}
+
+def _trie_pattern(words):
+    # factor the keywords by shared prefixes, e.g. book(?:store)?, so the regex engine
+    # checks one character per position instead of trying every keyword in turn
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[''] = {}
+    
+    def build(node):
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ''
+        group = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        if '' in node:
+            # greedy optional, the longest keyword wins
+            return '(?:' + group + ')?'
+        return group
+    
+    return build(trie)
+
+class CategoryMatcher:
+    # the whole keyword table compiled into one regex. the lookahead reports the longest
+    # keyword starting at each position, and shorter keywords that are prefixes of it are
+    # added back from a table, so overlapping hits like 'uber' / 'uber eats' both still score
+    def __init__(self, keywords):
+        self.categories = list(keywords)
+        self.owners = defaultdict(list)  # keyword -> index of every category listing it
+        for idx, words in enumerate(keywords.values()):
+            for word in words:
+                if word:
+                    self.owners[word.lower()].append(idx)
+        words = sorted(self.owners, key=len, reverse=True)
+        self.prefixes = {word: [p for p in words if word.startswith(p)] for word in words}
+        self.pattern = re.compile('(?=(' + _trie_pattern(words) + '))') if words else None
+    
+    def _pick(self, found):
+        # 2 points per keyword found, first category wins a tie, same as the old loop
+        scores = [0] * len(self.categories)
+        for word in found:
+            for idx in self.owners[word]:
+                scores[idx] += 2
+        best = max(scores, default=0)
+        if best > 0:
+            return self.categories[scores.index(best)]
+        return 'Other'
+    
+    def guess(self, description):
+        if self.pattern is None:
+            return 'Other'
+        hits = self.pattern.findall(description.lower())
+        if not hits:
+            return 'Other'
+        found = set()
+        for word in hits:
+            found.update(self.prefixes[word])
+        return self._pick(found)
+    
+    def guess_many(self, descriptions):
+        # statements repeat the same merchants over and over, each distinct text is matched once
+        if not isinstance(descriptions, (list, tuple)):
+            descriptions = list(descriptions)
+        guesses = {desc: self.guess(desc) for desc in set(descriptions)}
+        return [guesses[desc] for desc in descriptions]
+
+def load_category_keywords(filename=CATEGORY_KEYWORDS_FILE):
+    if filename and os.path.exists(filename):
+        try:
+            with open(filename, 'r', encoding='utf-8') as f:
+                return {cat: list(words) for cat, words in json.load(f).items()}
+        except (OSError, ValueError, AttributeError):
+            pass
+    return {cat: list(words) for cat, words in DEFAULT_CATEGORY_KEYWORDS.items()}
+
+# keyword table and its compiled matcher
+_category = {'keywords': load_category_keywords(), 'matcher': None}
+
+def get_category_keywords():
+    return _category['keywords']
+
+def set_category_keywords(keywords, filename=CATEGORY_KEYWORDS_FILE):
+    # replacing the table drops the compiled matcher, the next guess recompiles it
+    _category['keywords'] = {cat: [w.strip().lower() for w in words if w.strip()] for cat, words in keywords.items()}
+    _category['matcher'] = None
+    if filename:
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump(_category['keywords'], f, ensure_ascii=False, indent=2)
+
+def get_category_matcher():
+    if _category['matcher'] is None:
+        _category['matcher'] = CategoryMatcher(_category['keywords'])
+    return _category['matcher']
+
+# category learning - multinomial naive bayes over description words, kept by the ledger like
+# its other indexes: per category the number of records and how often each word appeared in
+# them, so adding, editing or deleting a record only touches its own words. the keyword table
+# is the prior: its guess counts as a few extra records of the description in that category,
+# which decides while the ledger has little to say and gets outvoted once it has
+CATEGORY_SMOOTHING = 1.0   # laplace, added to every count
+KEYWORD_PRIOR_RECORDS = 3  # records the keyword guess is worth
+
+# words with a letter in them, numbers (amounts, dates, store numbers) say nothing about the category
+CATEGORY_WORD_PATTERN = re.compile(r"\w*[^\W\d]\w*")
+
+@functools.lru_cache(maxsize=65536)
+def category_words(description):
+    return tuple(CATEGORY_WORD_PATTERN.findall(str(description or '').lower()))
+
+class CategoryModel:
+    def __init__(self, transactions=()):
+        self.categories = []  # index -> category
+        self.index = {}       # category -> index
+        self.docs = []        # records per category
+        self.totals = []      # words per category
+        self.counts = {}      # word -> count per category
+        self.records = 0      # records learned, the snapshot prefix a saved copy covers
+        self.changes = 0      # bumped on every change, guess_many caches its arrays on it
+        self._arrays = None
+        self.add_many(transactions)
+    
+    @classmethod
+    def from_dict(cls, data):
+        model = cls()
+        model.records = data['records']
+        model.categories = list(data['categories'])
+        model.index = {category: c for c, category in enumerate(model.categories)}
+        model.docs = list(data['docs'])
+        model.counts = data['words']
+        model.totals = [sum(column) for column in zip(*model.counts.values())] or [0] * len(model.categories)
+        return model
+    
+    def to_dict(self):
+        return {'records': self.records, 'categories': self.categories, 'docs': self.docs, 'words': self.counts}
+    
+    def add_many(self, transactions):
+        # grouped by (description, category) first, records repeat the same few merchants
+        groups = Counter((trans.description, trans.category) for trans in transactions)
+        self.add_counts((description, category, n) for (description, category), n in groups.items())
+    
+    def add_counts(self, rows):
+        # (description, category, records) rows, e.g. a GROUP BY
+        for description, category, n in rows:
+            self.records += n
+            self._learn(description, category, n)
+    
+    def add(self, trans):
+        self.records += 1
+        self._learn(trans.description, trans.category, 1)
+    
+    def remove(self, trans):
+        self.records -= 1
+        self._learn(trans.description, trans.category, -1)
+    
+    def _learn(self, description, category, n):
+        c = self.index.get(category)
+        if c is None:
+            c = self.index[category] = len(self.categories)
+            self.categories.append(category)
+            self.docs.append(0)
+            self.totals.append(0)
+            for row in self.counts.values():
+                row.append(0)
+        words = category_words(description)
+        self.docs[c] += n
+        self.totals[c] += n * len(words)
+        for word in words:
+            row = self.counts.get(word)
+            if row is None:
+                row = self.counts[word] = [0] * len(self.categories)
+            row[c] += n
+            if n < 0 and not any(row):
+                del self.counts[word]
+        self.changes += 1
+    
+    def knows(self, description):
+        return any(word in self.counts for word in category_words(description))
+    
+    def guess(self, description, prior=None):
+        # prior: a CategoryMatcher. a description without one learned word gets its guess as is
+        keyword = prior.guess(description) if prior is not None else 'Other'
+        words = category_words(description)
+        if not any(word in self.counts for word in words):
+            return keyword
+        k = KEYWORD_PRIOR_RECORDS if keyword != 'Other' else 0
+        if not k:
+            words = [word for word in words if word in self.counts]
+        vocabulary = len(self.counts) + len({word for word in words if word not in self.counts})
+        categories = self.categories if keyword in self.index or not k else self.categories + [keyword]
+        alpha = CATEGORY_SMOOTHING
+        best, best_score = 'Other', None
+        for c, category in enumerate(categories):
+            learned = c < len(self.categories)
+            extra = k if category == keyword else 0
+            score = math.log((self.docs[c] if learned else 0) + extra + alpha)
+            score -= len(words) * math.log((self.totals[c] if learned else 0) + extra * len(words) + alpha * vocabulary)
+            for word in words:
+                row = self.counts.get(word)
+                score += math.log((row[c] if row is not None and learned else 0) + extra + alpha)
+            if best_score is None or score > best_score:
+                best, best_score = category, score
+        return best
+    
+    def _count_arrays(self):
+        if self._arrays is None or self._arrays[0] != self.changes:
+            words = list(self.counts)
+            counts = np.array(list(self.counts.values()), dtype=np.float64).reshape(len(words), len(self.categories))
+            self._arrays = (self.changes, {word: w for w, word in enumerate(words)}, counts)
+        return self._arrays[1:]
+    
+    def guess_many(self, descriptions, prior=None):
+        # same result as guess() for each, scored as arrays: every distinct description at once
+        if not isinstance(descriptions, (list, tuple)):
+            descriptions = list(descriptions)
+        distinct = list(dict.fromkeys(descriptions))
+        keywords = prior.guess_many(distinct) if prior is not None else ['Other'] * len(distinct)
+        word_ids, counts = self._count_arrays()
+        if not word_ids:
+            guesses = dict(zip(distinct, keywords))
+            return [guesses[description] for description in descriptions]
+        categories = self.categories + sorted({kw for kw in keywords if kw != 'Other' and kw not in self.index})
+        column = {category: c for c, category in enumerate(categories)}
+        counts = np.pad(counts, ((0, 0), (0, len(categories) - len(self.categories))))
+        docs = np.array(self.docs + [0] * (len(categories) - len(self.categories)), dtype=np.float64)
+        totals = np.array(self.totals + [0] * (len(categories) - len(self.categories)), dtype=np.float64)
+        
+        # per description: its learned words (as rows), how many words it has and how many
+        # words the vocabulary gets with its new ones counted (only a keyword guess adds them)
+        rows, word_rows = [], []
+        n = len(distinct)
+        lengths = np.zeros(n, dtype=np.float64)
+        new_words = np.zeros(n, dtype=np.float64)
+        unknown = np.zeros(n, dtype=np.float64)
+        keyword_col = np.full(n, -1, dtype=np.int64)
+        for d, (description, keyword) in enumerate(zip(distinct, keywords)):
+            words = category_words(description)
+            known = [word_ids[word] for word in words if word in word_ids]
+            rows += [d] * len(known)
+            word_rows += known
+            if keyword != 'Other' and known:
+                keyword_col[d] = column[keyword]
+                lengths[d] = len(words)
+                unknown[d] = len(words) - len(known)
+                new_words[d] = len({word for word in words if word not in word_ids})
+            else:
+                lengths[d] = len(known)
+        rows = np.array(rows, dtype=np.int64)
+        word_rows = np.array(word_rows, dtype=np.int64)
+        alpha = CATEGORY_SMOOTHING
+        vocabulary = len(word_ids) + new_words
+        
+        scores = np.zeros((n, len(categories)))
+        np.add.at(scores, rows, np.log(counts[word_rows] + alpha))
+        scores += np.log(docs + alpha) + (unknown * math.log(alpha))[:, None]
+        scores -= lengths[:, None] * np.log(totals[None, :] + alpha * vocabulary[:, None])
+        
+        # the keyword's category, scored again with the prior's records in it
+        k = KEYWORD_PRIOR_RECORDS
+        hinted = np.flatnonzero(keyword_col >= 0)
+        if len(hinted):
+            cols = keyword_col[hinted]
+            on_hint = keyword_col[rows] >= 0
+            hint_rows = rows[on_hint]
+            with_prior = np.log(counts[word_rows[on_hint], keyword_col[hint_rows]] + k + alpha)
+            known_part = np.bincount(hint_rows, weights=with_prior, minlength=n)[hinted]
+            scores[hinted, cols] = (np.log(docs[cols] + k + alpha) + known_part + unknown[hinted] * math.log(k + alpha)
+                                    - lengths[hinted] * np.log(totals[cols] + k * lengths[hinted] + alpha * vocabulary[hinted]))
+        
+        best = scores.argmax(axis=1)
+        has_known = np.bincount(rows, minlength=n) > 0
+        guesses = {description: categories[b] if known else keyword
+                   for description, keyword, b, known in zip(distinct, keywords, best.tolist(), has_known.tolist())}
+        return [guesses[description] for description in descriptions]
+
+def _category_model(source):
+    # the learned model of a Ledger or SqliteStore (or a CategoryModel itself), None for a plain list
+    if isinstance(source, CategoryModel):
+        return source
+    return getattr(source, 'category_model', None)
+
+# transactions: the ledger to learn from, without one only the keyword table is used
+@perf_timed()
+def guess_category(description, transactions=None):
+    model = _category_model(transactions)
+    if model is None:
+        return get_category_matcher().guess(description)
+    return model.guess(description, get_category_matcher())
+
+# bulk version for imports and re-categorizing a whole ledger
+@perf_timed()
+def guess_categories(descriptions, transactions=None):
+    model = _category_model(transactions)
+    if model is None:
+        return get_category_matcher().guess_many(descriptions)
+    return model.guess_many(descriptions, get_category_matcher())
+
+# spending analysis
+@perf_timed()
+def analyze_spending(transactions):
+    if hasattr(transactions, 'analyze'):
+        return transactions.analyze()
+    if not transactions:
+        return {"error": "no data"}
+    perf_count('rows scanned', len(transactions))
+    
+    category_totals = defaultdict(float)
+    total_spending = 0
+    
+    for trans in transactions:
+        category_totals[trans.category] += trans.amount
+        total_spending += trans.amount
+    
+    return _build_analysis(category_totals, total_spending, len(transactions))
+
+def _build_analysis(category_totals, total_spending, count):
+    category_percentages = {}
+    for category, amount in category_totals.items():
+        percentage = (amount / total_spending) * 100 if total_spending > 0 else 0
+        category_percentages[category] = {
+            'amount': amount,
+            'percentage': round(percentage, 1)
+        }
+    
+    return {
+        'total_spending': total_spending,
+        'category_breakdown': category_percentages,
+        'transaction_count': count,
+        'average_transaction': round(total_spending / count, 2) if count else 0
+    }
+
+# page metrics: total, count, average, distinct categories and date range
+# stores (SqliteStore, ColumnarLedger) answer these themselves. checked with hasattr, so anything
+# with the same methods plugs in
+def ledger_summary(transactions):
+    if hasattr(transactions, 'summary'):
+        return transactions.summary()
+    total = sum(t.amount for t in transactions)
+    count = len(transactions)
+    dates = [t.date for t in transactions]
+    return {
+        'total': total,
+        'count': count,
+        'average': total / count if count > 0 else 0,
+        'categories': len(set(t.category for t in transactions)),
+        'earliest': min(dates) if dates else None,
+        'latest': max(dates) if dates else None,
+    }
+
+def ledger_categories(transactions):
+    if hasattr(transactions, 'category_names'):
+        return transactions.category_names()
+    return sorted(set(t.category for t in transactions))
+
+def category_summary(transactions, category):
+    # count and total for one category, from the running aggregates where there are some
+    if hasattr(transactions, 'category_summary'):
+        return transactions.category_summary(category)
+    return ledger_summary(filter_by_category(transactions, category))
+
+def filter_by_category(transactions, category):
+    if hasattr(transactions, 'filter_category'):
+        return transactions.filter_category(category)
+    return [t for t in transactions if t.category == category]
+
+@perf_timed()
+def records_frame(transactions, columns=('No.', 'Amount', 'Description', 'Category', 'Date', 'Time'),
+                  presorted=False, start=1):
+    # record table, newest first
+    if hasattr(transactions, 'to_frame'):
+        return transactions.to_frame(columns, start=start)
+    if not presorted:
+        transactions = sorted_records(transactions)
+    perf_count('rows rendered', len(transactions))
+    df_data = []
+    for i, trans in enumerate(transactions, start):
+        row = {
+            'No.': i,
+            'Amount': f"{trans.amount:.2f}",
+            'Description': trans.description,
+            'Category': trans.category,
+            'Date': trans.date,
+            'Time': trans.timestamp,
+            'ID': trans.id,
+        }
+        df_data.append({col: row[col] for col in columns})
+    return pd.DataFrame(df_data, columns=list(columns))
+
+def sorted_records(transactions):
+    # newest first, same order as the record table
+    if hasattr(transactions, 'query'):
+        return transactions.query()
+    return sorted(transactions, key=lambda x: (x.date, x.timestamp), reverse=True)
+
+def get_spending_advice(analysis):
+    if 'error' in analysis:
+        return ["No data available for advice"]
+    
+    advice = []
+    category_breakdown = analysis['category_breakdown']
+    
+    for category, data in category_breakdown.items():
+        percentage = data['percentage']
+        
+        if category == 'Food&Drinks' and percentage > 35:
+            advice.append(f"Food & Drinks spending is {percentage}%. Maybe cook more at home?")
+        elif category == 'Entertainment' and percentage > 25:
+            advice.append(f"Entertainment is {percentage}% of total. Try some free activities around UTS.")
+        elif category == 'Shopping' and percentage > 30:
+            advice.append(f"Shopping is {percentage}%. Consider making a list before shopping.")
+        elif category == 'Transportation' and percentage > 20:
+            advice.append(f"Transportation is {percentage}%. Maybe walk more or use student discounts.")
+    
+    if analysis['average_transaction'] > 100:
+        advice.append(f"Average transaction is ${analysis['average_transaction']} - quite high. Budget for big purchases.")
+    
+    if not advice:
+        advice.append("Your spending looks balanced! Good job.")
+    
+    return advice
+
+# budget rules - limits the user sets, e.g. Food&Drinks up to $400 a month or no single record
+# over $200. the rules are compiled once into a table by category; a new record only meets the
+# rules for its category and the ones for all categories, and each reads its period total from
+# the running rollups, so checking a record costs O(rules) however long the ledger is.
+# the rules live in budget_rules.json next to the ledger they are for
+def budget_rules_path(filename=DATA_FILE):
+    return os.path.join(os.path.dirname(filename), "budget_rules.json")
+
+BUDGET_RULES_FILE = budget_rules_path(DATA_FILE)
+BUDGET_PERIODS = ROLLUP_PERIODS
+BUDGET_WARN_SHARE = 0.8  # a period total reaching this share of its limit gets a warning
+BUDGET_PERIOD_NAMES = {'day': "on {}", 'week': "in the week of {}", 'month': "in {}"}
+
+class BudgetRule:
+    # period None limits every single record, a period limits its total. category None: all of them
+    def __init__(self, limit, category=None, period=None):
+        if period is not None and period not in BUDGET_PERIODS:
+            raise ValueError(f"period must be one of {BUDGET_PERIODS} or None")
+        limit = float(limit)
+        if not limit > 0:
+            raise ValueError("limit must be more than 0")
+        self.limit = limit
+        self.category = category or None
+        self.period = period or None
+    
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['limit'], data.get('category'), data.get('period'))
+    
+    def to_dict(self):
+        return {'category': self.category, 'period': self.period, 'limit': self.limit}
+    
+    def describe(self):
+        if self.period is None:
+            return f"{self.category or 'Any'} single transaction ≤ ${self.limit:.2f}"
+        return f"{self.category or 'All spending'} ≤ ${self.limit:.2f}/{self.period}"
+    
+    def check(self, transactions, trans):
+        # alert dict or None, trans was just added to transactions
+        if self.period is None:
+            if trans.amount <= self.limit:
+                return None
+            scope = f"{self.category} " if self.category else ""
+            return self._alert('over', trans.amount, None,
+                               f"{trans.description} (${trans.amount:.2f}) is over the ${self.limit:.2f} limit "
+                               f"for a single {scope}transaction")
+        return self.check_period(transactions, trans.date, trans.amount)
+    
+    def check_period(self, transactions, date, added):
+        # alert dict or None for the period holding date, added: the amount just added to it
+        ordinal = date_ordinal(date)
+        if ordinal is None:
+            return None
+        spent = period_spent(transactions, self.period, date, self.category)
+        before = spent - added
+        if spent > self.limit:
+            level = 'over'
+        elif before < BUDGET_WARN_SHARE * self.limit <= spent:
+            # only what crosses the line, not every record after it
+            level = 'warning'
+        else:
+            return None
+        label = period_labels(ordinal)[BUDGET_PERIODS.index(self.period)]
+        return self._alert(level, spent, label,
+                           f"{self.category or 'All spending'} {BUDGET_PERIOD_NAMES[self.period].format(label)}: "
+                           f"${spent:.2f} of ${self.limit:.2f} ({spent / self.limit:.0%})")
+    
+    def _alert(self, level, spent, period, message):
+        return {'rule': self.describe(), 'level': level, 'spent': spent, 'limit': self.limit,
+                'period': period, 'message': message}
+
+class BudgetEngine:
+    # the rules compiled for checking, grouped by category; rules for all categories under None
+    def __init__(self, rules):
+        self.rules = list(rules)
+        self.by_category = defaultdict(list)
+        for rule in self.rules:
+            self.by_category[rule.category].append(rule)
+    
+    def check(self, transactions, trans):
+        rules = self.by_category.get(trans.category, []) + self.by_category.get(None, [])
+        return [alert for alert in (rule.check(transactions, trans) for rule in rules) if alert is not None]
+    
+    def check_record(self, trans):
+        # the single-record limits alone, they need no totals
+        rules = self.by_category.get(trans.category, []) + self.by_category.get(None, [])
+        return [alert for alert in (rule.check(None, trans) for rule in rules if rule.period is None)
+                if alert is not None]
+    
+    def check_added(self, transactions, added):
+        # period rules after a batch went in (an import). added: (date, category) -> amount.
+        # one alert per rule and period at most, judged on the total with and without the batch
+        alerts = []
+        for rule in self.rules:
+            if rule.period is None:
+                continue
+            periods = {}  # label -> (a date in it, amount added)
+            for (date, category), amount in added.items():
+                ordinal = date_ordinal(date)
+                if ordinal is None or rule.category not in (None, category):
+                    continue
+                label = period_labels(ordinal)[BUDGET_PERIODS.index(rule.period)]
+                first, total = periods.get(label, (date, 0.0))
+                periods[label] = (first, total + amount)
+            for label in sorted(periods):
+                alert = rule.check_period(transactions, *periods[label])
+                if alert is not None:
+                    alerts.append(alert)
+        return alerts
+    
+    def status(self, transactions, date):
+        # every period rule with its total for the period holding date
+        ordinal = date_ordinal(date)
+        if ordinal is None:
+            return []
+        status = []
+        for rule in self.rules:
+            if rule.period is None:
+                continue
+            spent = period_spent(transactions, rule.period, date, rule.category)
+            status.append({'rule': rule.describe(), 'period': period_labels(ordinal)[BUDGET_PERIODS.index(rule.period)],
+                           'spent': spent, 'limit': rule.limit, 'share': spent / rule.limit})
+        return status
+
+def load_budget_rules(filename=BUDGET_RULES_FILE):
+    # a rule that no longer loads is left out, the others still apply
+    if not filename or not os.path.exists(filename):
+        return []
+    try:
+        with open(filename, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        logger.exception("could not load %s", filename)
+        return []
+    rules = []
+    for item in data if isinstance(data, list) else []:
+        try:
+            rules.append(BudgetRule.from_dict(item))
+        except (AttributeError, KeyError, TypeError, ValueError):
+            logger.warning("skipping budget rule %r", item)
+    return rules
+
+# rule list and its compiled engine
+_budget = {'rules': load_budget_rules(), 'engine': None}
+
+def get_budget_rules():
+    return _budget['rules']
+
+def set_budget_rules(rules, filename=BUDGET_RULES_FILE):
+    # replacing the rules drops the engine, the next check compiles it again
+    _budget['rules'] = list(rules)
+    _budget['engine'] = None
+    if filename:
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump([rule.to_dict() for rule in _budget['rules']], f, ensure_ascii=False, indent=2)
+
+def get_budget_engine():
+    if _budget['engine'] is None:
+        _budget['engine'] = BudgetEngine(_budget['rules'])
+    return _budget['engine']
+
+def _budget_engine_for(filename):
+    # the engine for the rules next to a ledger file, None when there are none. the app's own
+    # ledger uses the rules in memory, any other one reads its file
+    path = budget_rules_path(filename)
+    if os.path.abspath(path) == os.path.abspath(BUDGET_RULES_FILE):
+        return get_budget_engine() if get_budget_rules() else None
+    rules = load_budget_rules(path)
+    return BudgetEngine(rules) if rules else None
+
+# alerts for a record just added, one per rule it trips
+@perf_timed()
+def check_budget(transactions, transaction):
+    return get_budget_engine().check(transactions, transaction)
+
+@perf_timed()
+def budget_status(transactions, date=None):
+    return get_budget_engine().status(transactions, date or get_time().strftime("%Y-%m-%d"))
+
+# columnar ledger - one numpy array per field so totals, breakdowns and date ranges
+# are vectorized instead of looping over Transaction objects
+ORDINAL_EPOCH = datetime(1970, 1, 1).toordinal()
+
+class ColumnarLedger:
+    def __init__(self, ids, amounts, category_codes, categories, days, timestamps, descriptions):
+        self.ids = ids                        # object array
+        self.amounts = amounts                # float64
+        self.category_codes = category_codes  # int32 codes into self.categories
+        self.categories = categories          # object array, first-seen order
+        self.days = days                      # int32 date ordinals, 0 if the date did not parse
+        self.timestamps = timestamps          # int64 ns since epoch (Sydney wall time)
+        self.descriptions = descriptions      # object array
+    
+    @classmethod
+    @perf_timed('ColumnarLedger.from_transactions')
+    def from_transactions(cls, transactions):
+        n = len(transactions)
+        perf_count('rows scanned', n)
+        codes, categories = pd.factorize(pd.Series([t.category for t in transactions], dtype=object))
+        dates = pd.to_datetime(pd.Series([t.date for t in transactions], dtype=object),
+                               format="%Y-%m-%d", errors='coerce')
+        days = (dates.values.astype('datetime64[D]').astype(np.int64) + ORDINAL_EPOCH)
+        days[dates.isna().values] = 0
+        stamps = pd.to_datetime(pd.Series([t.timestamp for t in transactions], dtype=object),
+                                format="%Y-%m-%d %H:%M:%S", errors='coerce')
+        return cls(
+            np.array([t.id for t in transactions], dtype=object) if n else np.empty(0, dtype=object),
+            np.fromiter((t.amount for t in transactions), dtype=np.float64, count=n),
+            codes.astype(np.int32),
+            np.asarray(categories, dtype=object),
+            days.astype(np.int32),
+            stamps.values.astype('datetime64[ns]').astype(np.int64),
+            np.array([t.description for t in transactions], dtype=object) if n else np.empty(0, dtype=object),
+        )
+    
+    def __len__(self):
+        return len(self.amounts)
+    
+    def take(self, index):
+        return ColumnarLedger(self.ids[index], self.amounts[index], self.category_codes[index], self.categories,
+                              self.days[index], self.timestamps[index], self.descriptions[index])
+    
+    def filter_category(self, category):
+        return self.take(self.category_mask(category))
+    
+    def filter_days(self, start_date, end_date):
+        return self.take((self.days >= start_date.toordinal()) & (self.days <= end_date.toordinal()))
+    
+    def category_totals(self):
+        # group-by via bincount, categories in order of first appearance like the python loop
+        if not len(self):
+            return {}
+        sums = np.bincount(self.category_codes, weights=self.amounts, minlength=len(self.categories))
+        # pd.unique is hash based and keeps order of appearance
+        return {self.categories[code]: float(sums[code]) for code in pd.unique(self.category_codes)}
+    
+    def total(self):
+        return float(self.amounts.sum())
+    
+    def date_range(self):
+        valid = self.days[self.days > 0]
+        if not len(valid):
+            return None, None
+        return (datetime.fromordinal(int(valid.min())).strftime("%Y-%m-%d"),
+                datetime.fromordinal(int(valid.max())).strftime("%Y-%m-%d"))
+    
+    def summary(self):
+        total = self.total()
+        count = len(self)
+        earliest, latest = self.date_range()
+        return {
+            'total': total,
+            'count': count,
+            'average': total / count if count > 0 else 0,
+            'categories': int(np.count_nonzero(self._present())),
+            'earliest': earliest,
+            'latest': latest,
+        }
+    
+    def analyze(self):
+        if not len(self):
+            return {"error": "no data"}
+        return _build_analysis(self.category_totals(), self.total(), len(self))
+    
+    def _present(self):
+        return np.bincount(self.category_codes, minlength=len(self.categories)) > 0
+    
+    def period_totals(self, period='month'):
+        # label -> {'total', 'count'} per 'day', 'week' (labelled by its Monday) or 'month', oldest first
+        valid = self.days > 0
+        days = self.days[valid].astype(np.int64) - ORDINAL_EPOCH
+        if period == 'month':
+            keys = days.astype('datetime64[D]').astype('datetime64[M]')
+        elif period == 'week':
+            # day 0 (1970-01-01) was a Thursday
+            keys = (days - (days + 3) % 7).astype('datetime64[D]')
+        else:
+            keys = days.astype('datetime64[D]')
+        labels, inverse = np.unique(keys, return_inverse=True)
+        totals = np.bincount(inverse, weights=self.amounts[valid], minlength=len(labels))
+        counts = np.bincount(inverse, minlength=len(labels))
+        return {str(label): {'total': float(total), 'count': int(count)}
+                for label, total, count in zip(labels, totals.tolist(), counts.tolist())}
+    
+    def category_names(self):
+        return sorted(self.categories[self._present()])
+    
+    @perf_timed('ColumnarLedger.sorted_index')
+    def sorted_index(self, sort='Date', descending=True):
+        # row order for the record table, ties keep ledger order like sorted(reverse=True)
+        position = np.arange(len(self))
+        if sort == 'Amount':
+            keys = (self.amounts,)
+        elif sort == 'Category':
+            rank = pd.factorize(self.categories, sort=True)[0] if len(self.categories) else np.empty(0, dtype=np.int64)
+            keys = (self.timestamps, self.days, rank[self.category_codes] if len(self) else position)
+        elif sort == 'Description':
+            keys = (self.timestamps, self.days, pd.factorize(self.descriptions[:], sort=True)[0])
+        else:
+            keys = (self.timestamps, self.days)
+        if descending:
+            return np.lexsort((-position,) + keys)[::-1]
+        return np.lexsort((position,) + keys)
+    
+    def category_mask(self, category):
+        matches = np.flatnonzero(self.categories == category)
+        if not len(matches):
+            return np.zeros(len(self), dtype=bool)
+        return self.category_codes == matches[0]
+    
+    def search_mask(self, query):
+        # each distinct description is matched once
+        terms = search_terms(query)
+        if not terms:
+            return np.ones(len(self), dtype=bool)
+        codes, uniques = pd.factorize(np.asarray(self.descriptions, dtype=object))
+        hit = np.fromiter((matches_terms(description, terms) for description in uniques), dtype=bool,
+                          count=len(uniques))
+        return hit[codes] if len(hit) else np.zeros(len(self), dtype=bool)
+    
+    @perf_timed('ColumnarLedger.to_frame')
+    def to_frame(self, columns=('No.', 'Amount', 'Description', 'Category', 'Date', 'Time'), index=None, start=1):
+        if index is None:
+            index = self.sorted_index()
+        perf_count('rows rendered', len(index))
+        days = self.days[index].astype(np.int64) - ORDINAL_EPOCH
+        stamps = self.timestamps[index].astype('datetime64[ns]').astype('datetime64[s]')
+        data = {
+            'No.': np.arange(start, start + len(index)),
+            'Amount': np.char.mod('%.2f', self.amounts[index]),
+            'Description': self.descriptions[index],
+            'Category': self.categories[self.category_codes[index]] if len(self.categories) else np.empty(0, dtype=object),
+            'Date': days.astype('datetime64[D]').astype(str),
+            'Time': np.char.replace(stamps.astype(str), 'T', ' '),
+            'ID': self.ids[index],
+        }
+        return pd.DataFrame({col: data[col] for col in columns}, columns=list(columns))
+
+# report for one ledger: summary, category breakdown, totals per period and the advice text
+@perf_timed()
+def ledger_report(transactions, periods=('month', 'week')):
+    columns = transactions if hasattr(transactions, 'period_totals') else ColumnarLedger.from_transactions(list(transactions))
+    analysis = columns.analyze()
+    return {
+        'summary': columns.summary(),
+        'analysis': analysis,
+        'periods': {period: columns.period_totals(period) for period in periods},
+        'advice': get_spending_advice(analysis),
+    }
+
+# binary snapshots (*.ledger) - the ColumnarLedger columns written as raw arrays, so opening
+# one maps the file instead of parsing it and a page only touches the columns it reads.
+# layout: magic, header length, JSON header (row count, category names, journal_seq and
+# where each column starts), then the columns, each 8-byte aligned. strings are stored as
+# a utf-8 heap plus the end offset of every row
+BINARY_SNAPSHOT_EXT = ".ledger"
+BINARY_SNAPSHOT_MAGIC = b"LEDGER01"
+
+def is_binary_snapshot(filename):
+    return filename.endswith(BINARY_SNAPSHOT_EXT)
+
+class StringHeap:
+    # read-only string column over a mapped heap, rows are decoded when they are indexed
+    def __init__(self, ends, heap):
+        self.ends = ends
+        self.heap = heap
+    
+    @classmethod
+    def encode(cls, strings):
+        encoded = [value.encode('utf-8') for value in strings]
+        ends = np.cumsum(np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded)))
+        return cls(ends, np.frombuffer(b''.join(encoded), dtype=np.uint8))
+    
+    def __len__(self):
+        return len(self.ends)
+    
+    def _decode(self, rows):
+        ends = self.ends[rows]
+        starts = np.where(rows > 0, self.ends[np.maximum(rows - 1, 0)], 0) if len(rows) else ends
+        data = memoryview(self.heap)
+        return [str(data[start:end], 'utf-8') for start, end in zip(starts.tolist(), ends.tolist())]
+    
+    def __getitem__(self, index):
+        if isinstance(index, (int, np.integer)):
+            return self._decode(np.array([index]))[0]
+        rows = np.arange(len(self))[index]
+        values = np.empty(len(rows), dtype=object)
+        values[:] = self._decode(rows)
+        return values
+    
+    def __array__(self, dtype=None, copy=None):
+        return self[:]
+
+def write_binary_snapshot(transactions, seq, filename):
+    columns = ColumnarLedger.from_transactions(transactions)
+    # dates and timestamps are stored as numbers; anything that would not come back
+    # as the same string is kept verbatim in the header
+    dates = [t.date for t in transactions]
+    stamps = [t.timestamp for t in transactions]
+    raw_dates = {}
+    raw_timestamps = {}
+    if len(columns):
+        days = (columns.days.astype(np.int64) - ORDINAL_EPOCH).astype('datetime64[D]').astype(str)
+        for row in np.flatnonzero((columns.days == 0) | (days != np.array(dates, dtype=object))).tolist():
+            raw_dates[str(row)] = dates[row]
+        times = np.char.replace(columns.timestamps.astype('datetime64[ns]').astype('datetime64[s]').astype(str), 'T', ' ')
+        for row in np.flatnonzero(times != np.array(stamps, dtype=object)).tolist():
+            raw_timestamps[str(row)] = stamps[row]
+    ids = StringHeap.encode([t.id for t in transactions])
+    descriptions = StringHeap.encode([t.description for t in transactions])
+    arrays = [
+        ('amounts', columns.amounts),
+        ('category_codes', columns.category_codes),
+        ('days', columns.days),
+        ('timestamps', columns.timestamps),
+        ('id_ends', ids.ends),
+        ('id_heap', ids.heap),
+        ('description_ends', descriptions.ends),
+        ('description_heap', descriptions.heap),
+    ]
+    layout = {}
+    offset = 0
+    for name, values in arrays:
+        layout[name] = [values.dtype.str, offset, len(values)]
+        offset += -(-values.nbytes // 8) * 8
+    header = json.dumps({
+        'count': len(columns),
+        'categories': [str(c) for c in columns.categories],
+        'journal_seq': seq,
+        'last_updated': get_time().isoformat(),
+        'columns': layout,
+        'raw_dates': raw_dates,
+        'raw_timestamps': raw_timestamps,
+        'rollups': PeriodRollups(transactions).to_dict(),
+        'category_model': CategoryModel(transactions).to_dict(),
+    }, ensure_ascii=False).encode('utf-8')
+    header += b' ' * (-(len(header) + 16) % 8)
+    tmp = filename + ".tmp"
+    with open(tmp, 'wb') as f:
+        f.write(BINARY_SNAPSHOT_MAGIC + struct.pack('<Q', len(header)) + header)
+        for name, values in arrays:
+            data = np.ascontiguousarray(values).tobytes()
+            f.write(data + b'\0' * (-len(data) % 8))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, filename)
+
+def _read_binary_header(f):
+    if f.read(len(BINARY_SNAPSHOT_MAGIC)) != BINARY_SNAPSHOT_MAGIC:
+        raise ValueError("not a ledger snapshot")
+    (size,) = struct.unpack('<Q', f.read(8))
+    return json.loads(f.read(size).decode('utf-8')), 16 + size
+
+def open_binary_snapshot(filename):
+    # returns (ColumnarLedger over the mapped file, header); nothing is read until used
+    # header and columns from the same open file: a writer swaps in a new one by rename
+    with open(filename, 'rb') as f:
+        header, base = _read_binary_header(f)
+        mapped = np.memmap(f, dtype=np.uint8, mode='r')
+    
+    def column(name):
+        dtype, offset, count = header['columns'][name]
+        dtype = np.dtype(dtype)
+        start = base + offset
+        return mapped[start:start + count * dtype.itemsize].view(dtype)
+    
+    columns = ColumnarLedger(
+        StringHeap(column('id_ends'), column('id_heap')),
+        column('amounts'),
+        column('category_codes'),
+        np.array(header['categories'], dtype=object),
+        column('days'),
+        column('timestamps'),
+        StringHeap(column('description_ends'), column('description_heap')),
+    )
+    return columns, header
+
+def load_binary_snapshot(filename, snapshot=None):
+    # Transaction objects straight from the columns: no JSON parsing and no per-row dicts.
+    # snapshot: an open_binary_snapshot() of the file already made by the caller
+    columns, header = snapshot or open_binary_snapshot(filename)
+    n = len(columns)
+    if not n:
+        return [], header['journal_seq'], _saved_tables(header)
+    categories = [sys.intern(c) for c in header['categories']]
+    days, day_rows = np.unique(columns.days, return_inverse=True)
+    day_names = [sys.intern(d) for d in (days.astype(np.int64) - ORDINAL_EPOCH).astype('datetime64[D]').astype(str).tolist()]
+    dates = [day_names[i] for i in day_rows.tolist()]
+    stamps = np.char.replace(columns.timestamps.astype('datetime64[ns]').astype('datetime64[s]').astype(str), 'T', ' ').tolist()
+    for row, value in header['raw_dates'].items():
+        dates[int(row)] = sys.intern(value)
+    for row, value in header['raw_timestamps'].items():
+        stamps[int(row)] = value
+    new = Transaction.__new__
+    transactions = []
+    for record_id, amount, description, code, date, stamp in zip(
+            columns.ids[:].tolist(), columns.amounts.tolist(), columns.descriptions[:].tolist(),
+            columns.category_codes.tolist(), dates, stamps):
+        trans = new(Transaction)
+        trans.id = record_id
+        trans.amount = amount
+        trans.description = description
+        trans.category = categories[code]
+        trans.date = date
+        trans.timestamp = stamp
+        transactions.append(trans)
+    return transactions, header['journal_seq'], _saved_tables(header)
+
+# data saving/loading
+# budget_data.json is the snapshot, budget_data_journal.jsonl holds everything added since.
+# every journal line has a sequence number and the snapshot remembers the last one it contains,
+# so a crash between writing the snapshot and trimming the log never replays a record twice.
+# locks are always taken in this order: _compact_lock, _journal_lock, the file lock, a shared
+# ledger's lock, the background writer's condition
+_journal_lock = threading.Lock()
+_compact_lock = threading.Lock()
+_journal_seq = {}       # filename -> last sequence number on disk
+_journal_pending = {}   # filename -> entries not compacted yet
+_journal_offsets = {}   # filename -> (inode, bytes read) of its journal
+_snapshot_stats = {}    # filename -> stat of the snapshot this process last wrote or checked
+# marks the journal entries this process writes
+_process_origin = os.urandom(8).hex()
+
+@contextlib.contextmanager
+def ledger_file_lock(filename):
+    # exclusive lock on <file>.lock, so the app and CLI imports never write the snapshot or
+    # the journal at the same time. callers hold _journal_lock, threads queue up there first
+    if fcntl is None:
+        yield
+        return
+    with open(filename + ".lock", 'a') as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+def _stat_key(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+def journal_path(filename=DATA_FILE):
+    # budget_data.json -> budget_data_journal.jsonl, budget_data.ledger -> budget_data_ledger_journal.jsonl
+    root, ext = os.path.splitext(filename)
+    if is_binary_snapshot(filename):
+        root += ext.replace('.', '_')
+    return root + "_journal.jsonl"
+
+@perf_timed('write_snapshot')
+def _write_snapshot(transactions, seq, filename):
+    # write to a temp file and swap it in, so a crash never leaves a truncated ledger
+    if is_binary_snapshot(filename):
+        write_binary_snapshot(transactions, seq, filename)
+        _snapshot_stats[filename] = _stat_key(filename)
+        perf_count('bytes written', _snapshot_stats[filename][1])
+        return
+    data = {
+        'transactions': [trans.to_dict() for trans in transactions],
+        'last_updated': get_time().isoformat(),
+        'journal_seq': seq,
+        'rollups': PeriodRollups(transactions).to_dict(),
+        'category_model': CategoryModel(transactions).to_dict(),
+    }
+    tmp = filename + ".tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, filename)
+    _snapshot_stats[filename] = _stat_key(filename)
+    perf_count('bytes written', _snapshot_stats[filename][1])
+
+# the derived tables saved with a snapshot, they cover its first 'records' records
+SNAPSHOT_TABLES = ('rollups', 'category_model')
+
+def _saved_tables(data):
+    return {name: data.get(name) for name in SNAPSHOT_TABLES}
+
+def _read_snapshot(filename, snapshot=None):
+    # (records, journal_seq, saved tables: name -> dict or None)
+    if snapshot is not None:
+        return load_binary_snapshot(filename, snapshot)
+    if not os.path.exists(filename):
+        return [], 0, {}
+    if is_binary_snapshot(filename):
+        return load_binary_snapshot(filename)
+    with open(filename, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    # old files are either a bare list or a dict without journal_seq or saved tables
+    if isinstance(data, list):
+        return data, 0, {}
+    if isinstance(data, dict) and 'transactions' in data:
+        return data['transactions'], data.get('journal_seq', 0), _saved_tables(data)
+    return [], 0, {}
+
+def _read_journal(filename, after_seq=0):
+    entries = []
+    try:
+        f = open(journal_path(filename), 'r', encoding='utf-8')
+    except FileNotFoundError:
+        return entries
+    with f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # torn line from a crash mid-append
+                continue
+            if entry.get('seq', 0) > after_seq:
+                entries.append(entry)
+    return entries
+
+def _snapshot_seq(filename):
+    if is_binary_snapshot(filename) and os.path.exists(filename):
+        with open(filename, 'rb') as f:
+            return _read_binary_header(f)[0]['journal_seq']
+    return _read_snapshot(filename)[1]
+
+def _replay(filename, snapshot=None):
+    # (transactions, seq, journal entries replayed, tables of the snapshot part: {'rollups':
+    #  PeriodRollups or None, 'category_model': CategoryModel or None}, whether journal edits
+    #  changed records of the snapshot part). snapshot: as for load_binary_snapshot
+    items, seq, saved = _read_snapshot(filename, snapshot)
+    snapshot_size = len(items)
+    # binary snapshots come back as Transaction objects already
+    transactions = items if is_binary_snapshot(filename) else [Transaction.from_dict(item) for item in items]
+    entries = _read_journal(filename, seq)
+    edits = []
+    for entry in entries:
+        op = entry.get('op')
+        if op == 'add':
+            transactions.append(Transaction.from_dict(entry['record']))
+        elif op in ('update', 'delete'):
+            edits.append(entry)
+        seq = max(seq, entry['seq'])
+    rekey_legacy_ids(transactions)
+    rekey_duplicate_ids(transactions)
+    # a snapshot edited by hand no longer matches its tables, they are rebuilt then
+    tables = {}
+    for name, cls in (('rollups', PeriodRollups), ('category_model', CategoryModel)):
+        data = saved.get(name)
+        tables[name] = cls.from_dict(data) if data is not None and data.get('records') == snapshot_size else None
+    edited = False
+    if edits:
+        transactions, edited = _apply_edits(transactions, snapshot_size, edits, tables.values())
+    return transactions, seq, len(entries), tables, edited
+
+def _apply_edits(transactions, snapshot_size, edits, tables):
+    # journal updates and tombstones, after all the adds: ids are unique by then and an edit
+    # always comes after the add of its record. the saved tables cover the snapshot part, edits
+    # there are applied to them too, so they still cover what is left of it
+    position = {trans.id: i for i, trans in enumerate(transactions)}
+    edited = False
+    for entry in edits:
+        # an edit made before the ids went to UTC names the record by its old id
+        record_id = utc_id(entry['id']) or entry['id']
+        i = position.get(record_id)
+        if i is None:
+            continue
+        old = transactions[i]
+        new = Transaction.from_dict(entry['record']) if entry['op'] == 'update' else None
+        transactions[i] = new
+        if new is None:
+            del position[record_id]
+        else:
+            new.id = record_id
+        if i < snapshot_size:
+            edited = True
+            for table in tables:
+                if table is not None:
+                    table.remove(old)
+                    if new is not None:
+                        table.add(new)
+    return [trans for trans in transactions if trans is not None], edited
+
+def _last_journal_seq(filename):
+    if filename not in _journal_seq:
+        seq = _snapshot_seq(filename)
+        for entry in _read_journal(filename, seq):
+            seq = max(seq, entry['seq'])
+        _journal_seq[filename] = seq
+    return _journal_seq[filename]
+
+def _journal_tail(filename):
+    # caller holds _journal_lock. entries appended since the last call (by any process),
+    # read from the byte offset this process got to; a half-written last line waits
+    # a refresh reads without the file lock, so another process's compaction can remove or
+    # replace the journal at any moment: the open file is the one that is looked at
+    inode, offset = _journal_offsets.get(filename, (None, 0))
+    try:
+        f = open(journal_path(filename), 'rb')
+    except FileNotFoundError:
+        _journal_offsets[filename] = (None, 0)
+        return []
+    with f:
+        stat = os.fstat(f.fileno())
+        if stat.st_ino != inode or stat.st_size < offset:
+            # rewritten by a compaction, start over (seq numbers weed out what was seen)
+            offset = 0
+        f.seek(offset)
+        data = f.read()
+    end = data.rfind(b'\n') + 1
+    _journal_offsets[filename] = (stat.st_ino, offset + end)
+    entries = []
+    for line in data[:end].splitlines():
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            continue
+        if isinstance(entry, dict) and 'seq' in entry:
+            entries.append(entry)
+    if entries:
+        _journal_seq[filename] = max(_last_journal_seq(filename), max(entry['seq'] for entry in entries))
+    return entries
+
+def _sync_journal(filename):
+    # caller holds _journal_lock. catches this process up with what others wrote:
+    # new journal entries go into the shared ledger, and a snapshot another process
+    # compacted is checked for entries this one never read
+    entries = _journal_tail(filename)
+    shared = _shared_ledgers.get(filename)
+    seen = shared.seq if shared is not None else 0
+    if shared is not None:
+        shared.apply(entries)
+    stat = _stat_key(filename)
+    if stat != _snapshot_stats.get(filename):
+        seq = _snapshot_seq(filename) if stat is not None else 0
+        _journal_seq[filename] = max(_last_journal_seq(filename), seq)
+        # compared with what was seen before this tail: the journal was trimmed, and the entries
+        # newer than the snapshot say nothing about the ones folded into it and gone
+        if shared is not None and seq > seen:
+            shared.reload()
+        else:
+            _snapshot_stats[filename] = stat
+
+def _journal_entries(changes, filename):
+    # caller holds _journal_lock and the file lock, and has synced the journal.
+    # changes: ('add', record), ('update', record) or ('delete', record id). an update carries
+    # the whole new record, a delete is a tombstone; compaction folds both into the snapshot
+    seq = _last_journal_seq(filename)
+    lines = []
+    for op, value in changes:
+        seq += 1
+        entry = {'seq': seq, 'op': op, 'origin': _process_origin}
+        if op == 'delete':
+            entry['id'] = value
+        else:
+            if op == 'update':
+                entry['id'] = value.id
+            entry['record'] = value.to_dict()
+        lines.append(json.dumps(entry, ensure_ascii=False))
+    _journal_seq[filename] = seq
+    return lines, seq
+
+@perf_timed('append_journal')
+def _append_changes(changes, filename):
+    # caller holds _journal_lock. sequence numbers come from the file as it is now,
+    # under the file lock, so two processes never hand out the same one
+    with ledger_file_lock(filename):
+        _sync_journal(filename)
+        lines, seq = _journal_entries(changes, filename)
+        _write_journal_lines(lines, filename)
+    return seq
+
+def _append_records(transactions, filename):
+    return _append_changes([('add', trans) for trans in transactions], filename)
+
+def append_journal(transactions, filename=DATA_FILE):
+    # one line per record plus a single fsync for the whole batch
+    with _journal_lock:
+        return _append_records(transactions, filename)
+
+def _write_journal_lines(lines, filename):
+    # caller holds _journal_lock
+    if not lines:
+        return
+    with open(journal_path(filename), 'a+b') as f:
+        payload = ('\n'.join(lines) + '\n').encode('utf-8')
+        # a torn last line must not swallow the next entry
+        if f.tell() > 0:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b'\n':
+                payload = b'\n' + payload
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    _journal_pending[filename] = _journal_pending.get(filename, 0) + len(lines)
+    perf_count('bytes written', len(payload))
+    perf_count('journal lines', len(lines))
+
+def journal_size(filename=DATA_FILE):
+    return _journal_pending.get(filename, 0)
+
+@perf_timed()
+def compact_journal(filename=DATA_FILE):
+    # rebuild the snapshot from disk (not from a session list) and drop the folded entries
+    with _compact_lock, _journal_lock, ledger_file_lock(filename):
+        _sync_journal(filename)
+        transactions, seq, _, _, _ = _replay(filename)
+        _write_snapshot(transactions, seq, filename)
+        _trim_journal(filename, seq)
+        return len(transactions)
+
+def _replace_snapshot(transactions, filename):
+    # caller holds _journal_lock and the file lock. the records replace the whole ledger
+    # under a seq of their own, newer than any entry, so other processes see the snapshot
+    # change and reload instead of keeping what they had. this one reloads right here
+    _sync_journal(filename)
+    seq = _last_journal_seq(filename) + 1
+    _write_snapshot(transactions, seq, filename)
+    _journal_seq[filename] = seq
+    _trim_journal(filename, seq)
+    shared = _shared_ledgers.get(filename)
+    if shared is not None and shared.ledger is not None:
+        shared.reload()
+
+def _trim_journal(filename, seq):
+    # caller holds _journal_lock
+    path = journal_path(filename)
+    if os.path.exists(path):
+        keep = _read_journal(filename, seq)
+        if keep:
+            tmp = path + ".tmp"
+            with open(tmp, 'w', encoding='utf-8') as f:
+                for entry in keep:
+                    f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, path)
+        else:
+            os.remove(path)
+        _journal_pending[filename] = len(keep)
+    else:
+        _journal_pending[filename] = 0
+
+def maybe_compact_journal(filename=DATA_FILE):
+    if journal_size(filename) < JOURNAL_COMPACT_EVERY or _compact_lock.locked():
+        return False
+    threading.Thread(target=compact_journal, args=(filename,), daemon=True).start()
+    return True
+
+# background writer - the form handlers only queue their records, one thread per process
+# writes whatever arrived within WRITE_WINDOW seconds as a single journal append (one fsync)
+# and only the newest snapshot requested per file. flush_writes() waits for the queue to drain.
+# sequence numbers are handed out when the lines are written, under the file lock
+WRITE_WINDOW = float(os.environ.get("ACCOUNTING_WRITE_WINDOW", "0.05"))
+
+class BackgroundWriter:
+    def __init__(self, window=WRITE_WINDOW):
+        self.window = window
+        self.queue = queue.Queue()
+        self.cond = threading.Condition()
+        self.submitted = 0  # tickets handed out
+        self.done = 0       # tickets written (or failed)
+        self.errors = []    # messages not shown to the user yet
+        self.unwritten = OrderedDict()  # ticket -> (filename, journal changes) not on disk yet
+        self.thread = None
+    
+    def _put(self, item):
+        with self.cond:
+            self.submitted += 1
+            ticket = self.submitted
+            if item[0] == 'append':
+                self.unwritten[ticket] = (item[1], item[2])
+            self.queue.put((ticket, item))
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name="ledger-writer", daemon=True)
+                self.thread.start()
+        return ticket
+    
+    def append(self, transactions, filename):
+        return self.change([('add', trans) for trans in transactions], filename)
+    
+    def change(self, changes, filename):
+        # journal changes, see _journal_entries
+        return self._put(('append', filename, list(changes)))
+    
+    def snapshot(self, transactions, filename):
+        # the records are copied now. None compacts the file from disk instead, which is
+        # how the shared ledger is saved: it never picks up records still in the queue
+        records = None if transactions is None else list(transactions)
+        return self._put(('snapshot', filename, records))
+    
+    def flush(self, timeout=None):
+        with self.cond:
+            target = self.submitted
+            if self.done >= target:
+                return True
+            self.queue.put((None, ('flush', None, None)))
+            return self.cond.wait_for(lambda: self.done >= target, timeout)
+    
+    def take_errors(self):
+        with self.cond:
+            errors, self.errors = self.errors, []
+        return errors
+    
+    def unwritten_changes(self, filename):
+        # this process's journal changes for filename still on their way to disk, in order.
+        # a ticket leaves under _journal_lock once its lines are written (or failed), so a
+        # caller holding that lock never sees a change both here and in the file
+        with self.cond:
+            return [change for name, changes in self.unwritten.values() if name == filename for change in changes]
+    
+    def _written(self, tickets):
+        with self.cond:
+            for ticket in tickets:
+                self.unwritten.pop(ticket, None)
+    
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + self.window
+            while batch[-1][1][0] != 'flush':
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            items = [(ticket, item) for ticket, item in batch if ticket is not None]
+            tickets = [ticket for ticket, _ in items]
+            try:
+                metrics = begin_metrics('write', f"{len(items)} queued writes") if metrics_enabled() else None
+                errors = self._commit(items)
+                if metrics is not None:
+                    end_metrics(metrics, errors=len(errors))
+            except Exception as e:
+                # whatever went wrong, the thread keeps going and flush() still returns
+                logger.exception("queued writes %s failed", tickets)
+                errors = [f"queued writes {_ticket_range(tickets)} failed: {e}"]
+            with self.cond:
+                for ticket in tickets:
+                    self.unwritten.pop(ticket, None)
+                self.errors.extend(errors)
+                self.done = max([self.done] + tickets)
+                self.cond.notify_all()
+    
+    def _commit(self, items):
+        # (ticket, item) in submit order, so a snapshot covers exactly the appends queued before it
+        last_snapshot = {filename: i for i, (_, (kind, filename, _)) in enumerate(items) if kind == 'snapshot'}
+        pending = OrderedDict()  # filename -> (tickets, changes) not written yet
+        errors = []
+        for i, (ticket, (kind, filename, payload)) in enumerate(items):
+            if kind == 'append':
+                tickets, changes = pending.setdefault(filename, ([], []))
+                tickets.append(ticket)
+                changes.extend(payload)
+            elif last_snapshot[filename] == i:
+                errors += self._write_records(filename, *pending.pop(filename, ([], [])))
+                errors += self._write_snapshot(filename, payload, [ticket])
+        for filename, (tickets, changes) in pending.items():
+            errors += self._write_records(filename, tickets, changes)
+            # already off the UI thread, so compaction runs right here
+            if journal_size(filename) >= JOURNAL_COMPACT_EVERY:
+                errors += self._write_snapshot(filename, None, [])
+        return errors
+    
+    def _write_records(self, filename, tickets, changes):
+        if not changes:
+            return []
+        try:
+            with _journal_lock:
+                try:
+                    _append_changes(changes, filename)
+                finally:
+                    self._written(tickets)
+        except Exception as e:
+            # not just a full disk: a bad snapshot header or journal line ends up here too
+            if not isinstance(e, OSError):
+                logger.exception("could not write %s", journal_path(filename))
+            return [f"could not write {journal_path(filename)} (queued writes {_ticket_range(tickets)}): {e}"]
+        return []
+    
+    @staticmethod
+    def _write_snapshot(filename, records, tickets):
+        # tickets: the queued snapshot, none for a compaction the writer started itself
+        what = f" (queued write {_ticket_range(tickets)})" if tickets else ""
+        try:
+            if records is None:
+                compact_journal(filename)
+                return []
+            with _journal_lock, ledger_file_lock(filename):
+                _replace_snapshot(records, filename)
+        except Exception as e:
+            if not isinstance(e, OSError):
+                logger.exception("could not save %s", filename)
+            return [f"could not save {filename}{what}: {e}"]
+        return []
+
+def _ticket_range(tickets):
+    # 4, or 4-9 for a run of queued writes
+    if len(tickets) == 1:
+        return str(tickets[0])
+    return f"{min(tickets)}-{max(tickets)}"
+
+_writer = BackgroundWriter()
+
+def flush_writes(timeout=10.0):
+    # waits for every queued write, returns the error messages since the last call
+    if not _writer.flush(timeout):
+        return _writer.take_errors() + [f"writes still pending after {timeout:.0f}s"]
+    return _writer.take_errors()
+
+def take_write_errors():
+    # failures of writes nobody waited for
+    return _writer.take_errors()
+
+@perf_timed()
+def save_data(transactions, filename=DATA_FILE):
+    # full rewrite, the journal is folded in and cleared. queued on the background writer,
+    # call flush_writes() to wait for it and collect any error
+    if hasattr(transactions, 'add_many'):
+        # sqlite store, every insert is already committed
+        return True
+    shared = _shared_for(transactions, filename)
+    if JOURNAL_MODE and shared is not None:
+        # every record of the shared ledger goes through the journal, folding it is the save
+        _writer.snapshot(None, filename)
+    else:
+        _writer.snapshot(transactions, filename)
+    return True
+
+@perf_timed('load_data')
+def _load_ledger(filename):
+    # (ledger, seq, pending entries, stat of the snapshot read). the snapshot and then the
+    # journal are read without the file lock, so a load another process compacted the file
+    # under (the journal trimmed before it was read) is done again
+    while True:
+        stat = _stat_key(filename)
+        ledger, seq, pending = _read_ledger(filename)
+        if _stat_key(filename) == stat:
+            return ledger, seq, pending, stat
+
+def _read_ledger(filename):
+    # a binary snapshot is opened once (its header holds the saved tables, the biggest thing
+    # to parse) and serves both the records and the columns
+    snapshot = open_binary_snapshot(filename) if is_binary_snapshot(filename) and os.path.exists(filename) else None
+    transactions, seq, pending, tables, edited = _replay(filename, snapshot)
+    if snapshot is not None:
+        # the mapped columns are the snapshot part of the ledger, its indexes are built from
+        # them in bulk, and with nothing in the journal the first table or chart reuses them
+        columns, header = snapshot
+        ledger = Ledger(transactions, None if header['raw_dates'] or edited else columns, **tables)
+        if not pending:
+            ledger.columnar = (ledger.version, columns)
+        return ledger, seq, pending
+    return Ledger(transactions, **tables), seq, pending
+
+def read_transactions(filename=DATA_FILE):
+    # snapshot plus journal as a plain list, errors are raised (load_data logs them instead)
+    return _replay(filename)[0]
+
+def read_rollups(filename=DATA_FILE):
+    # the rollups saved with the snapshot, caught up on the journal
+    transactions, _, _, tables, _ = _replay(filename)
+    rollups = tables['rollups'] or PeriodRollups()
+    rollups.add_many(transactions[rollups.records:])
+    return rollups
+
+def read_category_model(filename=DATA_FILE):
+    # the model saved with the snapshot, caught up on the journal
+    transactions, _, _, tables, _ = _replay(filename)
+    model = tables['category_model'] or CategoryModel()
+    model.add_many(transactions[model.records:])
+    return model
+
+def read_columns(filename=DATA_FILE):
+    # read-only ColumnarLedger of a ledger file; a binary snapshot with nothing
+    # in its journal is mapped as it is
+    if is_binary_snapshot(filename) and os.path.exists(filename) and not os.path.exists(journal_path(filename)):
+        return open_binary_snapshot(filename)[0]
+    return ColumnarLedger.from_transactions(read_transactions(filename))
+
+def load_data(filename=DATA_FILE):
+    try:
+        ledger, seq, pending, _ = _load_ledger(filename)
+        with _journal_lock:
+            _journal_seq[filename] = max(seq, _journal_seq.get(filename, 0))
+            _journal_pending[filename] = pending
+        return ledger
+    except (OSError, ValueError, KeyError, TypeError):
+        logger.exception("could not load %s", filename)
+        return Ledger()
+
+# shared ledger - one Ledger per data file and process that every app session works on,
+# instead of a full copy per session. other processes (a second app, CLI imports) are picked
+# up from the journal tail on the next refresh(); the whole file is only read again when one of
+# them compacted entries this process never saw
+class SharedLedger:
+    def __init__(self, filename):
+        self.filename = filename
+        self.lock = threading.RLock()  # held while the ledger changes
+        self.ledger = None
+        self.seq = 0  # last journal entry contained in the ledger
+    
+    def open(self):
+        with _journal_lock, self.lock:
+            if self.ledger is None:
+                self.ledger, self.seq, pending, stat = _load_ledger(self.filename)
+                _journal_seq[self.filename] = max(self.seq, _journal_seq.get(self.filename, 0))
+                _journal_pending[self.filename] = pending
+                _snapshot_stats[self.filename] = stat
+            return self.ledger
+    
+    @staticmethod
+    def _apply_changes(ledger, changes):
+        # ('add', record), ('update', record) or ('delete', id), in order. runs of adds go in
+        # as one extend, edits by id in between them
+        records = []
+        for op, value in changes:
+            if op == 'add':
+                records.append(value)
+                continue
+            ledger.extend(records)
+            records = []
+            if op == 'update':
+                ledger.update_record(value.id, value)
+            elif op == 'delete':
+                ledger.delete_record(value)
+        if records:
+            ledger.extend(records)
+    
+    def apply(self, entries):
+        # caller holds _journal_lock. this process's own entries are in the ledger already
+        fresh = [entry for entry in entries if entry['seq'] > self.seq and entry.get('origin') != _process_origin]
+        changes = [(entry['op'], entry['id'] if entry['op'] == 'delete' else Transaction.from_dict(entry['record']))
+                   for entry in fresh if entry.get('op') in ('add', 'update', 'delete')]
+        with self.lock:
+            self._apply_changes(self.ledger, changes)
+            self.seq = max([self.seq] + [entry['seq'] for entry in entries])
+    
+    def reload(self):
+        # caller holds _journal_lock. the file as it is now, plus this process's changes still
+        # queued for the writer. anything else the ledger had is gone from disk (deleted and
+        # compacted away by another process) and goes here too
+        ledger, seq, pending, stat = _load_ledger(self.filename)
+        with self.lock:
+            self._apply_changes(ledger, _writer.unwritten_changes(self.filename))
+            self.ledger[:] = ledger
+            self.seq = seq
+        _journal_pending[self.filename] = pending
+        _snapshot_stats[self.filename] = stat
+    
+    def refresh(self):
+        # a compaction holds the journal lock for a while, the page just shows what it has
+        if not _journal_lock.acquire(blocking=False):
+            return False
+        try:
+            _sync_journal(self.filename)
+        finally:
+            _journal_lock.release()
+        return True
+
+_shared_ledgers = {}  # filename -> SharedLedger
+
+def shared_ledger(filename=DATA_FILE):
+    with _journal_lock:
+        shared = _shared_ledgers.get(filename)
+        if shared is None:
+            shared = _shared_ledgers[filename] = SharedLedger(filename)
+    return shared.open()
+
+def _shared_for(transactions, filename):
+    shared = _shared_ledgers.get(filename)
+    if shared is not None and transactions is not None and shared.ledger is transactions:
+        return shared
+    return None
+
+@perf_timed()
+def refresh_ledger(transactions, filename=DATA_FILE):
+    shared = _shared_for(transactions, filename)
+    return shared.refresh() if shared is not None else False
+
+@perf_timed()
+def add_transaction(transactions, transaction, filename=DATA_FILE):
+    if hasattr(transactions, 'add_many'):
+        transactions.add(transaction)
+        return True
+    shared = _shared_for(transactions, filename)
+    with shared.lock if shared is not None else contextlib.nullcontext():
+        transactions.append(transaction)
+        if not JOURNAL_MODE:
+            return save_data(transactions, filename)
+        _writer.append([transaction], filename)
+    return True
+
+# per-record edits. a Ledger finds records through its id map and updates its indexes in place,
+# the journal gets one update or delete (tombstone) line instead of a full rewrite
+EDITABLE_FIELDS = ('amount', 'description', 'category', 'date')
+
+def get_record(transactions, record_id):
+    if hasattr(transactions, 'get_record'):
+        return transactions.get_record(record_id)
+    return next((trans for trans in transactions if trans.id == record_id), None)
+
+@perf_timed()
+def update_transaction(transactions, record_id, filename=DATA_FILE, **changes):
+    # returns the updated record, None when there is no record with that id. the id and the
+    # timestamp (when it was entered) stay, the record is a new object
+    unknown = set(changes) - set(EDITABLE_FIELDS)
+    if unknown:
+        raise ValueError(f"cannot edit {', '.join(sorted(unknown))}")
+    shared = None if hasattr(transactions, 'add_many') else _shared_for(transactions, filename)
+    with shared.lock if shared is not None else contextlib.nullcontext():
+        old = get_record(transactions, record_id)
+        if old is None:
+            return None
+        new = Transaction.from_dict(dict(old.to_dict(), **changes))
+        if hasattr(transactions, 'update_record'):
+            transactions.update_record(record_id, new)
+        else:
+            transactions[transactions.index(old)] = new
+        if not hasattr(transactions, 'add_many'):
+            if not JOURNAL_MODE:
+                save_data(transactions, filename)
+            else:
+                _writer.change([('update', new)], filename)
+    return new
+
+@perf_timed()
+def delete_transaction(transactions, record_id, filename=DATA_FILE):
+    # True when a record with that id was there
+    shared = None if hasattr(transactions, 'add_many') else _shared_for(transactions, filename)
+    with shared.lock if shared is not None else contextlib.nullcontext():
+        if hasattr(transactions, 'delete_record'):
+            old = transactions.delete_record(record_id)
+        else:
+            old = get_record(transactions, record_id)
+            if old is not None:
+                transactions.remove(old)
+        if old is None:
+            return False
+        if not hasattr(transactions, 'add_many'):
+            if not JOURNAL_MODE:
+                save_data(transactions, filename)
+            else:
+                _writer.change([('delete', record_id)], filename)
+    return True
+
+def convert_ledger(source, target):
+    # JSON <-> binary snapshot, the format follows the file extension. the source journal is
+    # folded in, the target gets a fresh snapshot and its own journal is cleared
+    transactions = _replay(source)[0]
+    with _journal_lock, ledger_file_lock(target):
+        _replace_snapshot(transactions, target)
+    return len(transactions)
+
+# sqlite storage - filters, totals and date bounds run as indexed queries,
+# only the rows a page shows get turned into Transaction objects
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS transactions (
+    rowid INTEGER PRIMARY KEY,
+    id TEXT NOT NULL,
+    amount REAL NOT NULL,
+    description TEXT NOT NULL,
+    category TEXT NOT NULL,
+    date TEXT NOT NULL,
+    timestamp TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_transactions_id ON transactions (id);
+CREATE INDEX IF NOT EXISTS idx_transactions_date ON transactions (date, timestamp);
+CREATE INDEX IF NOT EXISTS idx_transactions_category ON transactions (category, date, timestamp);
+-- totals per day and category, kept in step by the triggers; weeks and months group the days
+CREATE TABLE IF NOT EXISTS daily_rollups (
+    day TEXT NOT NULL,
+    category TEXT NOT NULL,
+    total REAL NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (day, category)
+) WITHOUT ROWID;
+CREATE TRIGGER IF NOT EXISTS rollups_insert AFTER INSERT ON transactions BEGIN
+    INSERT INTO daily_rollups (day, category, total, count) VALUES (NEW.date, NEW.category, NEW.amount, 1)
+        ON CONFLICT (day, category) DO UPDATE SET total = total + excluded.total, count = count + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS rollups_delete AFTER DELETE ON transactions BEGIN
+    UPDATE daily_rollups SET total = total - OLD.amount, count = count - 1
+        WHERE day = OLD.date AND category = OLD.category;
+    DELETE FROM daily_rollups WHERE day = OLD.date AND category = OLD.category AND count = 0;
+END;
+CREATE TRIGGER IF NOT EXISTS rollups_update AFTER UPDATE OF amount, category, date ON transactions BEGIN
+    UPDATE daily_rollups SET total = total - OLD.amount, count = count - 1
+        WHERE day = OLD.date AND category = OLD.category;
+    DELETE FROM daily_rollups WHERE day = OLD.date AND category = OLD.category AND count = 0;
+    INSERT INTO daily_rollups (day, category, total, count) VALUES (NEW.date, NEW.category, NEW.amount, 1)
+        ON CONFLICT (day, category) DO UPDATE SET total = total + excluded.total, count = count + 1;
+END;
+"""
+
+# word index over the descriptions, the rows stay in transactions (external content).
+# separate from SQLITE_SCHEMA because sqlite can be built without fts5
+SQLITE_SEARCH_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS transactions_fts USING fts5(
+    description, content='transactions', content_rowid='rowid', prefix='2 3'
+);
+CREATE TRIGGER IF NOT EXISTS fts_insert AFTER INSERT ON transactions BEGIN
+    INSERT INTO transactions_fts (rowid, description) VALUES (NEW.rowid, NEW.description);
+END;
+CREATE TRIGGER IF NOT EXISTS fts_delete AFTER DELETE ON transactions BEGIN
+    INSERT INTO transactions_fts (transactions_fts, rowid, description) VALUES ('delete', OLD.rowid, OLD.description);
+END;
+CREATE TRIGGER IF NOT EXISTS fts_update AFTER UPDATE OF description ON transactions BEGIN
+    INSERT INTO transactions_fts (transactions_fts, rowid, description) VALUES ('delete', OLD.rowid, OLD.description);
+    INSERT INTO transactions_fts (rowid, description) VALUES (NEW.rowid, NEW.description);
+END;
+"""
+
+# bucket label of a daily_rollups day, weeks start on Monday like PeriodRollups
+SQLITE_PERIOD_LABELS = {
+    'day': "day",
+    'week': "date(day, '-' || ((CAST(strftime('%w', day) AS INTEGER) + 6) % 7) || ' days')",
+    'month': "strftime('%Y-%m', day)",
+}
+
+class SqliteStore:
+    COLUMNS = "id, amount, description, category, date, timestamp"
+    
+    def __init__(self, filename=SQLITE_FILE):
+        self.filename = filename
+        self.writes = next(_ledger_versions)
+        self.lock = threading.Lock()
+        # app sessions run on different threads, the lock serializes access
+        self.conn = sqlite3.connect(filename, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SQLITE_SCHEMA)
+        self._backfill_rollups()
+        self.full_text = self._create_search_index()
+        self._rekey_legacy_ids()
+        self._rekey_duplicate_ids()
+        self._category_model = None  # (version it matches, CategoryModel), built on the first guess
+    
+    def _backfill_rollups(self):
+        # databases from before daily_rollups: the triggers never leave it empty while
+        # there are rows, so an empty table next to rows means it was just created
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                if (not self.conn.execute("SELECT 1 FROM daily_rollups LIMIT 1").fetchone()
+                        and self.conn.execute("SELECT 1 FROM transactions LIMIT 1").fetchone()):
+                    self.conn.execute(
+                        "INSERT INTO daily_rollups (day, category, total, count) "
+                        "SELECT date, category, TOTAL(amount), COUNT(*) FROM transactions GROUP BY date, category")
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+    
+    def _create_search_index(self):
+        # an external content table always looks as full as transactions, so whether to fill
+        # it from the existing rows depends on whether it was there before. filling it twice
+        # (two processes opening an old database at once) is harmless
+        with self.lock:
+            existed = self.conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'transactions_fts'").fetchone()
+            try:
+                self.conn.executescript(SQLITE_SEARCH_SCHEMA)
+            except sqlite3.OperationalError:
+                # sqlite built without fts5, search falls back to LIKE
+                return False
+            if not existed:
+                with self.conn:
+                    self.conn.execute("INSERT INTO transactions_fts (transactions_fts) VALUES ('rebuild')")
+            return True
+    
+    def _rekey_legacy_ids(self):
+        # same rule as rekey_legacy_ids, written back once
+        with self.lock, self.conn:
+            rows = self.conn.execute("SELECT rowid, id FROM transactions WHERE length(id) < ?", (ID_LENGTH,)).fetchall()
+            for rowid, record_id in rows:
+                converted = utc_id(record_id)
+                if converted is not None:
+                    self.conn.execute("UPDATE transactions SET id = ? WHERE rowid = ?", (converted, rowid))
+    
+    def _rekey_duplicate_ids(self):
+        # same rule as rekey_duplicate_ids, in rowid order
+        with self.lock, self.conn:
+            rows = self.conn.execute(
+                "SELECT rowid, id FROM transactions WHERE id IN "
+                "(SELECT id FROM transactions GROUP BY id HAVING COUNT(*) > 1) ORDER BY rowid").fetchall()
+            if not rows:
+                return
+            seen = set()
+            for rowid, record_id in rows:
+                if record_id not in seen:
+                    seen.add(record_id)
+                    continue
+                # renamed rows are written as we go, so the id index sees them too
+                n = 1
+                while self.conn.execute("SELECT 1 FROM transactions WHERE id = ?", (f"{record_id}-{n:03d}",)).fetchone():
+                    n += 1
+                self.conn.execute("UPDATE transactions SET id = ? WHERE rowid = ?", (f"{record_id}-{n:03d}", rowid))
+    
+    def _where(self, start_date=None, end_date=None, category=None, search=None):
+        clauses, params = [], []
+        terms = search_terms(search)
+        if terms and self.full_text:
+            # same rule as DescriptionIndex, every term a word prefix
+            clauses.append("rowid IN (SELECT rowid FROM transactions_fts WHERE transactions_fts MATCH ?)")
+            params.append(" ".join(f'"{term}"*' for term in terms))
+        elif terms:
+            # a term right after a space is close enough to a word prefix
+            for term in terms:
+                clauses.append("' ' || description LIKE ? ESCAPE '\\'")
+                params.append("% " + term.replace("_", "\\_") + "%")
+        if start_date is not None:
+            clauses.append("date >= ?")
+            params.append(str(start_date))
+        if end_date is not None:
+            clauses.append("date <= ?")
+            params.append(str(end_date))
+        if category is not None:
+            clauses.append("category = ?")
+            params.append(category)
+        where = (" WHERE " + " AND ".join(clauses)) if clauses else ""
+        return where, params
+    
+    def _fetch(self, sql, params=()):
+        with self.lock:
+            return self.conn.execute(sql, params).fetchall()
+    
+    def add(self, transaction):
+        self.add_many([transaction])
+    
+    def add_many(self, transactions):
+        transactions = list(transactions)
+        rows = [(t.id, t.amount, t.description, t.category, t.date, t.timestamp) for t in transactions]
+        model = self._current_model()
+        with self.lock, self.conn:
+            self.conn.executemany(f"INSERT INTO transactions ({self.COLUMNS}) VALUES (?, ?, ?, ?, ?, ?)", rows)
+        self.writes = next(_ledger_versions)
+        self._learned(model, added=transactions)
+        return len(rows)
+    
+    @property
+    def category_model(self):
+        # one GROUP BY over (description, category), then kept up to date by this store's own
+        # writes; a commit through another connection has it built again
+        model = self._current_model()
+        if model is None:
+            model = CategoryModel()
+            model.add_counts(self._fetch("SELECT description, category, COUNT(*) FROM transactions "
+                                         "GROUP BY description, category"))
+            self._category_model = (self.version, model)
+        return model
+    
+    def _current_model(self):
+        if self._category_model is not None and self._category_model[0] == self.version:
+            return self._category_model[1]
+        return None
+    
+    def _learned(self, model, removed=(), added=()):
+        # after a write: model is what _current_model() returned before it
+        if model is None:
+            return
+        for trans in removed:
+            model.remove(trans)
+        for trans in added:
+            model.add(trans)
+        self._category_model = (self.version, model)
+    
+    SORT_COLUMNS = {
+        'Date': ('date', 'timestamp'),
+        'Amount': ('amount',),
+        'Category': ('category', 'date', 'timestamp'),
+        'Description': ('description', 'date', 'timestamp'),
+    }
+    
+    @perf_timed('SqliteStore.query')
+    def query(self, start_date=None, end_date=None, category=None, limit=None, offset=0, sort='Date', descending=True,
+              search=None):
+        where, params = self._where(start_date, end_date, category, search)
+        direction = " DESC" if descending else ""
+        # rowid last, in the same direction, so the (date, timestamp) index can serve the order
+        order = ", ".join(col + direction for col in self.SORT_COLUMNS.get(sort, self.SORT_COLUMNS['Date']) + ('rowid',))
+        sql = f"SELECT {self.COLUMNS} FROM transactions{where} ORDER BY {order}"
+        if limit is not None:
+            sql += " LIMIT ? OFFSET ?"
+            params += [limit, offset]
+        rows = self._fetch(sql, params)
+        perf_count('rows scanned', len(rows))
+        return [self._to_transaction(row) for row in rows]
+    
+    def category_summary(self, category):
+        return self.summary(category=category)
+    
+    def summary(self, start_date=None, end_date=None, category=None, search=None):
+        where, params = self._where(start_date, end_date, category, search)
+        count, total, cats, earliest, latest = self._fetch(
+            f"SELECT COUNT(*), TOTAL(amount), COUNT(DISTINCT category), MIN(date), MAX(date) FROM transactions{where}",
+            params)[0]
+        return {
+            'total': total,
+            'count': count,
+            'average': total / count if count > 0 else 0,
+            'categories': cats,
+            'earliest': earliest,
+            'latest': latest,
+        }
+    
+    def category_totals(self, start_date=None, end_date=None):
+        # first-seen order, like the in-memory breakdown
+        where, params = self._where(start_date, end_date)
+        rows = self._fetch(
+            f"SELECT category, TOTAL(amount) FROM transactions{where} GROUP BY category ORDER BY MIN(rowid)",
+            params)
+        return dict(rows)
+    
+    def analyze(self, start_date=None, end_date=None):
+        summary = self.summary(start_date, end_date)
+        if not summary['count']:
+            return {"error": "no data"}
+        return _build_analysis(self.category_totals(start_date, end_date), summary['total'], summary['count'])
+    
+    def category_names(self):
+        return [row[0] for row in self._fetch("SELECT DISTINCT category FROM transactions ORDER BY category")]
+    
+    def range_totals(self, start_date, end_date):
+        rows = self._fetch("SELECT category, TOTAL(total), SUM(count) FROM daily_rollups "
+                           "WHERE day >= ? AND day <= ? GROUP BY category", (str(start_date), str(end_date)))
+        return {category: {'total': total, 'count': count} for category, total, count in rows}
+    
+    def period_totals(self, period='month'):
+        label = SQLITE_PERIOD_LABELS[period]
+        rows = self._fetch(f"SELECT {label} AS label, TOTAL(total), SUM(count) FROM daily_rollups "
+                           f"WHERE date(day) IS NOT NULL GROUP BY label ORDER BY label")
+        return {label: {'total': total, 'count': count} for label, total, count in rows}
+    
+    def period_breakdown(self, period='month'):
+        label = SQLITE_PERIOD_LABELS[period]
+        breakdown = {}
+        for label, category, total in self._fetch(
+                f"SELECT {label} AS label, category, TOTAL(total) FROM daily_rollups "
+                f"WHERE date(day) IS NOT NULL GROUP BY label, category ORDER BY label"):
+            breakdown.setdefault(label, {})[category] = total
+        return breakdown
+    
+    def filter_category(self, category):
+        return self.query(category=category)
+    
+    def filter_days(self, start_date, end_date):
+        return self.query(start_date, end_date)
+    
+    def search(self, query, category=None, start_date=None, end_date=None):
+        # oldest first, like a Ledger
+        return self.query(start_date, end_date, category, sort='Date', descending=False, search=query)
+    
+    def records_on(self, dates, upto=None):
+        # every record on the given days, for checks that go by date (duplicates). upto: a
+        # last_rowid(), only the records that were there then
+        dates = list(dates)
+        if not dates:
+            return []
+        where = f"date IN ({','.join('?' * len(dates))})"
+        if upto is not None:
+            where += " AND rowid <= ?"
+            dates.append(upto)
+        rows = self._fetch(f"SELECT {self.COLUMNS} FROM transactions WHERE {where} ORDER BY rowid", dates)
+        return [self._to_transaction(row) for row in rows]
+    
+    def last_rowid(self):
+        return self._fetch("SELECT MAX(rowid) FROM transactions")[0][0] or 0
+    
+    def duplicates_of(self, trans, window=None):
+        # the date index narrows it to one day, the key is compared in python
+        return DuplicateIndex(self.records_on([trans.date])).matches(trans, window)
+    
+    def get_record(self, record_id):
+        rows = self._fetch(f"SELECT {self.COLUMNS} FROM transactions WHERE id = ?", (record_id,))
+        return self._to_transaction(rows[0]) if rows else None
+    
+    def update_record(self, record_id, new):
+        # same contract as Ledger.update_record. the triggers move the amount between rollup
+        # days and categories and reindex the description
+        old = self.get_record(record_id)
+        if old is None:
+            return None
+        model = self._current_model()
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE transactions SET amount = ?, description = ?, category = ?, date = ? WHERE id = ?",
+                              (new.amount, new.description, new.category, new.date, record_id))
+        self.writes = next(_ledger_versions)
+        self._learned(model, removed=[old], added=[new])
+        return old
+    
+    def delete_record(self, record_id):
+        old = self.get_record(record_id)
+        if old is not None:
+            model = self._current_model()
+            self.delete_ids([record_id])
+            self._learned(model, removed=[old])
+        return old
+    
+    def delete_ids(self, ids):
+        with self.lock, self.conn:
+            deleted = self.conn.executemany("DELETE FROM transactions WHERE id = ?", [(i,) for i in ids]).rowcount
+        self.writes = next(_ledger_versions)
+        return deleted
+    
+    def clear(self):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM transactions")
+        self.writes = next(_ledger_versions)
+    
+    @property
+    def version(self):
+        # our own writes plus commits made through other connections
+        return self.writes, self._fetch("PRAGMA data_version")[0][0]
+    
+    def import_json(self, filename=DATA_FILE):
+        # records already in the store (same id and timestamp) are skipped, so re-importing is harmless
+        transactions = _replay(filename)[0]
+        new = []
+        for trans in transactions:
+            if not self._fetch("SELECT 1 FROM transactions WHERE id = ? AND timestamp = ?", (trans.id, trans.timestamp)):
+                new.append(trans)
+        return self.add_many(new)
+    
+    def close(self):
+        with self.lock:
+            self.conn.close()
+    
+    @staticmethod
+    def _to_transaction(row):
+        return Transaction.from_dict(dict(zip(('id', 'amount', 'description', 'category', 'date', 'timestamp'), row)))
+    
+    def __len__(self):
+        return self._fetch("SELECT COUNT(*) FROM transactions")[0][0]
+    
+    def __iter__(self):
+        return iter(self.query())
+
+def import_json_to_sqlite(json_file=DATA_FILE, db_file=SQLITE_FILE):
+    store = SqliteStore(db_file)
+    try:
+        return store.import_json(json_file)
+    finally:
+        store.close()
+
+def open_ledger(reload=False):
+    # sqlite needs no shared copy, the rows stay in the database
+    if STORAGE_BACKEND == "sqlite":
+        return SqliteStore()
+    ledger = shared_ledger()
+    if reload:
+        with _journal_lock:
+            _shared_ledgers[DATA_FILE].reload()
+    return ledger
+
+def clear_ledger(transactions):
+    if hasattr(transactions, 'add_many'):
+        transactions.clear()
+        return transactions
+    shared = _shared_for(transactions, DATA_FILE)
+    if shared is None:
+        save_data([])
+        return Ledger()
+    with shared.lock:
+        transactions.clear()
+        save_data([])
+    return transactions
+
+def find_duplicate(transactions, transaction, window=DUPLICATE_WINDOW):
+    # the latest record the new one looks like a copy of, or None. a Ledger or SqliteStore
+    # answers from an index, a plain list is scanned
+    if hasattr(transactions, 'duplicates_of'):
+        matches = transactions.duplicates_of(transaction, window)
+    else:
+        key = duplicate_key(transaction)
+        matches = [t for t in transactions if duplicate_key(t) == key and entered_within(t, transaction, window)]
+    return matches[-1] if matches else None
+
+@perf_timed()
+def find_duplicates(transactions, window=None):
+    # later copies, in one pass: a record is a copy when the last kept record with its key was
+    # entered within window seconds before it (any time when window is None)
+    ordered = transactions.query(descending=False) if hasattr(transactions, 'add_many') else transactions
+    perf_count('rows scanned', len(ordered))
+    kept = {}
+    duplicates = []
+    for trans in ordered:
+        key = duplicate_key(trans)
+        last = kept.get(key)
+        if last is not None and entered_within(last, trans, window):
+            duplicates.append(trans)
+        else:
+            kept[key] = trans
+    return duplicates
+
+def remove_duplicates(transactions, duplicates, filename=DATA_FILE):
+    # duplicates: records from find_duplicates. the ledger drops them in one pass; the shared
+    # ledger writes a tombstone per record (its save compacts from disk and would not see the
+    # removal), any other list is written out whole
+    if not duplicates:
+        return 0
+    if hasattr(transactions, 'add_many'):
+        return transactions.delete_ids([t.id for t in duplicates])
+    drop = {id(t) for t in duplicates}
+    shared = _shared_for(transactions, filename)
+    with shared.lock if shared is not None else contextlib.nullcontext():
+        removed = [t for t in transactions if id(t) in drop]
+        transactions[:] = [t for t in transactions if id(t) not in drop]
+        if JOURNAL_MODE and shared is not None:
+            _writer.change([('delete', t.id) for t in removed], filename)
+        else:
+            save_data(transactions, filename)
+        return len(removed)
+
+# bank statement import - csv files are streamed in chunks, each chunk is categorized
+# in one batch and written with one bulk commit, so memory stays flat for any file size
+IMPORT_CHUNK_SIZE = 5000
+IMPORT_MAX_REJECTS = 100  # rejected rows kept for the report, the rest are only counted
+STATEMENT_COLUMNS = {
+    'date': ('date', 'transaction date', 'posted date', 'posting date', 'value date'),
+    'amount': ('amount', 'debit', 'value', 'amount (aud)'),
+    'description': ('description', 'details', 'narrative', 'merchant', 'memo', 'transaction details'),
+    'category': ('category',),
+}
+# how a statement writes money spent: card and headerless exports as -12.30, a debit column as
+# 12.30. 'auto' goes with the sign most amounts in the first chunk have. rows with the other
+# sign (refunds, payments in) are rejected, the ledger only holds expenses
+SPENDING_SIGNS = ('auto', 'negative', 'positive')
+
+class ImportReport:
+    def __init__(self, source):
+        self.source = source
+        self.rows = 0
+        self.imported = 0
+        self.rejected = 0
+        self.rejects = []  # (line number, reason)
+        self.duplicates = 0
+        self.duplicate_rows = []  # (line number, description) of rows matching a record already there
+        self.budget_alerts = []   # check_budget alerts for the imported rows
+        self.spending = None      # 'negative' or 'positive', the sign taken as money spent
+        self.seconds = 0.0
+    
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else 0.0
+    
+    def reject(self, line_no, reason):
+        self.rejected += 1
+        if len(self.rejects) < IMPORT_MAX_REJECTS:
+            self.rejects.append((line_no, reason))
+    
+    def duplicate(self, line_no, description):
+        self.duplicates += 1
+        if len(self.duplicate_rows) < IMPORT_MAX_REJECTS:
+            self.duplicate_rows.append((line_no, description))
+    
+    def budget_alert(self, alert):
+        if len(self.budget_alerts) < IMPORT_MAX_REJECTS:
+            self.budget_alerts.append(alert)
+    
+    def to_dict(self):
+        return {
+            'source': self.source,
+            'rows': self.rows,
+            'imported': self.imported,
+            'rejected': self.rejected,
+            'duplicates': self.duplicates,
+            'spending': self.spending,
+            'seconds': round(self.seconds, 3),
+            'rows_per_second': round(self.rows_per_second, 1),
+            'rejects': self.rejects,
+            'duplicate_rows': self.duplicate_rows,
+            'budget_alerts': self.budget_alerts,
+        }
+
+def normalize_import_date(value):
+    # statement dates: 2024-07-14, 2024-7-14, 14/07/2024 or the phrases the form accepts
+    parsed = date_parser.parse(value)
+    return parsed.strftime("%Y-%m-%d") if parsed else None
+
+def normalize_import_dates(values):
+    # one parse and one strftime per distinct value
+    distinct = list(set(values))
+    names = {value: parsed.strftime("%Y-%m-%d") if parsed else None
+             for value, parsed in zip(distinct, date_parser.parse_many(distinct))}
+    return [names[value] for value in values]
+
+def _parse_amount(value):
+    # "$1,234.50", "-12.30" or "(12.30)", with its sign (brackets are negative); None for
+    # zero or anything unreadable
+    text = (value or '').strip().replace('$', '').replace(',', '').replace('AUD', '').strip()
+    negative = text.startswith('(') and text.endswith(')')
+    if negative:
+        text = text[1:-1]
+    try:
+        amount = float(text)
+    except ValueError:
+        return None
+    if not amount or not math.isfinite(amount):
+        return None
+    return -amount if negative else amount
+
+def _spending_sign(values):
+    # 'negative' or 'positive', whichever most of the readable amounts have
+    amounts = [amount for amount in map(_parse_amount, values) if amount is not None]
+    return 'positive' if sum(amount > 0 for amount in amounts) * 2 > len(amounts) else 'negative'
+
+def _statement_columns(header):
+    # positions of date, amount, description, category; None when the first row is data
+    names = [cell.strip().lower() for cell in header]
+    found = {}
+    for field, aliases in STATEMENT_COLUMNS.items():
+        for i, name in enumerate(names):
+            if name in aliases:
+                found[field] = i
+                break
+    if all(field in found for field in ('date', 'amount', 'description')):
+        return found['date'], found['amount'], found['description'], found.get('category')
+    return None
+
+def _statement_rows(f, chunk_size):
+    # yields chunks of (line number, row), the header is detected and skipped
+    reader = csv.reader(f)
+    columns = None
+    chunk = []
+    for row in reader:
+        if not row or not any(cell.strip() for cell in row):
+            continue
+        if columns is None:
+            columns = _statement_columns(row)
+            if columns is not None:
+                yield columns, []
+                continue
+            # headerless export (e.g. CommBank): date, amount, description, ...
+            columns = (0, 1, 2, None)
+            yield columns, []
+        chunk.append((reader.line_num, row))
+        if len(chunk) >= chunk_size:
+            yield columns, chunk
+            chunk = []
+    if chunk:
+        yield columns, chunk
+
+def _write_chunk(target, chunk, filename):
+    # one bulk commit per chunk: a single sqlite transaction or one journal write + fsync
+    if target is not None and hasattr(target, 'add_many'):
+        target.add_many(chunk)
+        return
+    # one hold of the journal lock, so a reload never sees the chunk on disk and then gets it again
+    with _journal_lock:
+        _append_records(chunk, filename)
+        if target is not None:
+            shared = _shared_for(target, filename)
+            with shared.lock if shared is not None else contextlib.nullcontext():
+                target.extend(chunk)
+
+def _known_counts(target, filename):
+    # chunk -> count(key), the records with that key the ledger had before the import started.
+    # a SqliteStore is asked per chunk, up to the last row from before the import; a Ledger's
+    # index takes the imported rows as they are written, so it is counted from a frozen copy
+    if hasattr(target, 'records_on'):
+        upto = target.last_rowid()
+        return lambda chunk: DuplicateIndex(target.records_on({t.date for t in chunk}, upto)).count
+    if target is None:
+        count = DuplicateIndex(read_transactions(filename)).count
+    elif hasattr(target, 'duplicate_index'):
+        count = target.duplicate_index.frozen_count()
+    else:
+        count = DuplicateIndex(target).count
+    return lambda chunk: count
+
+@perf_timed()
+def import_statement(source, target=None, filename=DATA_FILE, chunk_size=IMPORT_CHUNK_SIZE, progress=None,
+                     duplicates='skip', spending='auto'):
+    # source is a path or an open text file, target is the in-memory ledger or a SqliteStore
+    # (None writes to the journal of filename only). progress(report) is called after each chunk.
+    # duplicates: rows matching a record from before the import are skipped, imported and
+    # listed in the report ('flag') or not looked for ('keep'). matching is one for one, so
+    # re-importing an overlapping statement adds only the new rows, repeats included.
+    # budget rules: single-record limits are checked per row, period limits once per period
+    # the import reached, after the last chunk; the alerts go in the report. the rules are the
+    # ones next to the ledger (budget_rules_path).
+    # spending: the sign money spent has in the file, see SPENDING_SIGNS
+    if duplicates not in DUPLICATE_MODES:
+        raise ValueError(f"duplicates must be one of {DUPLICATE_MODES}")
+    if spending not in SPENDING_SIGNS:
+        raise ValueError(f"spending must be one of {SPENDING_SIGNS}")
+    report = ImportReport(source if isinstance(source, str) else getattr(source, 'name', 'upload'))
+    if spending != 'auto':
+        report.spending = spending
+    started = time.perf_counter()
+    known = _known_counts(target, filename) if duplicates != 'keep' else None
+    unmatched = {}  # key -> records from before the import not matched to a row yet, only keys the ledger had
+    learned = None  # what categories are guessed from, looked up when the first row needs one
+    # the rules next to the ledger being written, a SqliteStore's own file included
+    budget = _budget_engine_for(target.filename if hasattr(target, 'add_many') else filename)
+    added = defaultdict(float)  # (date, category) -> amount imported, for the period rules
+    f = open(source, 'r', encoding='utf-8-sig', newline='') if isinstance(source, str) else source
+    try:
+        for (date_col, amount_col, desc_col, cat_col), rows in _statement_rows(f, chunk_size):
+            if not rows:
+                continue
+            parsed = []
+            # statements only span a few hundred distinct dates, the batch parses each once
+            dates = normalize_import_dates([row[date_col] if date_col < len(row) else '' for _, row in rows])
+            if report.spending is None:
+                report.spending = _spending_sign([row[amount_col] for _, row in rows if amount_col < len(row)])
+            spent = 1 if report.spending == 'positive' else -1
+            for (line_no, row), date in zip(rows, dates):
+                report.rows += 1
+                try:
+                    raw_date, raw_amount, description = row[date_col], row[amount_col], row[desc_col].strip()
+                except IndexError:
+                    report.reject(line_no, "missing columns")
+                    continue
+                amount = _parse_amount(raw_amount)
+                if date is None:
+                    report.reject(line_no, f"bad date: {raw_date!r}")
+                elif amount is None:
+                    report.reject(line_no, f"bad amount: {raw_amount!r}")
+                elif amount * spent < 0:
+                    report.reject(line_no, f"money in, not spent: {raw_amount!r}")
+                elif not description:
+                    report.reject(line_no, "no description")
+                else:
+                    category = row[cat_col].strip() if cat_col is not None and cat_col < len(row) else ''
+                    parsed.append((line_no, abs(amount), description, category, date))
+            
+            uncategorized = [p[2] for p in parsed if not p[3]]
+            if uncategorized and learned is None:
+                learned = target if target is not None else read_category_model(filename)
+            guesses = iter(guess_categories(uncategorized, learned))
+            ids = iter(new_transaction_ids(len(parsed)))
+            timestamp = get_time().strftime("%Y-%m-%d %H:%M:%S")
+            chunk = [Transaction.from_dict({
+                'id': next(ids),
+                'amount': amount,
+                'description': description,
+                'category': category or next(guesses),
+                'date': date,
+                'timestamp': timestamp,
+            }) for _, amount, description, category, date in parsed]
+            
+            if known is not None:
+                # counts only cover records from before the import, so a key the ledger did not
+                # have counts 0 however often the statement repeats it and is never stored
+                count = known(chunk)
+                kept = []
+                for (line_no, *_), trans in zip(parsed, chunk):
+                    key = duplicate_key(trans)
+                    left = unmatched.get(key)
+                    if left is None:
+                        left = count(key)
+                    if left:
+                        unmatched[key] = left - 1
+                        report.duplicate(line_no, trans.description)
+                        if duplicates == 'skip':
+                            continue
+                    kept.append(trans)
+                chunk = kept
+            
+            _write_chunk(target, chunk, filename)
+            report.imported += len(chunk)
+            if budget is not None:
+                for trans in chunk:
+                    added[trans.date, trans.category] += trans.amount
+                    for alert in budget.check_record(trans):
+                        report.budget_alert(alert)
+            report.seconds = time.perf_counter() - started
+            if progress:
+                progress(report)
+    finally:
+        if isinstance(source, str):
+            f.close()
+    if added:
+        # the totals now include the import: the ledger's own, or the file's for a journal-only import
+        for alert in budget.check_added(target if target is not None else read_rollups(filename), added):
+            report.budget_alert(alert)
+    report.seconds = time.perf_counter() - started
+    perf_count('rows imported', report.imported)
+    return report
@@ -5,36 +5,40 @@
 
 # Version 3 Accounting Book with Correct Time Zone and Interface
 # import packages
+import time
+_script_started = time.perf_counter()
 import streamlit as st
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-from datetime import datetime, timedelta
+from datetime import timedelta
+import io
 import json
 import os
-from collections import defaultdict
-import re
-import pytz
-
-# timezone setup - Sydney
-SYDNEY_TZ = pytz.timezone('Australia/Sydney')
-
-def get_time():
-    return datetime.now(SYDNEY_TZ)
-
-def fix_datetime(dt_string=None):
-    if dt_string:
-        try:
-            dt = datetime.fromisoformat(dt_string.replace('Z', '+00:00'))
-            if dt.tzinfo is None:
-                dt = pytz.UTC.localize(dt)
-            sydney_time = dt.astimezone(SYDNEY_TZ)
-            return sydney_time.strftime("%Y-%m-%d %H:%M:%S %Z")
-        except:
-            return dt_string
-    else:
-        current_time = get_time()
-        return current_time.strftime("%Y-%m-%d %H:%M:%S %Z")
+import sys
+from collections import deque, OrderedDict
+# the engine lives in accounting_core.py, it imports without streamlit (see accounting_cli.py)
+from accounting_core import (
+    BINARY_SNAPSHOT_EXT, DATA_FILE, DEFAULT_CATEGORY_KEYWORDS, DUPLICATE_WINDOW, JOURNAL_MODE,
+    JSON_FILE, LEDGER_FILE, STORAGE_BACKEND, BudgetRule, ColumnarLedger, LazyModule, PerfTimer,
+    Transaction, add_transaction, analyze_range, analyze_spending, begin_metrics, budget_status,
+    category_summary, check_budget, clear_ledger, compact_journal, convert_ledger,
+    delete_transaction, description_mask, enable_metrics, end_metrics, filter_by_date_range,
+    find_duplicate, find_duplicates, fix_datetime, flush_writes, get_budget_rules,
+    get_category_keywords, get_date_examples, get_record, get_spending_advice, get_time,
+    guess_category, import_statement, is_binary_snapshot, journal_size, ledger_categories,
+    ledger_summary, maybe_compact_journal, metrics_enabled, open_ledger, parse_date_from_text,
+    parse_date_input, parse_filter_date, perf_count, period_breakdown, range_summary,
+    recent_write_metrics, record_startup, records_frame, refresh_ledger, remove_duplicates,
+    save_data, search_terms, search_transactions, set_budget_rules, set_category_keywords,
+    startup_timings, take_write_errors, update_transaction,
+)
+# pandas and plotly load on the first page that draws a table or chart
+pd = LazyModule('pandas')
+px = LazyModule('plotly.express')
+record_startup("import streamlit + engine", time.perf_counter() - _script_started)
+
+# headless use: python "accountingbook2(1).py" import-csv statement.csv runs the command line tools
+if __name__ == "__main__" and not st.runtime.exists():
+    from accounting_cli import main
+    sys.exit(main())
 
 st.set_page_config(
     page_title="Accouting Book V3",
@@ -42,263 +46,261 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-
-
-# create transaction function
-class Transaction:
-    def __init__(self, amount, description, category=None, date=None):
-        self.id = self.make_id()
-        self.amount = float(amount)
-        self.description = description
-        self.category = category or "Other"
-        
-        sydney_now = get_time()
-        
-        if date:
-            self.date = date
+# initialize stuff
+if 'transactions' not in st.session_state:
+    started = time.perf_counter()
+    st.session_state.transactions = open_ledger()
+    record_startup("open ledger", time.perf_counter() - started)
+# records other processes added since the last rerun
+refresh_ledger(st.session_state.transactions)
+
+def show_write_errors(errors):
+    for message in errors:
+        st.error(f"❌ {message}")
+    return not errors
+
+# failures from writes queued on earlier reruns
+show_write_errors(take_write_errors())
+
+def ledger_version(transactions):
+    version = getattr(transactions, 'version', None)
+    if version is None:
+        return id(transactions), len(transactions)
+    return version
+
+def columnar_view(transactions):
+    # columnar copy of the session ledger, rebuilt only when the ledger changes
+    if hasattr(transactions, 'to_frame') or hasattr(transactions, 'add_many'):
+        return transactions
+    # kept on the Ledger itself, so sessions sharing it share one copy
+    key = ledger_version(transactions)
+    cached = getattr(transactions, 'columnar', None) or st.session_state.get('columnar')
+    if cached is None or cached[0] != key:
+        cached = (key, ColumnarLedger.from_transactions(transactions))
+        if hasattr(transactions, 'version'):
+            transactions.columnar = cached
         else:
-            self.date = sydney_now.strftime("%Y-%m-%d")  
-        
-        self.timestamp = sydney_now.strftime("%Y-%m-%d %H:%M:%S")
-    
-    def make_id(self):
-        sydney_now = get_time()
-        return f"T{sydney_now.strftime('%Y%m%d%H%M%S')}"
-    
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'amount': self.amount,
-            'description': self.description,
-            'category': self.category,
-            'date': self.date,
-            'timestamp': self.timestamp
-        }
-    
-    @classmethod
-    def from_dict(cls, data):
-        trans = cls(data['amount'], data['description'], data['category'], data.get('date'))
-        trans.id = data['id']
-        trans.timestamp = data['timestamp']
-        return trans
-
-# date helper functions
-def parse_date_from_text(description):
-    desc = description.lower()
-    today = get_time()
-    
-    if 'yesterday' in desc:
-        return (today - timedelta(days=1)).strftime("%Y-%m-%d")
-    elif 'today' in desc:
-        return today.strftime("%Y-%m-%d")
-    elif 'tomorrow' in desc:
-        return (today + timedelta(days=1)).strftime("%Y-%m-%d")
-    
-    # check for "X days ago" 
-    # important: use regular expression
-    days_match = re.search(r'(\d+)\s*days?\s*ago', desc)
-    if days_match:
-        days = int(days_match.group(1))
-        return (today - timedelta(days=days)).strftime("%Y-%m-%d")
-    
-    return None
-
-# detect text imput like yesterday/tmr
-def parse_date_input(date_input):
-    if not date_input:
-        return get_time().strftime("%Y-%m-%d")
-    
-    date_input = date_input.lower().strip()
-    today = get_time()
-    
-    if date_input in ['today']:
-        return today.strftime("%Y-%m-%d")
-    elif date_input in ['yesterday']:
-        return (today - timedelta(days=1)).strftime("%Y-%m-%d")
-    elif date_input in ['tomorrow']:
-        return (today + timedelta(days=1)).strftime("%Y-%m-%d")
-    
-    # use try except funtion for parsing "X days ago"
-    try:
-        days_ago_match = re.match(r'(\d+)\s*days?\s*ago', date_input)
-        if days_ago_match:
-            days = int(days_ago_match.group(1))
-            return (today - timedelta(days=days)).strftime("%Y-%m-%d")
-    except:
-        pass
-    
-    # set different date formats
-    # need complex logic
-    
-    try:
-        # Full date format (10 characters)
-        if len(date_input) == 10 and '-' in date_input:
-            datetime.strptime(date_input, "%Y-%m-%d")
-            return date_input
-        # Short format date (8 characters)
-        elif len(date_input) == 8 and '-' in date_input:
-            parts = date_input.split('-')
-            # automatic split
-            if len(parts) == 3:
-                year, month, day = parts
-                formatted_date = f"{year}-{month.zfill(2)}-{day.zfill(2)}"
-                datetime.strptime(formatted_date, "%Y-%m-%d")
-                return formatted_date
-
-    except:
-        pass
-    
-    return today.strftime("%Y-%m-%d")
-
-def get_date_examples():
-    return ["today", "yesterday", "3 days ago", "2024-01-15"]
-
-def parse_filter_date(date_string):
-    if not date_string:
+            st.session_state.columnar = cached
+    return cached[1]
+
+# render cache - streamlit reruns the whole script on every click, so tables, analysis
+# results and figures are memoized per ledger version and page key (e.g. the date range)
+RENDER_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+def _estimate_size(value):
+    # duck typed so sizing a cached value never imports pandas or numpy by itself
+    if hasattr(value, 'memory_usage'):
+        return int(value.memory_usage(deep=True).sum())
+    if hasattr(value, 'nbytes'):
+        return value.nbytes
+    if hasattr(value, 'to_plotly_json'):
+        return len(value.to_json())
+    if hasattr(value, 'amounts'):
+        # columnar ledger: four numeric columns plus ids and descriptions
+        return value.amounts.nbytes * 4 + 100 * len(value)
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + 200 * len(value)
+    return len(json.dumps(value, default=str))
+
+class RenderCache:
+    def __init__(self, max_bytes=RENDER_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # key -> (value, size), least recently used first
+        self.bytes = 0
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+    
+    def get_or_build(self, version, key, build):
+        if version != self.version:
+            # everything built for an older ledger is stale
+            self.clear()
+            self.version = version
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            perf_count('render cache hits')
+            return self.entries[key][0]
+        self.misses += 1
+        perf_count('render cache misses')
+        with PerfTimer("build " + " ".join(str(part) for part in key[:2])):
+            value = build()
+        size = _estimate_size(value)
+        self.entries[key] = (value, size)
+        self.bytes += size
+        while self.bytes > self.max_bytes and len(self.entries) > 1:
+            _, (_, old_size) = self.entries.popitem(last=False)
+            self.bytes -= old_size
+        return value
+    
+    def clear(self):
+        self.entries.clear()
+        self.bytes = 0
+
+def cached(*key, build):
+    if 'render_cache' not in st.session_state:
+        st.session_state.render_cache = RenderCache()
+    return st.session_state.render_cache.get_or_build(ledger_version(st.session_state.transactions), key, build)
+
+# paginated record table - rows come from a cached pre-sorted index, only the visible
+# page is formatted and sent to the browser
+RECORD_PAGE_SIZES = (25, 50, 100, 250, 500)
+RECORD_COLUMNS = ('No.', 'Amount', 'Description', 'Category', 'Date', 'Time')  # the ID column stays hidden
+RECORD_SORT_COLUMNS = ('Date', 'Amount', 'Category', 'Description')
+TREND_MONTHS = 12  # months shown on the Analysis trend chart
+CATEGORIES = ['Food&Drinks', 'Transportation', 'Shopping', 'Entertainment', 'Medical', 'Education', 'Life Expense', 'Other']
+IMPORT_DUPLICATE_MODES = {"Skip them": 'skip', "Import and list them": 'flag', "Import them": 'keep'}
+IMPORT_SPENDING_SIGNS = {"Work it out": 'auto', "Negative (-12.30)": 'negative', "Positive (12.30)": 'positive'}
+BUDGET_RULE_TYPES = {"Per month": 'month', "Per week": 'week', "Per day": 'day', "Single transaction": None}
+DEDUPE_WINDOWS = {  # label -> seconds between the two entries, None for any time
+    "within 10 minutes (double submits)": DUPLICATE_WINDOW,
+    "within a minute": 60,
+    "at any time": None,
+}
+PERF_HISTORY = 100  # reruns kept per session for the metrics download
+
+def record_mask(transactions, category=None, search=None):
+    # rows passing the category and description filters, None when neither is set
+    terms = tuple(search_terms(search))
+    if category is None and not terms:
         return None
-    
-    try:
-        if '-' in date_string:
-            return datetime.strptime(date_string, "%Y-%m-%d").date()
-        elif '/' in date_string:
-            return datetime.strptime(date_string, "%d/%m/%Y").date()
-    except:
-        pass
-    
-    return None
-
-# range filter: to choose data range
-def filter_by_date_range(transactions, start_date, end_date):
-    filtered = []
-    for trans in transactions:
-        try:
-            trans_date = datetime.strptime(trans.date, "%Y-%m-%d").date()
-            if start_date <= trans_date <= end_date:
-                filtered.append(trans)
-        except:
-            continue
-    return filtered
-
-# category guessing - basic keyword matching
-def guess_category(description):
-    keywords = {
-        'Food&Drinks': ['coffee', 'milk tea', 'breakfast', 'lunch', 'dinner', 'canteen', 'mcdonalds', 'starbucks', 'uber eats', 'deliveroo', 'food', 'restaurant', 'cafe', 'drink'],
-        'Transportation': ['subway', 'bus', 'taxi', 'gas cost', 'parking', 'train ticket', 'air ticket', 'transport', 'opal', 'metro', 'uber', 'fuel'],
-        'Shopping': ['supermarket', 'shoes', 'clothing', 'skin care products', 'electronic products', 'amazon', 'woolworths', 'coles', 'target', 'kmart', 'shop'],
-        'Entertainment': ['movies', 'games', 'ktv', 'travel', 'gym', 'bookstore', 'concert', 'cinema', 'netflix', 'spotify', 'gaming'],
-        'Medical': ['hospital', 'pharmacy', 'physical examination', 'dentist', 'medicine', 'doctor', 'clinic', 'health'],
-        'Education': ['tuition', 'tutoring', 'exam fees', 'textbooks', 'uts', 'university', 'course', 'book', 'study'],
-        'Life Expense': ['rent', 'utilities', 'internet', 'furniture', 'electricity', 'water', 'gas', 'phone', 'home'],
-        'Other': []
-    }
-    
-    desc = description.lower()
-    scores = {}
-    for category, words in keywords.items():
-        score = 0
-        for word in words:
-            if word.lower() in desc:
-                score += 2
-        scores[category] = score
-    
-    if max(scores.values()) > 0:
-        return max(scores, key=scores.get)
-    return 'Other'
-
-# spending analysis
-def analyze_spending(transactions):
-    if not transactions:
-        return {"error": "no data"}
-    
-    category_totals = defaultdict(float)
-    total_spending = 0
-    
-    for trans in transactions:
-        category_totals[trans.category] += trans.amount
-        total_spending += trans.amount
-    
-    category_percentages = {}
-    for category, amount in category_totals.items():
-        percentage = (amount / total_spending) * 100 if total_spending > 0 else 0
-        category_percentages[category] = {
-            'amount': amount,
-            'percentage': round(percentage, 1)
-        }
-    
-    return {
-        'total_spending': total_spending,
-        'category_breakdown': category_percentages,
-        'transaction_count': len(transactions),
-        'average_transaction': round(total_spending / len(transactions), 2) if transactions else 0
-    }
-
-def get_spending_advice(analysis):
-    if 'error' in analysis:
-        return ["No data available for advice"]
-    
-    advice = []
-    category_breakdown = analysis['category_breakdown']
-    
-    for category, data in category_breakdown.items():
-        percentage = data['percentage']
-        
-        if category == 'Food&Drinks' and percentage > 35:
-            advice.append(f"Food & Drinks spending is {percentage}%. Maybe cook more at home?")
-        elif category == 'Entertainment' and percentage > 25:
-            advice.append(f"Entertainment is {percentage}% of total. Try some free activities around UTS.")
-        elif category == 'Shopping' and percentage > 30:
-            advice.append(f"Shopping is {percentage}%. Consider making a list before shopping.")
-        elif category == 'Transportation' and percentage > 20:
-            advice.append(f"Transportation is {percentage}%. Maybe walk more or use student discounts.")
-    
-    if analysis['average_transaction'] > 100:
-        advice.append(f"Average transaction is ${analysis['average_transaction']} - quite high. Budget for big purchases.")
-    
-    if not advice:
-        advice.append("Your spending looks balanced! Good job.")
-    
-    return advice
-
-# data saving/loading
-def save_data(transactions, filename="budget_data.json"):
-    try:
-        data = {
-            'transactions': [trans.to_dict() for trans in transactions],
-            'last_updated': get_time().isoformat(),
-        }
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-        return True
-    except:
-        st.error("save failed")
-        return False
-
-def load_data(filename="budget_data.json"):
-    if not os.path.exists(filename):
-        return []
-    try:
-        with open(filename, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            
-            if isinstance(data, list):
-                transactions = []
-                for item in data:
-                    transactions.append(Transaction.from_dict(item))
-                return transactions
-            elif isinstance(data, dict) and 'transactions' in data:
-                transactions = []
-                for item in data['transactions']:
-                    transactions.append(Transaction.from_dict(item))
-                return transactions
-            else:
-                return []
-    except:
-        st.error("load failed")
-        return []
+    ledger = columnar_view(transactions)
+    
+    def build():
+        mask = ledger.category_mask(category) if category is not None else None
+        if terms:
+            # the word index follows the live ledger: rows another session appended since the
+            # view was built are cut off, an edit or a delete bumps the version and rebuilds the view
+            found = description_mask(transactions, " ".join(terms))[:len(ledger)]
+            mask = found if mask is None else mask & found
+        return mask
+    return cached('records', 'mask', category, terms, build=build)
+
+def search_summary(transactions, category=None, search=None):
+    # count and total of the search hits, only the hits are summed
+    if hasattr(transactions, 'add_many'):
+        return transactions.summary(category=category, search=search)
+    ledger = columnar_view(transactions)
+    
+    def build():
+        hits = record_mask(transactions, category, search).nonzero()[0]
+        total = float(ledger.amounts[hits].sum())
+        return {'count': len(hits), 'total': total, 'average': total / len(hits) if len(hits) else 0}
+    return cached('records', 'search summary', category, tuple(search_terms(search)), build=build)
+
+def record_page(transactions, category=None, sort='Date', descending=True, page=1, page_size=50, search=None):
+    # returns the table for one page and the number of rows in the (filtered) set
+    columns = RECORD_COLUMNS + ('ID',)
+    offset = (page - 1) * page_size
+    if hasattr(transactions, 'add_many'):
+        count = transactions.summary(category=category, search=search)['count']
+        rows = transactions.query(category=category, limit=page_size, offset=offset, sort=sort, descending=descending,
+                                  search=search)
+        return records_frame(rows, columns, presorted=True, start=offset + 1), count
+    ledger = columnar_view(transactions)
+    index = cached('records', 'order', sort, descending, build=lambda: ledger.sorted_index(sort, descending))
+    mask = record_mask(transactions, category, search)
+    if mask is not None:
+        # filtering a sorted index keeps it sorted
+        index = cached('records', 'order', sort, descending, category, tuple(search_terms(search)),
+                       build=lambda: index[mask[index]])
+    return ledger.to_frame(columns, index=index[offset:offset + page_size], start=offset + 1), len(index)
+
+def category_pie(category_data, title):
+    return px.pie(values=[data['amount'] for data in category_data.values()], names=list(category_data),
+                  title=title)
+
+def category_bar(category_data, title, color_scale):
+    amounts = [data['amount'] for data in category_data.values()]
+    fig_bar = px.bar(x=list(category_data), y=amounts,
+                     title=title,
+                     color=amounts,
+                     color_continuous_scale=color_scale)
+    fig_bar.update_layout(xaxis_title="Category", yaxis_title="Amount (AUD)")
+    return fig_bar
+
+def trend_bar(breakdown, title):
+    # breakdown: period label -> {category: amount}, stacked by category
+    labels, categories, amounts = [], [], []
+    for label, totals in breakdown.items():
+        for category, amount in totals.items():
+            labels.append(label)
+            categories.append(category)
+            amounts.append(amount)
+    fig = px.bar(x=labels, y=amounts, color=categories, title=title)
+    fig.update_layout(xaxis_title="Month", yaxis_title="Amount (AUD)", legend_title="Category")
+    return fig
+
+# sending figures and tables to the browser is timed apart from building them
+def show_chart(fig):
+    with PerfTimer("plotly render"):
+        st.plotly_chart(fig, use_container_width=True)
+
+def show_table(df, **kwargs):
+    with PerfTimer("table render"):
+        return st.dataframe(df, **kwargs)
+
+def record_editor(record):
+    # edit or delete the record selected in the table, by id
+    with st.form(f"edit_{record.id}"):
+        st.markdown(f"**✏️ Edit record** (entered {record.timestamp})")
+        col1, col2 = st.columns(2)
+        with col1:
+            amount = st.number_input("Amount ($AUD)", min_value=0.01, step=0.01, format="%.2f", value=float(record.amount))
+            description = st.text_input("Description", record.description)
+        with col2:
+            choices = CATEGORIES if record.category in CATEGORIES else CATEGORIES + [record.category]
+            category = st.selectbox("Category", choices, index=choices.index(record.category))
+            date_input = st.text_input("Date", record.date)
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            save = st.form_submit_button("💾 Save Changes", use_container_width=True)
+        with col2:
+            delete = st.form_submit_button("🗑️ Delete Record", use_container_width=True)
+        with col3:
+            confirm = st.checkbox("Yes, delete it")
+    
+    if save:
+        new_date = parse_filter_date(date_input)
+        if not description.strip():
+            st.error("❌ Fill in all fields")
+        elif new_date is None:
+            st.error(" Invalid date format")
+        else:
+            update_transaction(st.session_state.transactions, record.id, amount=float(amount),
+                               description=description.strip(), category=category,
+                               date=new_date.strftime("%Y-%m-%d"))
+            st.session_state.record_notice = f"✅ Saved: {amount:.2f} AUD {description.strip()}"
+            st.rerun()
+    if delete:
+        if not confirm:
+            st.warning("⚠️ Tick \"Yes, delete it\" first")
+        else:
+            delete_transaction(st.session_state.transactions, record.id)
+            st.session_state.record_notice = f"✅ Deleted: {record.amount:.2f} AUD {record.description}"
+            st.rerun()
 
-# initialize stuff
-if 'transactions' not in st.session_state:
-    st.session_state.transactions = load_data()
+def add_expense(transaction):
+    if add_transaction(st.session_state.transactions, transaction):
+        st.success(f"""
+        ✅ Added successfully:
+        - Amount: ${transaction.amount:.2f} AUD
+        - Description: {transaction.description}
+        - Category: {transaction.category}
+        - Date: {transaction.date}
+        - Time: {transaction.timestamp} {transaction.timezone_display}
+        """)
+    else:
+        st.warning("⚠️ Added but save failed")
+    # budget rules, checked against the running totals the record just went into
+    show_budget_alerts(check_budget(st.session_state.transactions, transaction))
+
+def show_budget_alerts(alerts):
+    for alert in alerts:
+        if alert['level'] == 'over':
+            st.error(f"💰 Over budget: {alert['message']}")
+        else:
+            st.warning(f"💰 Nearly there: {alert['message']}")
 
 # add icons to improve page design
 def show_time_info():
@@ -313,6 +315,14 @@ st.markdown('<h1 class="main-header">Accounting Book Project V3</h1>', unsafe_al
 st.sidebar.title("📋 Menu")
 page = st.sidebar.selectbox("Pick a function", ["💰 Add Expense", "📊 View Records", "📈 Analysis", "📅 Date Filter", "⚙️ Settings"])
 
+# performance panel - timings and counters of each rerun, shown at the bottom of the sidebar.
+# opening it turns collection on for the whole process (ACCOUNTING_METRICS=1 does it at start),
+# closing it only hides the panel, other sessions may be looking at theirs
+show_performance = st.sidebar.checkbox("⚡ Performance", value=metrics_enabled())
+if show_performance and not metrics_enabled():
+    enable_metrics(True)
+rerun_metrics = begin_metrics('rerun', page) if metrics_enabled() else None
+page_timer = PerfTimer(f"page {page}").start()
 
 if page == "💰 Add Expense":
     st.header("💰 Add New Expense")
@@ -352,7 +362,7 @@ if page == "💰 Add Expense":
         with col2:
             if not (description and auto_date and use_auto):
                 manual_date = st.text_input("Or enter manually", 
-                                          placeholder="today, yesterday, 3 days ago")
+                                          placeholder="today, 3 days ago, last friday, 14/07/2024")
         
         st.info(" **Examples**: " + " | ".join(get_date_examples()))
         
@@ -367,108 +377,123 @@ if page == "💰 Add Expense":
         
         # category suggestion
         if description:
-            suggested = guess_category(description)
+            # learned from the categories picked for earlier records, keywords for new merchants
+            suggested = guess_category(description, st.session_state.transactions)
             st.markdown(f"""
             <div class="category-suggestion">
                 🤖 <strong>Suggested category:</strong> {suggested}<br>
-                💡 Based on keywords
+                💡 Based on your records and keywords
             </div>
             """, unsafe_allow_html=True)
         else:
             suggested = 'Other'
         
-        categories = ['Food&Drinks', 'Transportation', 'Shopping', 'Entertainment', 'Medical', 'Education', 'Life Expense', 'Other']
-        default_idx = categories.index(suggested) if suggested in categories else 0
-        category = st.selectbox("Category", categories, index=default_idx)
+        default_idx = CATEGORIES.index(suggested) if suggested in CATEGORIES else 0
+        category = st.selectbox("Category", CATEGORIES, index=default_idx)
         
         submitted = st.form_submit_button(" Add Record", use_container_width=True)
         
         if submitted:
             if amount > 0 and description:
                 transaction = Transaction(amount, description, category, final_date)
-                st.session_state.transactions.append(transaction)
-
-                if save_data(st.session_state.transactions):
-                    st.success(f"""
-                    ✅ Added successfully:
-                    - Amount: ${amount:.2f} AUD
-                    - Description: {description}
-                    - Category: {category}
-                    - Date: {final_date}
-                    - Time: {transaction.timestamp} {transaction.timezone_display}
-                    """)
+                # a double submit or a re-entered record waits for confirmation below the form
+                earlier = find_duplicate(st.session_state.transactions, transaction)
+                if earlier is not None:
+                    st.session_state.pending_duplicate = (transaction, earlier)
                 else:
-                    st.warning("⚠️ Added but save failed")
+                    st.session_state.pop('pending_duplicate', None)
+                    add_expense(transaction)
             else:
                 st.error("❌ Fill in all fields")
+    
+    if 'pending_duplicate' in st.session_state:
+        transaction, earlier = st.session_state.pending_duplicate
+        notice = st.empty()
+        notice.warning(f"⚠️ Looks like a duplicate: {earlier.amount:.2f} AUD \"{earlier.description}\" "
+                       f"on {earlier.date} was already entered at {earlier.timestamp}")
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button("➕ Add anyway", use_container_width=True):
+                del st.session_state.pending_duplicate
+                notice.empty()
+                add_expense(transaction)
+        with col2:
+            if st.button("✖️ Discard", use_container_width=True):
+                del st.session_state.pending_duplicate
+                st.rerun()
 
 elif page == "📊 View Records":
     st.header("📊 All Records")
     
+    if 'record_notice' in st.session_state:
+        st.success(st.session_state.pop('record_notice'))
+    
     if st.session_state.transactions:
-        total = sum(t.amount for t in st.session_state.transactions)
-        count = len(st.session_state.transactions)
-        avg = total / count if count > 0 else 0
+        summary = ledger_summary(st.session_state.transactions)
         
         col1, col2, col3, col4 = st.columns(4)
         
         with col1:
-            st.metric(" Total", f"{total:.2f} AUD")
+            st.metric(" Total", f"{summary['total']:.2f} AUD")
         with col2:
-            st.metric(" Records", count)
+            st.metric(" Records", summary['count'])
         with col3:
-            st.metric(" Average", f"{avg:.2f} AUD")
+            st.metric(" Average", f"{summary['average']:.2f} AUD")
         with col4:
-            cats = len(set(t.category for t in st.session_state.transactions))
-            st.metric(" Categories", cats)
+            st.metric(" Categories", summary['categories'])
         
         st.markdown("---")
         
-        if st.session_state.transactions:
-            dates = [t.date for t in st.session_state.transactions]
-            earliest = min(dates)
-            latest = max(dates)
-            st.info(f" Range: {earliest} to {latest}")
+        st.info(f" Range: {summary['earliest']} to {summary['latest']}")
         
         # table display
-        df_data = []
-        sorted_trans = sorted(st.session_state.transactions, key=lambda x: (x.date, x.timestamp), reverse=True)
-        
-        for i, trans in enumerate(sorted_trans, 1):
-            df_data.append({
-                'No.': i,
-                'Amount': f"{trans.amount:.2f}",
-                'Description': trans.description,
-                'Category': trans.category,
-                'Date': trans.date,
-                'Time': trans.timestamp
-            })
-        
-        df = pd.DataFrame(df_data)
-        st.dataframe(df, use_container_width=True, hide_index=True)
-        
-        # category filter
         st.subheader("🔍 Filter")
-        available_cats = ['All'] + sorted(list(set(t.category for t in st.session_state.transactions)))
-        selected_cat = st.selectbox("Select category", available_cats)
+        search = st.text_input("Search descriptions", placeholder="uber eats, wool, coffee cbd").strip()
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            available_cats = ['All'] + ledger_categories(st.session_state.transactions)
+            selected_cat = st.selectbox("Select category", available_cats)
+        with col2:
+            sort_by = st.selectbox("Sort by", RECORD_SORT_COLUMNS)
+        with col3:
+            descending = st.selectbox("Order", ["Descending", "Ascending"]) == "Descending"
+        with col4:
+            page_size = st.selectbox("Rows per page", RECORD_PAGE_SIZES, index=1)
+        
+        category = None if selected_cat == 'All' else selected_cat
+        if search_terms(search):
+            hits = search_summary(st.session_state.transactions, category, search)
+            scope = f" in {selected_cat}" if category is not None else ""
+            st.info(f"\"{search}\"{scope}: {hits['count']} records, {hits['total']:.2f} AUD "
+                    f"(average {hits['average']:.2f} AUD)")
+            total_rows = hits['count']
+        elif category is not None:
+            cat_summary = category_summary(st.session_state.transactions, category)
+            st.info(f"{selected_cat}: {cat_summary['count']} records, {cat_summary['total']:.2f} AUD")
+            total_rows = cat_summary['count']
+        else:
+            total_rows = summary['count']
         
-        if selected_cat != 'All':
-            filtered = [t for t in st.session_state.transactions if t.category == selected_cat]
-            filtered_total = sum(t.amount for t in filtered)
-            st.info(f"{selected_cat}: {len(filtered)} records, {filtered_total:.2f} AUD")
-            
-            filtered_data = []
-            for i, trans in enumerate(filtered, 1):
-                filtered_data.append({
-                    'No.': i,
-                    'Amount': f"{trans.amount:.2f}",
-                    'Description': trans.description,
-                    'Date': trans.date,
-                    'Time': f"{trans.timestamp} {getattr(trans)}"
-                })
+        if total_rows:
+            pages = max(1, -(-total_rows // page_size))
+            page_no = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1, step=1)
             
-            filtered_df = pd.DataFrame(filtered_data)
-            st.dataframe(filtered_df, use_container_width=True, hide_index=True)
+            df, total_rows = record_page(st.session_state.transactions, category, sort_by, descending,
+                                         int(page_no), page_size, search)
+            # a new key whenever the ledger or the page changes, so a selection never points at another row
+            table = show_table(df, use_container_width=True, hide_index=True, column_order=RECORD_COLUMNS,
+                               on_select="rerun", selection_mode="single-row",
+                               key=f"records {ledger_version(st.session_state.transactions)} {page_no} "
+                                   f"{sort_by} {descending} {category} {search}")
+            first = (int(page_no) - 1) * page_size
+            st.caption(f"Rows {min(first + 1, total_rows)}-{min(first + page_size, total_rows)} of {total_rows}"
+                       " - select a row to edit or delete it")
+            selected = table.selection.rows
+            record = get_record(st.session_state.transactions, df['ID'].iloc[selected[0]]) if selected else None
+            if record is not None:
+                record_editor(record)
+        else:
+            st.warning(" No matching records")
     
     else:
         st.info(" No records yet. Add some expenses first!")
@@ -477,7 +502,7 @@ elif page == "📈 Analysis":
     st.header("📈 Spending Analysis")
     
     if st.session_state.transactions:
-        analysis = analyze_spending(st.session_state.transactions)
+        analysis = cached('analysis', 'analysis', build=lambda: analyze_spending(st.session_state.transactions))
         
         if analysis and 'error' not in analysis:
             col1, col2, col3, col4 = st.columns(4)
@@ -499,21 +524,14 @@ elif page == "📈 Analysis":
             with col1:
                 st.subheader(" Distribution")
                 category_data = analysis['category_breakdown']
-                categories = list(category_data.keys())
-                amounts = [data['amount'] for data in category_data.values()]
-                
-                fig_pie = px.pie(values=amounts, names=categories, 
-                               title="Spending by Category")
-                st.plotly_chart(fig_pie, use_container_width=True)
+                fig_pie = cached('analysis', 'pie', build=lambda: category_pie(category_data, "Spending by Category"))
+                show_chart(fig_pie)
             
             with col2:
                 st.subheader(" Amounts")
-                fig_bar = px.bar(x=categories, y=amounts,
-                               title="Amount by Category",
-                               color=amounts,
-                               color_continuous_scale="viridis")
-                fig_bar.update_layout(xaxis_title="Category", yaxis_title="Amount (AUD)")
-                st.plotly_chart(fig_bar, use_container_width=True)
+                fig_bar = cached('analysis', 'bar',
+                                 build=lambda: category_bar(category_data, "Amount by Category", "viridis"))
+                show_chart(fig_bar)
             
             # breakdown table
             st.subheader(" Breakdown")
@@ -536,19 +554,40 @@ elif page == "📈 Analysis":
                 st.progress(progress)
                 st.markdown("---")
             
+            # month over month, straight from the monthly rollups
+            st.subheader(" Monthly Trend")
+            trend = cached('analysis', 'trend', build=lambda: period_breakdown(st.session_state.transactions, 'month'))
+            if trend:
+                months = list(trend)[-TREND_MONTHS:]
+                recent = {month: trend[month] for month in months}
+                fig_trend = cached('analysis', 'trend bar', build=lambda: trend_bar(recent, "Spending by Month"))
+                show_chart(fig_trend)
+                # the calendar month before, a month without records is absent from the rollups
+                year, month = map(int, months[-1].split('-'))
+                previous = f"{year - (month == 1)}-{(month - 2) % 12 + 1:02d}"
+                this_month = sum(trend[months[-1]].values())
+                last_month = sum(trend.get(previous, {}).values())
+                change = f"{(this_month - last_month) / last_month * 100:+.1f}%" if last_month else None
+                st.metric(f" {months[-1]} vs {previous}", f"{this_month:.2f} AUD", change, delta_color="inverse")
+            
+            # budget rules with a period, this period's total against the limit
+            status = budget_status(st.session_state.transactions)
+            if status:
+                st.subheader("💰 Budgets")
+                for row in status:
+                    st.progress(min(row['share'], 1.0),
+                                text=f"{row['rule']} ({row['period']}): {row['spent']:.2f} AUD, {row['share']:.0%}")
+            
             # advice
             st.subheader(" Advice")
-            advice = get_spending_advice(analysis)
+            advice = cached('analysis', 'advice', build=lambda: get_spending_advice(analysis))
             
             for i, tip in enumerate(advice, 1):
                 st.success(f"**{i}.** {tip}")
             
             # period info
-            if st.session_state.transactions:
-                dates = [trans.date for trans in st.session_state.transactions]
-                earliest = min(dates)
-                latest = max(dates)
-                st.info(f" **Period**: {earliest} to {latest}")
+            summary = ledger_summary(st.session_state.transactions)
+            st.info(f" **Period**: {summary['earliest']} to {summary['latest']}")
     
     else:
         st.info(" No data to analyze yet.")
@@ -567,7 +606,10 @@ elif page == "📅 Date Filter":
         with col2:
             end_input = st.text_input("End Date", placeholder="2024-07-21 or 21/07/2024")
         
-        st.info(" Examples: 2024-07-14, 2024-07-21 or 14/07/2024, 21/07/2024")
+        st.info(" Examples: 2024-07-14, 14/07/2024, 2 weeks ago, last friday, yesterday")
+        search = st.text_input("Search descriptions (optional)", placeholder="uber eats, wool, coffee cbd",
+                               key="date_filter_search").strip()
+        terms = tuple(search_terms(search))
         
         if start_input and end_input:
             start_date = parse_filter_date(start_input)
@@ -575,44 +617,45 @@ elif page == "📅 Date Filter":
             
             if start_date and end_date:
                 if start_date <= end_date:
-                    filtered = filter_by_date_range(st.session_state.transactions, start_date, end_date)
+                    period = (start_date, end_date, terms)
+                    if terms:
+                        # the hits are summed and analyzed directly, the rollups cover whole days
+                        filtered = cached('date filter', 'records', period,
+                                          build=lambda: search_transactions(st.session_state.transactions, search,
+                                                                            start_date=start_date, end_date=end_date))
+                    else:
+                        filtered = cached('date filter', 'records', period,
+                                          build=lambda: filter_by_date_range(st.session_state.transactions, start_date, end_date))
                     
                     if filtered:
                         st.success(f" Found {len(filtered)} records")
-                        total_money = 0
-                        for t in filtered:
-                            total_filtered += t.amount
-                        avg_filtered = total_filtered / len(filtered) if filtered else 0
+                        if terms:
+                            filtered_summary = cached('date filter', 'summary', period, build=lambda: ledger_summary(filtered))
+                        else:
+                            filtered_summary = cached('date filter', 'summary', period,
+                                                      build=lambda: range_summary(st.session_state.transactions, start_date, end_date))
                         
                         col1, col2, col3 = st.columns(3)
                         
                         with col1:
-                            st.metric(" Total", f"{total_filtered:.2f} AUD")
+                            st.metric(" Total", f"{filtered_summary['total']:.2f} AUD")
                         with col2:
-                            st.metric(" Records", len(filtered))
+                            st.metric(" Records", filtered_summary['count'])
                         with col3:
-                            st.metric(" Average", f"{avg_filtered:.2f} AUD")
+                            st.metric(" Average", f"{filtered_summary['average']:.2f} AUD")
                         
                         st.markdown("---")
                         
-                        df_data = []
-                        sorted_filtered = sorted(filtered, key=lambda x: (x.date, x.timestamp), reverse=True)
-                        
-                        for i, trans in enumerate(sorted_filtered, 1):
-                            df_data.append({
-                                'No.': i,
-                                'Amount': f"{trans.amount:.2f}",
-                                'Description': trans.description,
-                                'Category': trans.category,
-                                'Date': trans.date,
-                                'Time': trans.timestamp
-                            })
-                        
-                        df = pd.DataFrame(df_data)
-                        st.dataframe(df, use_container_width=True, hide_index=True)
+                        df = cached('date filter', 'table', period, build=lambda: records_frame(filtered))
+                        show_table(df, use_container_width=True, hide_index=True)
                         
                         st.subheader(" Period Analysis")
-                        period_analysis = analyze_spending(filtered)
+                        if terms:
+                            period_analysis = cached('date filter', 'analysis', period,
+                                                     build=lambda: analyze_spending(filtered))
+                        else:
+                            period_analysis = cached('date filter', 'analysis', period,
+                                                     build=lambda: analyze_range(st.session_state.transactions, start_date, end_date))
                         
                         if period_analysis and 'error' not in period_analysis:
                             cat_data = period_analysis['category_breakdown']
@@ -620,20 +663,14 @@ elif page == "📅 Date Filter":
                             col1, col2 = st.columns(2)
                             
                             with col1:
-                                categories = list(cat_data.keys())
-                                amounts = [data['amount'] for data in cat_data.values()]
-                                
-                                fig_pie = px.pie(values=amounts, names=categories, 
-                                               title=f"Period Distribution")
-                                st.plotly_chart(fig_pie, use_container_width=True)
+                                fig_pie = cached('date filter', 'pie', period,
+                                                 build=lambda: category_pie(cat_data, "Period Distribution"))
+                                show_chart(fig_pie)
                             
                             with col2:
-                                fig_bar = px.bar(x=categories, y=amounts,
-                                               title=f"Period Amounts",
-                                               color=amounts,
-                                               color_continuous_scale="Blues")
-                                fig_bar.update_layout(xaxis_title="Category", yaxis_title="Amount (AUD)")
-                                st.plotly_chart(fig_bar, use_container_width=True)
+                                fig_bar = cached('date filter', 'bar', period,
+                                                 build=lambda: category_bar(cat_data, "Period Amounts", "Blues"))
+                                show_chart(fig_bar)
                             
                             for category, data in cat_data.items():
                                 st.write(f"{category}: {data['amount']:.2f} ({data['percentage']}%)")
@@ -652,35 +689,36 @@ elif page == "📅 Date Filter":
             
             col1, col2, col3 = st.columns(3)
             
+            # totals come from the day rollups, no records are scanned
             with col1:
                 if st.button(" Last 7 Days"):
                     end_date = current.date()
                     start_date = end_date - timedelta(days=6)
                     
-                    filtered_7d = filter_by_date_range(st.session_state.transactions, start_date, end_date)
+                    summary_7d = range_summary(st.session_state.transactions, start_date, end_date)
                     
-                    if filtered_7d:
-                        st.success(f"📊 Last 7 days: {len(filtered_7d)} records, {sum(t.amount for t in filtered_7d):.2f} AUD")
+                    if summary_7d['count']:
+                        st.success(f"📊 Last 7 days: {summary_7d['count']} records, {summary_7d['total']:.2f} AUD")
             
             with col2:
                 if st.button(" Last 30 Days"):
                     end_date = current.date()
                     start_date = end_date - timedelta(days=29)
                     
-                    filtered_30d = filter_by_date_range(st.session_state.transactions, start_date, end_date)
+                    summary_30d = range_summary(st.session_state.transactions, start_date, end_date)
                     
-                    if filtered_30d:
-                        st.success(f"📊 Last 30 days: {len(filtered_30d)} records, {sum(t.amount for t in filtered_30d):.2f} AUD")
+                    if summary_30d['count']:
+                        st.success(f"📊 Last 30 days: {summary_30d['count']} records, {summary_30d['total']:.2f} AUD")
             
             with col3:
                 if st.button(" This Month"):
                     start_date = current.replace(day=1).date()
                     end_date = current.date()
                     
-                    filtered_month = filter_by_date_range(st.session_state.transactions, start_date, end_date)
+                    summary_month = range_summary(st.session_state.transactions, start_date, end_date)
                     
-                    if filtered_month:
-                        st.success(f" This month: {len(filtered_month)} records, {sum(t.amount for t in filtered_month):.2f} AUD")
+                    if summary_month['count']:
+                        st.success(f" This month: {summary_month['count']} records, {summary_month['total']:.2f} AUD")
     else:
         st.info(" No data to filter yet.")
 
@@ -694,29 +732,150 @@ elif page == "⚙️ Settings":
         st.info(f"Records: {len(st.session_state.transactions)}")
         
         if st.session_state.transactions:
-            total = sum(t.amount for t in st.session_state.transactions)
-            st.success(f"Total: {total:.2f} AUD")
-            
-            dates = [t.date for t in st.session_state.transactions]
-            earliest = min(dates)
-            latest = max(dates)
-            st.info(f"Range: {earliest} to {latest}")
+            summary = ledger_summary(st.session_state.transactions)
+            st.success(f"Total: {summary['total']:.2f} AUD")
+            st.info(f"Range: {summary['earliest']} to {summary['latest']}")
             st.info(f"Timezone: Australia/Sydney ({get_time().strftime('%Z')})")
+        
+        if 'render_cache' in st.session_state:
+            cache = st.session_state.render_cache
+            st.caption(f"Render cache: {len(cache.entries)} entries, {cache.bytes / 1024:.0f} KB, "
+                       f"{cache.hits} hits / {cache.misses} misses")
+        
+        with st.expander("⏱️ Startup timing"):
+            # markdown rather than a dataframe, this page shouldn't be the one that loads pandas
+            rows = ["| Step | ms | Modules |", "|---|---:|---:|"]
+            rows += [f"| {step} | {seconds * 1000:.0f} | {modules or ''} |"
+                     for step, (seconds, modules) in startup_timings.items()]
+            st.markdown("\n".join(rows))
+            st.caption("First run of this server process, pandas and plotly load on first use")
+        
+        with st.expander("🏷️ Category Keywords"):
+            st.caption("Comma separated, used for the suggested category until your own records say otherwise")
+            keywords = get_category_keywords()
+            edited = {}
+            for cat, words in keywords.items():
+                if cat == 'Other':
+                    edited[cat] = words
+                    continue
+                text = st.text_area(cat, ", ".join(words), key=f"keywords_{cat}")
+                edited[cat] = text.split(',')
+            if st.button("💾 Save Keywords"):
+                set_category_keywords(edited)
+                st.success("✅ Keywords saved")
+            if st.button("↩️ Reset Keywords"):
+                set_category_keywords(DEFAULT_CATEGORY_KEYWORDS)
+                st.rerun()
+        
+        with st.expander("💰 Budget Rules"):
+            st.caption("Checked after every record you add, saved in budget_rules.json next to the ledger")
+            rules = get_budget_rules()
+            for i, rule in enumerate(rules):
+                col_rule, col_remove = st.columns([4, 1])
+                with col_rule:
+                    st.write(rule.describe())
+                with col_remove:
+                    if st.button("🗑️", key=f"budget_remove_{i}"):
+                        set_budget_rules(rules[:i] + rules[i + 1:])
+                        st.rerun()
+            if not rules:
+                st.info("No budget rules yet")
+            with st.form("budget_rule"):
+                scope = st.selectbox("Category", ["All categories"] + CATEGORIES)
+                kind = st.selectbox("Limit", list(BUDGET_RULE_TYPES))
+                limit = st.number_input("Amount ($AUD)", min_value=0.01, step=10.0, format="%.2f", value=100.0)
+                if st.form_submit_button("➕ Add Rule"):
+                    category = None if scope == "All categories" else scope
+                    set_budget_rules(rules + [BudgetRule(limit, category, BUDGET_RULE_TYPES[kind])])
+                    st.rerun()
     
     with col2:
         st.subheader("🔧 Actions")
         
         if st.button("🔄 Reload"):
-            st.session_state.transactions = load_data()
-            st.success("✅ Reloaded")
-            st.rerun()
+            # anything still queued goes to disk first, a failed write keeps the session copy
+            if show_write_errors(flush_writes()):
+                if hasattr(st.session_state.transactions, 'close'):
+                    st.session_state.transactions.close()
+                st.session_state.transactions = open_ledger(reload=True)
+                st.success("✅ Reloaded")
+                st.rerun()
         
         if st.button("💾 Save"):
-            if save_data(st.session_state.transactions):
+            save_data(st.session_state.transactions)
+            if show_write_errors(flush_writes()):
                 st.success("✅ Saved")
-            else:
-                st.error("❌ Save failed")
         
+        if STORAGE_BACKEND == "sqlite":
+            json_files = sorted(f for f in os.listdir('.') if f.endswith(('.json', BINARY_SNAPSHOT_EXT)))
+            import_file = st.selectbox("Import ledger file into SQLite", json_files) if json_files else None
+            if import_file and st.button("📥 Import"):
+                count = st.session_state.transactions.import_json(import_file)
+                st.success(f"✅ Imported {count} records from {import_file}")
+        elif JOURNAL_MODE:
+            st.caption(f"Journal: {journal_size()} entries not compacted")
+            if st.button("🗜️ Compact Journal") and show_write_errors(flush_writes()):
+                count = compact_journal()
+                st.success(f"✅ Compacted {count} records into {DATA_FILE}")
+            other_file = JSON_FILE if is_binary_snapshot(DATA_FILE) else LEDGER_FILE
+            if st.button(f"🔁 Convert to {other_file}") and show_write_errors(flush_writes()):
+                count = convert_ledger(DATA_FILE, other_file)
+                st.success(f"✅ Wrote {count} records to {other_file}")
+        
+        st.markdown("---")
+        
+        st.subheader("📥 Import Bank Statement")
+        uploaded = st.file_uploader("CSV export (date, amount, description)", type="csv")
+        duplicate_mode = IMPORT_DUPLICATE_MODES[st.selectbox("Rows already in the ledger", list(IMPORT_DUPLICATE_MODES))]
+        spending = IMPORT_SPENDING_SIGNS[st.selectbox("Money spent is shown as", list(IMPORT_SPENDING_SIGNS),
+                                                      help="rows with the other sign (refunds, payments in) are rejected")]
+        if uploaded is not None and st.button("📥 Import CSV") and show_write_errors(flush_writes()):
+            bar = st.progress(0.0)
+            total_bytes = max(uploaded.size, 1)
+            
+            def show_progress(report):
+                bar.progress(min(uploaded.tell() / total_bytes, 1.0), text=f"{report.rows} rows")
+            
+            report = import_statement(io.TextIOWrapper(uploaded, encoding='utf-8-sig', newline=''),
+                                      st.session_state.transactions, progress=show_progress,
+                                      duplicates=duplicate_mode, spending=spending)
+            maybe_compact_journal()
+            bar.progress(1.0, text=f"{report.rows} rows")
+            st.success(f"✅ Imported {report.imported} of {report.rows} rows "
+                       f"({report.rows_per_second:,.0f} rows/s)")
+            if report.rejected:
+                st.warning(f"⚠️ {report.rejected} rows rejected")
+                st.dataframe(pd.DataFrame(report.rejects, columns=['Line', 'Reason']), hide_index=True)
+            if report.duplicates:
+                done = "skipped" if duplicate_mode == 'skip' else "imported anyway"
+                st.warning(f"⚠️ {report.duplicates} rows were already in the ledger ({done})")
+                st.dataframe(pd.DataFrame(report.duplicate_rows, columns=['Line', 'Description']), hide_index=True)
+            show_budget_alerts(report.budget_alerts)
+        
+        st.markdown("---")
+        
+        st.subheader("🧹 Duplicates")
+        st.caption("Same amount, description and date")
+        window_label = st.selectbox("Count as a duplicate when entered", list(DEDUPE_WINDOWS))
+        window = DEDUPE_WINDOWS[window_label]
+        if st.button("🔍 Find Duplicates"):
+            st.session_state.duplicates = (ledger_version(st.session_state.transactions), window,
+                                           find_duplicates(st.session_state.transactions, window))
+        found = st.session_state.get('duplicates')
+        # a result from before the ledger changed or for another window is stale
+        if found is not None and found[:2] == (ledger_version(st.session_state.transactions), window):
+            duplicates = found[2]
+            if not duplicates:
+                st.success("✅ No duplicates")
+            else:
+                st.info(f"{len(duplicates)} duplicates, {sum(t.amount for t in duplicates):.2f} AUD")
+                show_table(records_frame(duplicates[:RECORD_PAGE_SIZES[-1]]), use_container_width=True,
+                           hide_index=True)
+                if st.button(f"🗑️ Remove {len(duplicates)} duplicates") and show_write_errors(flush_writes()):
+                    count = remove_duplicates(st.session_state.transactions, duplicates)
+                    del st.session_state.duplicates
+                    if show_write_errors(flush_writes()):
+                        st.success(f"✅ Removed {count} duplicates")
         
         st.markdown("---")
         
@@ -724,11 +883,13 @@ elif page == "⚙️ Settings":
         if st.checkbox("Enable dangerous stuff"):
             if st.button("🗑️ Delete All"):
                 if st.checkbox("I really want to delete everything"):
-                    st.session_state.transactions = []
-                    save_data([])
+                    st.session_state.transactions = clear_ledger(st.session_state.transactions)
                     st.success(" All deleted")
                     st.rerun()
 
+page_timer.stop()
+record_startup("first page run", time.perf_counter() - _script_started)
+
 # footer
 st.markdown("---")
 st.markdown(f"""
@@ -739,7 +900,27 @@ st.markdown(f"""
 </div>
 """, unsafe_allow_html=True)
 
-
-
-
-
+if rerun_metrics is not None:
+    finished = end_metrics(rerun_metrics, page=page, records=len(st.session_state.transactions))
+    if 'perf_history' not in st.session_state:
+        st.session_state.perf_history = deque(maxlen=PERF_HISTORY)
+    st.session_state.perf_history.append(finished)
+    
+    if show_performance:
+        with st.sidebar.expander("⚡ Performance", expanded=True):
+            st.caption(f"This rerun: {finished['ms']:.0f} ms")
+            timings = sorted(finished['timings'].items(), key=lambda item: item[1]['ms'], reverse=True)
+            rows = ["| Step | Calls | ms |", "|---|---:|---:|"]
+            rows += [f"| {label} | {data['calls']} | {data['ms']:.1f} |" for label, data in timings]
+            st.markdown("\n".join(rows))
+            for label, value in finished['counters'].items():
+                st.caption(f"{label}: {value:,}")
+            writes = recent_write_metrics()
+            if writes:
+                written = sum(write['counters'].get('bytes written', 0) for write in writes)
+                st.caption(f"Background writes: {len(writes)} batches, {written / 1024:.0f} KB written, "
+                           f"last one {writes[-1]['ms']:.0f} ms")
+            log = "".join(json.dumps(record, ensure_ascii=False, default=str) + "\n"
+                          for record in list(st.session_state.perf_history) + writes)
+            st.download_button("⬇️ Metrics log (JSONL)", log, file_name="accounting_metrics.jsonl",
+                               mime="application/x-ndjson")
@@ -0,0 +1,20 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import accounting_core  # noqa: E402
+
+
+@pytest.fixture
+def ledger_dir(tmp_path, monkeypatch):
+    # a fresh folder per test, and none of the per-file journal state a previous test left
+    monkeypatch.chdir(tmp_path)
+    assert not accounting_core.flush_writes()
+    for state in (accounting_core._shared_ledgers, accounting_core._journal_seq, accounting_core._journal_pending,
+                  accounting_core._journal_offsets, accounting_core._snapshot_stats):
+        state.clear()
+    yield tmp_path
+    accounting_core.flush_writes()
@@ -0,0 +1,131 @@
+# the shared ledger against what other processes write to the same file, and the background
+# writer. "another process" is a real one, started with the same accounting_core
+import os
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+import accounting_core as ac
+from accounting_core import Transaction
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def other_process(code, cwd):
+    env = dict(os.environ, PYTHONPATH=REPO + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    return subprocess.Popen([sys.executable, '-c', "import accounting_core as ac\n" + textwrap.dedent(code)],
+                            cwd=cwd, env=env)
+
+
+def run_other_process(code, cwd):
+    assert other_process(code, cwd).wait(timeout=120) == 0
+
+
+def records(n, prefix="r"):
+    return [Transaction(i + 1, f"{prefix}{i}", "Other", f"2025-06-{i % 28 + 1:02d}") for i in range(n)]
+
+
+def rows(transactions):
+    return sorted((t.id, t.amount, t.description, t.category, t.date) for t in transactions)
+
+
+def test_reload_drops_a_record_deleted_and_compacted_elsewhere(ledger_dir):
+    filename = str(ledger_dir / "l.json")
+    ac.save_data(records(9), filename)
+    assert not ac.flush_writes()
+    ledger = ac.shared_ledger(filename)
+    victim = ledger[3].id
+    run_other_process(f"""
+        ledger = ac.shared_ledger({filename!r})
+        ac.delete_transaction(ledger, {victim!r}, {filename!r})
+        assert not ac.flush_writes()
+        ac.compact_journal({filename!r})
+    """, ledger_dir)
+    ac.refresh_ledger(ledger, filename)
+    assert len(ledger) == 8
+    assert rows(ledger) == rows(ac.read_transactions(filename))
+
+
+def test_reload_keeps_changes_still_queued(ledger_dir):
+    filename = str(ledger_dir / "l.json")
+    ac.save_data(records(3), filename)
+    assert not ac.flush_writes()
+    ledger = ac.shared_ledger(filename)
+    with ac._journal_lock:
+        # the writer cannot get to the add while the lock is held
+        ac.add_transaction(ledger, Transaction(9, "queued", "Other", "2025-06-02"), filename)
+        ac._shared_ledgers[filename].reload()
+        assert [t.description for t in ledger][-1] == "queued"
+    assert not ac.flush_writes()
+    assert rows(ledger) == rows(ac.read_transactions(filename))
+
+
+def test_delete_all_elsewhere_reaches_this_process(ledger_dir):
+    ac.save_data(records(10))
+    assert not ac.flush_writes()
+    ledger = ac.open_ledger()
+    run_other_process("""
+        ac.clear_ledger(ac.open_ledger())
+        assert not ac.flush_writes()
+    """, ledger_dir)
+    ac.refresh_ledger(ledger, ac.DATA_FILE)
+    assert len(ledger) == 0
+    assert ac.read_transactions(ac.DATA_FILE) == []
+
+
+def test_writer_survives_a_write_that_raises(ledger_dir):
+    filename = str(ledger_dir / "l.json")
+    ac.save_data(records(1), filename)
+    assert not ac.flush_writes()
+    ledger = ac.shared_ledger(filename)
+    with open(filename, 'w') as f:
+        f.write('{"transactions": [')  # a snapshot cut off half way
+    ac._snapshot_stats.pop(filename)
+    ac._journal_seq.pop(filename)
+    ac.add_transaction(ledger, Transaction(2, "b", "Other", "2025-06-02"), filename)
+    errors = ac.flush_writes(5)
+    assert len(errors) == 1 and "queued writes" in errors[0]
+    assert ac._writer.thread.is_alive()
+    ac.save_data(records(2), "other.json")
+    assert not ac.flush_writes(5)
+    assert len(ac.read_transactions("other.json")) == 2
+
+
+RANDOM_EDITS = """
+    import random
+    from accounting_core import Transaction
+    rng = random.Random({seed})
+    ledger = ac.shared_ledger({filename!r})
+    for step in range({steps}):
+        ac.refresh_ledger(ledger, {filename!r})
+        roll = rng.random()
+        if roll < 0.5 or not len(ledger):
+            ac.add_transaction(ledger, Transaction(rng.randint(1, 500), f"{{rng.random():.6f}}", "Other",
+                                                   f"2025-{{rng.randint(1, 12):02d}}-01"), {filename!r})
+        elif roll < 0.75:
+            ac.update_transaction(ledger, rng.choice(ledger).id, {filename!r}, amount=rng.randint(1, 500))
+        elif roll < 0.95:
+            ac.delete_transaction(ledger, rng.choice(ledger).id, {filename!r})
+        else:
+            ac.compact_journal({filename!r})
+    assert not ac.flush_writes(60)
+"""
+
+
+@pytest.mark.parametrize('name', ["l.json", "l.ledger"])
+@pytest.mark.parametrize('seed', [1, 2])
+def test_random_edits_from_two_processes_match_a_fresh_replay(ledger_dir, monkeypatch, name, seed):
+    filename = str(ledger_dir / name)
+    monkeypatch.setattr(ac, 'JOURNAL_COMPACT_EVERY', 40)  # the writer compacts too
+    ac.save_data(records(20), filename)
+    assert not ac.flush_writes()
+    other = other_process(RANDOM_EDITS.format(seed=seed * 2 + 1, filename=filename, steps=800), ledger_dir)
+    exec(textwrap.dedent(RANDOM_EDITS.format(seed=seed * 2, filename=filename, steps=800)), {'ac': ac})
+    assert other.wait(timeout=120) == 0
+    ledger = ac.shared_ledger(filename)
+    ac.refresh_ledger(ledger, filename)
+    assert rows(ledger) == rows(ac.read_transactions(filename))
+    ac.compact_journal(filename)
+    assert rows(ledger) == rows(ac.read_transactions(filename))